@@ -0,0 +1,123 @@
+"""Golden-corpus check and timing of the episode parser's batch and cached paths.
+
+Every title in episode_titles.txt is parsed with the plain EPISODE_REGEX
+parser (NyaaScraper._parse_episode_info), then through
+extract_episode_info_many and extract_episode_info with the episode cache
+cold, warm and reloaded from disk. Every path must return exactly the same
+result for every title; the script prints the differences and exits with
+status 1 if one does not. It then times the uncached parser against the
+batch API on pages of ScraperSettings.PAGE_SIZE titles. Run from the
+repository root:
+
+    python benchmarks/episode_parser.py [corpus file]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import modules.episode_cache as episode_cache  # noqa: E402
+from modules.episode_cache import EpisodeInfoCache  # noqa: E402
+from modules.nyaa_scraper import NyaaScraper  # noqa: E402
+from settings import ScraperSettings  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'episode_titles.txt')
+REPEAT = 200
+
+
+def read_corpus(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f]
+
+
+def pages(titles):
+    """The titles in pages as a listing would hand them over, each with a repeated title"""
+    size = ScraperSettings.PAGE_SIZE
+    return [titles[start:start + size] + titles[start:start + 1] for start in range(0, len(titles), size)]
+
+
+def compare(label, titles, results, expected):
+    """Print the titles whose result differs from the uncached parse; returns their number"""
+    differences = 0
+    for title, result in zip(titles, results):
+        if result != expected[title] or type(result[0]) is not type(expected[title][0]):
+            differences += 1
+            print(f'{label}: {title!r} -> {result!r}, expected {expected[title]!r}')
+    print(f'{label:<28}{len(titles) - differences:>6} of {len(titles)} identical')
+    return differences
+
+
+def check(titles):
+    expected = {title: NyaaScraper._parse_episode_info(title) for title in titles}
+    differences = 0
+
+    # The public API, with the process-wide cache in memory only
+    ScraperSettings.EPISODE_CACHE_PERSIST = False
+    ScraperSettings.EPISODE_CACHE_ENABLED = False
+    batched = [result for page in pages(titles) for result in NyaaScraper.extract_episode_info_many(page)]
+    differences += compare('batch, no cache', [t for page in pages(titles) for t in page], batched, expected)
+    ScraperSettings.EPISODE_CACHE_ENABLED = True
+    for label in ('batch, cold cache', 'batch, warm cache'):
+        batched = [result for page in pages(titles) for result in NyaaScraper.extract_episode_info_many(page)]
+        differences += compare(label, [t for page in pages(titles) for t in page], batched, expected)
+    single = [NyaaScraper.extract_episode_info(title) for title in titles]
+    differences += compare('single title, warm cache', titles, single, expected)
+
+    # A cache written to disk and read back by the next run
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'episode_info.cache')
+        version = NyaaScraper.episode_parser_version()
+        written = EpisodeInfoCache(version, path=path)
+        written.get_many(titles, NyaaScraper._parse_episode_info_many)
+        written.save()
+        reloaded = EpisodeInfoCache(version, path=path)
+        found = reloaded.get_many(titles, NyaaScraper._parse_episode_info_many)
+        differences += compare('batch, reloaded cache', titles, [found[title] for title in titles], expected)
+        misses = reloaded.stats()['misses']
+        if misses:
+            print(f'reloaded cache missed {misses} title(s)')
+            differences += misses
+    return differences
+
+
+def best(fn):
+    times = []
+    for _ in range(5):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times) * 1000
+
+
+def benchmark(titles):
+    batches = pages(titles) * REPEAT
+    count = sum(len(page) for page in batches)
+    uncached = best(lambda: [NyaaScraper._parse_episode_info(title) for page in batches for title in page])
+
+    def cold():
+        episode_cache._cache = None
+        for page in batches:
+            NyaaScraper.extract_episode_info_many(page)
+
+    cold_cache = best(cold)
+    warm_cache = best(lambda: [NyaaScraper.extract_episode_info_many(page) for page in batches])
+    print(f'{count} titles in pages of {ScraperSettings.PAGE_SIZE}, best of 5, ms')
+    print(f'{"regex, per title":<28}{uncached:>8.1f}')
+    print(f'{"batch, cache filled once":<28}{cold_cache:>8.1f}')
+    print(f'{"batch, warm cache":<28}{warm_cache:>8.1f}')
+
+
+def main():
+    titles = read_corpus(sys.argv[1] if len(sys.argv) > 1 else CORPUS)
+    differences = check(titles)
+    if differences:
+        print(f'{differences} difference(s) from the uncached parser')
+        return 1
+    benchmark(titles)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Startup cost of the tracker storages, eager vs lazy (TrackerSettings.LAZY_LOAD).
+
+Builds a synthetic tracker in a temporary directory and times, for each
+backend and mode, creating an AnimeTracker, then reading the first 50
+records, then reading all of them. Run from the repository root:
+
+    python benchmarks/tracker_load.py [number of series]
+"""
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.anime_tracker import AnimeTracker  # noqa: E402
+from modules.tracker_storage import JsonTrackerStorage, SqliteTrackerStorage  # noqa: E402
+
+REPEAT = 7
+
+
+def best(fn):
+    """Best of REPEAT runs, in milliseconds"""
+    times = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    return min(times)
+
+
+def synthetic_tracker(count):
+    random.seed(1)
+    return {
+        f'Series number {i} with a reasonably long title': {
+            'url': f'https://nyaa.si/?f=0&c=1_2&q=series+{i}+1080p',
+            'last_season': 1,
+            'last_episode': random.randint(0, 24),
+            'allow_multi_episode': False,
+            'last_torrent_id': 1800000 + i,
+            'episodes': {'1': 'ffffe'},
+        }
+        for i in range(count)
+    }
+
+
+def read_records(make_tracker, count=None):
+    """Create a tracker and read its first count records (default: all)"""
+    tracker = make_tracker()
+    if count is None:
+        list(tracker.get_all())
+    else:
+        for title in itertools.islice(tracker.data, count):
+            tracker.series(title)
+    tracker.close()
+
+
+def measure(label, make_tracker):
+    first = best(lambda: make_tracker().close())
+    some = best(lambda: read_records(make_tracker, 50))
+    every = best(lambda: read_records(make_tracker))
+    print(f'{label:<16}{first:>10.1f}{some:>14.1f}{every:>15.1f}')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    data = synthetic_tracker(count)
+    workdir = tempfile.mkdtemp()
+    try:
+        tracker_file = os.path.join(workdir, 'tracker.json')
+        with open(tracker_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        # The first flush writes tracker.json.index, which lazy loading needs
+        AnimeTracker(tracker_file, JsonTrackerStorage(tracker_file, write_behind=False, lazy=False)).save()
+        database = os.path.join(workdir, 'tracker.db')
+        shutil.copy(tracker_file, os.path.join(workdir, 'migrate.json'))
+        SqliteTrackerStorage(database, migrate_from=os.path.join(workdir, 'migrate.json')).load()
+
+        print(f'{count} series, best of {REPEAT}, ms')
+        print(f'{"":<16}{"startup":>10}{"+50 records":>14}{"+all records":>15}')
+        for lazy in (False, True):
+            mode = 'lazy' if lazy else 'eager'
+            measure(f'json   {mode}', lambda: AnimeTracker(tracker_file, JsonTrackerStorage(tracker_file, lazy=lazy)))
+        for lazy in (False, True):
+            mode = 'lazy' if lazy else 'eager'
+            measure(f'sqlite {mode}', lambda: AnimeTracker(
+                tracker_file, SqliteTrackerStorage(database, migrate_from=None, lazy=lazy)))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
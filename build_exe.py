@@ -41,6 +41,7 @@ def create_executable():
         '--hidden-import=requests',     # Ensure requests is included
         '--hidden-import=beautifulsoup4', # Ensure beautifulsoup4 is included
         '--hidden-import=qbittorrent-api', # Ensure qbittorrent-api is included
+        '--hidden-import=lxml.html',    # Fast HTML parser backend (optional at runtime)
         '--exclude-module=pytest',      # Exclude test modules
         '--exclude-module=unittest',    # Exclude test modules
         'main.py'                       # Main entry point
@@ -3,19 +3,30 @@ from tkinter import ttk, messagebox, simpledialog
 from tkinter import scrolledtext
 import threading
 import re
-import requests
 from datetime import datetime
 import argparse
 import time
 import os
+import itertools
+import logging
+import signal
+import sys
 
 # Import modules
 from modules.nyaa_scraper import NyaaScraper
 from modules.anime_tracker import AnimeTracker
-from modules.qbittorrent_client import QBittorrentClient
+from modules.qbittorrent_client import get_client_manager
 from modules.settings_panel import SettingsPanel
-from modules.generic_torrent_client import GenericTorrentClient
+from modules.generic_torrent_client import GenericTorrentClient, SubmissionBatch
+from modules.download_ledger import get_download_ledger
+from modules.download_status import DownloadStatusTracker
+from modules.poll_scheduler import PollScheduler
+from modules.check_service import CheckService
+from modules.http_session import CircuitOpenError, PRIORITY_INTERACTIVE, get_session_manager, request_priority
+from modules.query_planner import check_latest_episodes
+from modules.check_engine import shutdown_check_engine
 from utils.logging_utils import setup_logging, create_trace_file
+from utils.pidfile import PidFile, PidFileError
 from settings import *
 from settings import SettingsManager
 
@@ -40,20 +51,30 @@ class App:
         self.torrent_config = TorrentClientConfig()
         self.quality_settings = QualitySettings()
         self.check_interval = DEFAULT_INTERVAL
-        self.torrent_client = GenericTorrentClient(self.torrent_config)
+        self.torrent_client = GenericTorrentClient(self.torrent_config, self.qb_config)
+        self.download_status = DownloadStatusTracker(self.qb_config)
 
         self.check_thread = None
         self.stop_event = threading.Event()
         self.qb_health_check_thread = None
+        self.download_status_thread = None
         self._setup_gui()
         self._load_tracker()
 
         # Load settings after GUI is set up (so we can log)
         self._load_settings()
+        self.download_status.qb_config = self.qb_config
+        self._filter_signature = self.quality_settings.filter_signature()
+        self.checker = CheckService(self.tracker, self.torrent_client, self.qb_config, self.quality_settings,
+                                    self.check_interval, log=self._log, stop_event=self.stop_event,
+                                    on_episode=self._update_tree_episode,
+                                    on_tracker_changed=self._refresh_anime_display,
+                                    on_client_failed=lambda err: self._update_qb_status(False, err))
 
         self._log('Application started.')
         self._start_periodic_check()
         self._start_qb_health_check()
+        self._start_download_status()
 
     def _load_settings(self):
         """Load all settings from file"""
@@ -62,7 +83,7 @@ class App:
                 self.settings_manager.load_settings()
 
             # Reinitialize torrent client with loaded settings
-            self.torrent_client = GenericTorrentClient(self.torrent_config)
+            self.torrent_client = GenericTorrentClient(self.torrent_config, self.qb_config)
 
             self._log('Settings loaded successfully.')
             self._update_settings_status('Settings loaded!')
@@ -212,6 +233,7 @@ Backup: {SETTINGS_FILE}.backup"""
         list_frame = ttk.LabelFrame(self.left_frame, text='Tracked Anime')
         list_frame.grid(row=1, column=0, sticky='nsew', padx=5, pady=5)
         self.anime_tree = ttk.Treeview(list_frame, columns=GUISettings.ANIME_TREE_COLUMNS, 
+                                     displaycolumns=GUISettings.ANIME_TREE_DISPLAY_COLUMNS,
                                      show='headings', height=GUISettings.ANIME_TREE_HEIGHT)
         
         # Configure anime tree headers and widths
@@ -233,6 +255,8 @@ Backup: {SETTINGS_FILE}.backup"""
         self.context_menu.add_command(label="Edit Title", command=self.edit_series)
         self.context_menu.add_separator()
         self.context_menu.add_command(label="Toggle Multi-Episode Downloads", command=self.toggle_multi_episode)
+        self.context_menu.add_command(label="Toggle RSS Feed Mode", command=self.toggle_feed_backend)
+        self.context_menu.add_command(label="Set Poll Interval...", command=self.set_poll_interval)
         
         list_frame.rowconfigure(0, weight=1)
         list_frame.columnconfigure(0, weight=1)
@@ -279,11 +303,21 @@ Backup: {SETTINGS_FILE}.backup"""
         """Callback for when settings are saved"""
         self.qb_config = qb_config
         self.check_interval = check_interval
+        self.checker.qb_config = qb_config
+        self.download_status.qb_config = qb_config
+        self.checker.check_interval = check_interval
         if torrent_config:
             self.torrent_config = torrent_config
-            self.torrent_client = GenericTorrentClient(self.torrent_config)
+        # The shared qBittorrent session is only replaced if the connection settings changed
+        self.torrent_client = GenericTorrentClient(self.torrent_config, self.qb_config)
+        self.checker.torrent_client = self.torrent_client
         if quality_settings:
             self.quality_settings = quality_settings
+            self.checker.quality_settings = quality_settings
+            if quality_settings.filter_signature() != self._filter_signature:
+                # Uploads rejected by the old filter have to be looked at again
+                self.tracker.reset_last_torrent_id()
+                self._filter_signature = quality_settings.filter_signature()
 
         # Save all settings to file
         self._save_settings()
@@ -338,8 +372,12 @@ Backup: {SETTINGS_FILE}.backup"""
     def _check_qb_connection(self):
         """Check qBittorrent connection and update status indicator"""
         try:
-            qb = QBittorrentClient(self.qb_config)
-            connected, err = qb.connect()
+            qb, err = get_client_manager().get(self.qb_config)
+            connected = False
+            if qb:
+                connected, err = qb.ping()
+                if not connected:
+                    get_client_manager().invalidate(self.qb_config)
 
             if connected:
                 self.qb_status_indicator.config(text="✅ Connected", foreground="green")
@@ -647,28 +685,42 @@ Backup: {SETTINGS_FILE}.backup"""
         loading_item = self.search_results_tree.insert('', 'end', text='Searching...', values=('', '', '', '', ''))
         self.search_results_tree.update()
         
-        # Fetch search results in background thread
-        def fetch_results():
-            results = NyaaScraper.search(query, self.quality_settings)
-
-            # Apply quality filtering
-            if self.quality_settings.quality_filter_mode != 'disabled':
-                results = self.quality_settings.filter_torrents(results)
+        # Stream search results page by page in a background thread
+        self._search_stream = loading_item
 
-            # Update UI in main thread
+        def fetch_results():
+            received = []
+            results = []
+            try:
+                # The user is waiting: go before the scheduled checks
+                with request_priority(PRIORITY_INTERACTIVE):
+                    for page in NyaaScraper.iter_search(query, self.quality_settings,
+                                                        max_pages=ScraperSettings.SEARCH_PANEL_PAGES):
+                        if self._search_stream != loading_item:
+                            break  # a newer search replaced this one
+                        received.extend(page)
+
+                        # Quality filtering compares and sorts results, so it runs on everything received so far
+                        results = received
+                        if self.quality_settings.quality_filter_mode != 'disabled':
+                            results = self.quality_settings.filter_torrents(received)
+
+                        # Update UI in main thread
+                        self.root.after(0, lambda results=results: self._populate_search_panel_results(results, loading_item, False))
+            except Exception as e:
+                self._log(f"Search failed for {query}: {e}")
             self.root.after(0, lambda: self._populate_search_panel_results(results, loading_item))
         
         threading.Thread(target=fetch_results, daemon=True).start()
     
-    def _populate_search_panel_results(self, results, loading_item):
-        """Populate the search panel tree with search results"""
-        # Remove loading message
-        self.search_results_tree.delete(loading_item)
-        
-        if not results:
-            self.search_results_tree.insert('', 'end', text='No results found', values=('', '', '', '', ''))
-            return
-        
+    def _populate_search_panel_results(self, results, loading_item, finished=True):
+        """Show the search results received so far; the loading row stays until the stream is finished"""
+        if not self.search_results_tree.exists(loading_item):
+            return  # results of a search that has since been replaced
+        
+        # Every call gets the whole (re-sorted) result set
+        self.search_results_tree.delete(*[item for item in self.search_results_tree.get_children()
+                                          if item != loading_item])
         for result in results:
             # Format episode info for display
             if result['season']:
@@ -690,7 +742,20 @@ Backup: {SETTINGS_FILE}.backup"""
                                            values=(ep_text, result['size'], datetime_value, result['seeders'], result['leechers']),
                                            tags=(result['magnet'],))  # Store magnet link in tags
         
-        self._log(f'Found {len(results)} results for: {self.search_entry.get().strip()}')
+        if not finished:
+            # Keep the loading row below the results received so far
+            self.search_results_tree.item(loading_item, text='Loading more results...')
+            self.search_results_tree.move(loading_item, '', 'end')
+            return
+
+        # Remove loading message
+        self.search_results_tree.delete(loading_item)
+        count = len(self.search_results_tree.get_children())
+        if not count:
+            self.search_results_tree.insert('', 'end', text='No results found', values=('', '', '', '', ''))
+            return
+        
+        self._log(f'Found {count} results for: {self.search_entry.get().strip()}')
     
     def on_search_result_double_click(self, event):
         """Handle double-click on search result to download"""
@@ -712,8 +777,17 @@ Backup: {SETTINGS_FILE}.backup"""
         magnet = tags[0]
         episode_title = self.search_results_tree.item(item, 'text')
 
+        previous = self.torrent_client.already_downloaded(magnet)
+        if previous and not messagebox.askyesno(
+                "Already Downloaded",
+                f"This torrent was already sent to the torrent client on {previous['timestamp']}.\n\n"
+                "Send it again?"):
+            self._log(f'Skipped search result "{episode_title}": already downloaded.')
+            return
+
         # Download using the configured torrent client
-        ok, err = self.torrent_client.launch_magnet(magnet, self.qb_config.category)
+        ok, err, _ = self.torrent_client.launch_magnet(magnet, self.qb_config.category, title=episode_title,
+                                                       force=bool(previous))
         if ok:
             client_name = TorrentClientConfig.SUPPORTED_CLIENTS.get(self.torrent_config.preferred_client, "Torrent client")
             self._log(f'Search result "{episode_title}" sent to {client_name}.')
@@ -741,24 +815,36 @@ Backup: {SETTINGS_FILE}.backup"""
         loading_item = self.episodes_tree.insert('', 'end', text='Loading episodes...', values=('', '', '', '', ''))
         self.episodes_tree.update()
         
-        # Fetch episodes in background thread
+        # Stream episodes page by page in a background thread
+        self._episodes_stream = loading_item
+
         def fetch_episodes():
-            episodes = NyaaScraper.get_all_episodes(url, anime_title, self.tracker)
-            
-            # Update UI in main thread
+            episodes = []
+            try:
+                with request_priority(PRIORITY_INTERACTIVE):
+                    for page in NyaaScraper.iter_episodes(url, anime_title, self.tracker,
+                                                          max_pages=ScraperSettings.EPISODES_PANEL_PAGES):
+                        if self._episodes_stream != loading_item:
+                            break  # the panel now shows another series
+
+                        # Pages are only sorted within themselves; keep the episodes received so far in order
+                        episodes = sorted(episodes + page, key=lambda x: x['episode'] or 0, reverse=True)
+
+                        # Update UI in main thread
+                        self.root.after(0, lambda episodes=episodes: self._populate_episodes(episodes, loading_item, False))
+            except Exception as e:
+                self._log(f"Failed to fetch episodes for {anime_title}: {e}")
             self.root.after(0, lambda: self._populate_episodes(episodes, loading_item))
         
         threading.Thread(target=fetch_episodes, daemon=True).start()
     
-    def _populate_episodes(self, episodes, loading_item):
-        """Populate the episodes tree with fetched episodes"""
-        # Remove loading message
-        self.episodes_tree.delete(loading_item)
-        
-        if not episodes:
-            self.episodes_tree.insert('', 'end', text='No episodes found', values=('', '', '', '', ''))
-            return
+    def _populate_episodes(self, episodes, loading_item, finished=True):
+        """Show the episodes fetched so far; the loading row stays until the stream is finished"""
+        if not self.episodes_tree.exists(loading_item):
+            return  # episodes of a series that is no longer shown
         
+        # Every call gets all episodes so far, sorted across pages
+        self.episodes_tree.delete(*[item for item in self.episodes_tree.get_children() if item != loading_item])
         for episode in episodes:
             season_num = episode.get('season')
             ep_num = episode.get('episode')
@@ -776,6 +862,17 @@ Backup: {SETTINGS_FILE}.backup"""
                                      text=episode['title'][:60] + ('...' if len(episode['title']) > 60 else ''),
                                      values=(ep_text, episode['size'], datetime_value, episode['seeders'], episode['leechers']),
                                      tags=(episode['magnet'],))  # Store magnet link in tags
+
+        if not finished:
+            # Keep the loading row below the episodes received so far
+            self.episodes_tree.item(loading_item, text='Loading more episodes...')
+            self.episodes_tree.move(loading_item, '', 'end')
+            return
+
+        # Remove loading message
+        self.episodes_tree.delete(loading_item)
+        if not self.episodes_tree.get_children():
+            self.episodes_tree.insert('', 'end', text='No episodes found', values=('', '', '', '', ''))
     
     def hide_episodes_panel(self):
         """Hide the episodes panel"""
@@ -803,8 +900,17 @@ Backup: {SETTINGS_FILE}.backup"""
         magnet = tags[0]
         episode_title = self.episodes_tree.item(item, 'text')
 
+        previous = self.torrent_client.already_downloaded(magnet)
+        if previous and not messagebox.askyesno(
+                "Already Downloaded",
+                f"This torrent was already sent to the torrent client on {previous['timestamp']}.\n\n"
+                "Send it again?"):
+            self._log(f'Skipped episode "{episode_title}": already downloaded.')
+            return
+
         # Download using the configured torrent client
-        ok, err = self.torrent_client.launch_magnet(magnet, self.qb_config.category)
+        ok, err, _ = self.torrent_client.launch_magnet(magnet, self.qb_config.category, title=episode_title,
+                                                       force=bool(previous))
         if ok:
             client_name = TorrentClientConfig.SUPPORTED_CLIENTS.get(self.torrent_config.preferred_client, "Torrent client")
             self._log(f'Episode "{episode_title}" sent to {client_name}.')
@@ -839,7 +945,7 @@ Backup: {SETTINGS_FILE}.backup"""
         
         # Get the URL for the search result
         search_query = self.search_entry.get().strip()
-        url = f"https://nyaa.si/?f=0&c=0_0&q={requests.utils.quote(search_query)}&s=seeders&o=desc"
+        url = NyaaScraper.build_search_url(search_query)
         
         # Ask user to confirm or modify the title
         dialog = tk.Toplevel(self.root)
@@ -870,6 +976,7 @@ Backup: {SETTINGS_FILE}.backup"""
             if self.tracker.add(title, url):
                 self.anime_tree.insert('', 'end', iid=title, values=(title, 1, 0, url))
                 self._log(f'Added series: {title}')
+                self.checker.wake()  # queues it for a first check
                 dialog.destroy()
             else:
                 messagebox.showerror('Error', f'Series already exists: {title}')
@@ -923,45 +1030,63 @@ Backup: {SETTINGS_FILE}.backup"""
     def gather_all_latest_torrents(self, quality_settings=None):
         """Gather all latest available torrents from all tracked series"""
         all_torrents = []
+        circuit_errors = {}  # host -> CircuitOpenError, logged once
 
-        for title, info in self.tracker.get_all():
-            url = info['url']
+        def collect(title, info, result, error):
+            if isinstance(error, CircuitOpenError):
+                circuit_errors[error.host] = error
+                return
+            if error is not None:
+                self._log(f'Error checking {title}: {error}')
+                return
+            latest_season, latest_episode, magnet = result
             last_season = info.get('last_season', 1)
             last_episode = info.get('last_episode', 0)
 
-            try:
-                self._log(f'Checking latest torrents for: {title}')
-                latest_season, latest_episode, magnet = NyaaScraper.get_latest_episode_and_magnet(url, title, self.tracker, quality_settings)
-
-                if latest_episode is not None and magnet is not None:
-                    # Check if this is newer than what we have
-                    if latest_season > last_season or (latest_season == last_season and latest_episode > last_episode):
-                        all_torrents.append({
-                            'title': title,
-                            'series_title': title,
-                            'episode_info': f'S{latest_season:02d}E{latest_episode:02d}',
-                            'magnet': magnet,
-                            'season': latest_season,
-                            'episode': latest_episode,
-                            'current_season': last_season,
-                            'current_episode': last_episode
-                        })
-                    else:
-                        # Even if not newer, include it as an option
-                        all_torrents.append({
-                            'title': f'{title} - S{latest_season:02d}E{latest_episode:02d} (Current)',
-                            'series_title': title,
-                            'episode_info': f'S{latest_season:02d}E{latest_episode:02d}',
-                            'magnet': magnet,
-                            'season': latest_season,
-                            'episode': latest_episode,
-                            'current_season': last_season,
-                            'current_episode': last_episode
-                        })
-
-            except Exception as e:
-                self._log(f'Error checking {title}: {e}')
-
+            if latest_episode is not None and magnet is not None:
+                # Check if this is newer than what we have
+                if latest_season > last_season or (latest_season == last_season and latest_episode > last_episode):
+                    all_torrents.append({
+                        'title': title,
+                        'series_title': title,
+                        'episode_info': f'S{latest_season:02d}E{latest_episode:02d}',
+                        'magnet': magnet,
+                        'season': latest_season,
+                        'episode': latest_episode,
+                        'current_season': last_season,
+                        'current_episode': last_episode
+                    })
+                else:
+                    # Even if not newer, include it as an option
+                    all_torrents.append({
+                        'title': f'{title} - S{latest_season:02d}E{latest_episode:02d} (Current)',
+                        'series_title': title,
+                        'episode_info': f'S{latest_season:02d}E{latest_episode:02d}',
+                        'magnet': magnet,
+                        'season': latest_season,
+                        'episode': latest_episode,
+                        'current_season': last_season,
+                        'current_episode': last_episode
+                    })
+
+            # Uploads on the same page that fill gaps in the series' episode inventory
+            for season, episode, gap_magnet in getattr(result, 'missing', ()):
+                all_torrents.append({
+                    'title': f'{title} - S{season:02d}E{episode:02d} (Missing)',
+                    'series_title': title,
+                    'episode_info': f'S{season:02d}E{episode:02d}',
+                    'magnet': gap_magnet,
+                    'season': season,
+                    'episode': episode,
+                    'current_season': last_season,
+                    'current_episode': last_episode
+                })
+
+        self._log(f'Checking latest torrents for {len(self.tracker.data)} series...')
+        check_latest_episodes(self.tracker.get_all(), self.tracker, quality_settings, collect, self.stop_event,
+                              priority=PRIORITY_INTERACTIVE)
+        for error in circuit_errors.values():
+            self._log(f'Skipped series on {error.host}: {error}')
         return all_torrents
 
     def _extract_quality_from_title(self, title):
@@ -1114,21 +1239,35 @@ Backup: {SETTINGS_FILE}.backup"""
             self._log('No torrents selected for download.')
             return
 
+        ledger = get_download_ledger()
         downloaded_count = 0
+        skipped_count = 0
+        submissions = []
         for item in selection:
             tags = self.bulk_torrents_tree.item(item, 'tags')
             if tags and tags[0]:
                 magnet = tags[0]
                 title = self.bulk_torrents_tree.item(item, 'text')
 
-                success, error_msg = self.launch_magnet_system_default(magnet)
-                if success:
-                    self._log(f'Launched torrent: {title[:50]}...')
-                    downloaded_count += 1
-                else:
-                    self._log(f'Failed to launch torrent {title[:30]}...: {error_msg}')
+                # Checked before launching anything, so re-selecting a list only sends the new torrents
+                if ledger and ledger.contains(magnet):
+                    skipped_count += 1
+                    continue
+                submissions.append({'magnet': magnet, 'category': self.qb_config.category, 'title': title})
+
+        # The whole selection goes to the torrent client at once (one call per category for qBittorrent)
+        results = self.torrent_client.launch_magnets(submissions, force=True) if submissions else []
+        for submission, (success, error_msg, _) in zip(submissions, results):
+            title = submission['title']
+            if success:
+                self._log(f'Launched torrent: {title[:50]}...')
+                downloaded_count += 1
+            else:
+                self._log(f'Failed to launch torrent {title[:30]}...: {error_msg}')
 
         self._log(f'Successfully launched {downloaded_count} out of {len(selection)} selected torrents.')
+        if skipped_count:
+            self._log(f'Skipped {skipped_count} torrent(s) that were already downloaded.')
 
     def download_all_bulk_torrents(self):
         """Download all torrents from bulk list"""
@@ -1175,6 +1314,8 @@ Backup: {SETTINGS_FILE}.backup"""
         new_flag = not current_flag
         
         self.tracker.set_multi_episode_flag(title, new_flag)
+        # Uploads skipped under the old setting have to be looked at again
+        self.tracker.reset_last_torrent_id(title)
         
         status = "enabled" if new_flag else "disabled"
         self._log(f'Multi-episode downloads {status} for "{title}"')
@@ -1182,6 +1323,47 @@ Backup: {SETTINGS_FILE}.backup"""
         # Update the display to show the current status
         self._refresh_anime_display()
     
+    def toggle_feed_backend(self):
+        """Toggle between HTML scraping and the RSS feed for the selected anime"""
+        selected = self.anime_tree.selection()
+        if not selected:
+            self._log('No series selected.')
+            return
+
+        title = selected[0]
+        current = NyaaScraper.resolve_backend(title, self.tracker)
+        new_backend = 'html' if current == 'rss' else 'rss'
+
+        # Store no override when the series goes back to the global default
+        self.tracker.set_feed_backend(title, None if new_backend == ScraperSettings.FEED_BACKEND else new_backend)
+
+        self._log(f'Feed mode for "{title}" set to {new_backend.upper()}')
+        self._refresh_anime_display()
+    
+    def set_poll_interval(self):
+        """Set a fixed poll interval for the selected anime, or go back to the adaptive schedule"""
+        selected = self.anime_tree.selection()
+        if not selected:
+            self._log('No series selected.')
+            return
+
+        title = selected[0]
+        current = self.tracker.get_poll_interval(title)
+        minutes = simpledialog.askinteger(
+            "Poll Interval",
+            f'Check "{title}" every how many minutes?\n(0 = adaptive schedule learned from its releases)',
+            initialvalue=current // 60 if current else 0, minvalue=0, parent=self.root)
+        if minutes is None:
+            return
+
+        self.tracker.set_poll_interval(title, minutes * 60)
+        # Check it now; its next check then follows the new interval
+        self.checker.force_check([title])
+        if minutes:
+            self._log(f'"{title}" will be checked every {minutes} minutes')
+        else:
+            self._log(f'"{title}" uses the adaptive check schedule')
+
     def _refresh_anime_display(self):
         """Refresh the anime list display"""
         self._load_tracker()
@@ -1191,10 +1373,13 @@ Backup: {SETTINGS_FILE}.backup"""
         
         for title, info in self.tracker.get_all():
             multi_ep_status = " [Multi-Ep]" if info.get('allow_multi_episode', False) else ""
-            display_title = title + multi_ep_status
+            feed_status = " [RSS]" if info.get('feed_backend') == 'rss' else ""
+            display_title = title + multi_ep_status + feed_status
             last_season = info.get('last_season', 1)
             last_episode = info.get('last_episode', 0)
-            self.anime_tree.insert('', 'end', iid=title, values=(display_title, last_season, last_episode, info['url']))
+            download = DownloadStatusTracker.describe(self.download_status.get(title))
+            self.anime_tree.insert('', 'end', iid=title,
+                                   values=(display_title, last_season, last_episode, info['url'], download))
 
     def add_series(self):
         title = self.title_entry.get().strip()
@@ -1205,6 +1390,7 @@ Backup: {SETTINGS_FILE}.backup"""
         if self.tracker.add(title, url):
             self.anime_tree.insert('', 'end', iid=title, values=(title, 1, 0, url))
             self._log(f'Added series: {title}')
+            self.checker.wake()  # queues it for a first check
             self.title_entry.delete(0, 'end')
             self.url_entry.delete(0, 'end')
         else:
@@ -1266,8 +1452,8 @@ Backup: {SETTINGS_FILE}.backup"""
             # If title changed, use edit_title; if only URL changed, just update URL
             if new_title != old_title:
                 if self.tracker.edit_title(old_title, new_title):
-                     self.tracker.data[new_title]['url'] = new_url
-                     self.tracker.save()
+                     if new_url != current_url:
+                         self.tracker.set_url(new_title, new_url)
                      self._load_tracker()
                      self._log(f'Renamed series from "{old_title}" to "{new_title}" and updated URL.')
                      dialog.destroy()
@@ -1275,8 +1461,7 @@ Backup: {SETTINGS_FILE}.backup"""
                     messagebox.showerror('Error', f'Failed to rename series. Title "{new_title}" may already exist.')
             else:
                 # Only URL changed
-                self.tracker.data[old_title]['url'] = new_url
-                self.tracker.save()
+                self.tracker.set_url(old_title, new_url)
                 self._load_tracker()
                 self._log(f'Updated URL for "{old_title}".')
                 dialog.destroy()
@@ -1293,8 +1478,9 @@ Backup: {SETTINGS_FILE}.backup"""
         dialog.bind('<Escape>', lambda e: cancel_edit())
 
     def force_check(self):
+        # Moves every series to the front of the check queue; checking it replaces its next scheduled check
         self._log('Manual check triggered.')
-        threading.Thread(target=self._check_all, daemon=True).start()
+        self.checker.force_check()
 
     def _log(self, msg):
         timestamp = datetime.now().strftime(LoggingSettings.TIMESTAMP_FORMAT)
@@ -1304,7 +1490,7 @@ Backup: {SETTINGS_FILE}.backup"""
         self.log_text.configure(state='disabled')
 
     def _start_periodic_check(self):
-        self.check_thread = threading.Thread(target=self._periodic_check, daemon=True)
+        self.check_thread = threading.Thread(target=self.checker.run, daemon=True)
         self.check_thread.start()
 
     def _start_qb_health_check(self):
@@ -1325,48 +1511,30 @@ Backup: {SETTINGS_FILE}.backup"""
                 print(f"[DEBUG] qBittorrent health check error: {e}")
 
             # Check every 5 minutes (300 seconds)
-            for _ in range(300):
-                if self.stop_event.is_set():
-                    break
-                time.sleep(1)
+            self.stop_event.wait(300)
+
+    def _start_download_status(self):
+        """Start the thread that polls qBittorrent for the download status shown in the anime list"""
+        self.download_status_thread = threading.Thread(target=self._download_status_loop, daemon=True)
+        self.download_status_thread.start()
 
-    def _periodic_check(self):
+    def _download_status_loop(self):
+        """Background loop polling the progress of submitted torrents (sync/maindata deltas)"""
         while not self.stop_event.is_set():
-            self._check_all()
-            for _ in range(self.check_interval):
-                if self.stop_event.is_set():
-                    break
-                time.sleep(1)
-
-    def _check_all(self):
-        self._log('Checking for new episodes...')
-        available, err = self.torrent_client.test_connection()
-        if not available:
-            self._log(f'Torrent client connection failed: {err}')
-            self._update_qb_status(False, err)
-            # Don't show dialog for periodic checks to avoid spam, just update status
-            return
-        for title, info in self.tracker.get_all():
-            url = info['url']
-            last_s, last_ep = self.tracker.get_last_season_and_episode(title)
-            try:
-                latest_s, latest_ep, magnet = NyaaScraper.get_latest_episode_and_magnet(url, title, self.tracker, self.quality_settings)
-                if latest_ep is None or magnet is None:
-                    self._log(f'Failed to scrape: {title}')
-                    continue
-                if latest_s > last_s or (latest_s == last_s and latest_ep > last_ep):
-                    ok, err = self.torrent_client.launch_magnet(magnet, self.qb_config.category)
-                    if ok:
-                        self.tracker.update_episode(title, latest_s, latest_ep)
-                        self._update_tree_episode(title, latest_s, latest_ep)
-                        client_name = TorrentClientConfig.SUPPORTED_CLIENTS.get(self.torrent_config.preferred_client, "Torrent client")
-                        self._log(f'New episode {latest_ep} for {title} sent to {client_name}.')
-                    else:
-                        self._log(f'Failed to add magnet for {title}: {err}')
-                else:
-                    self._log(f'No new episode for {title}.')
-            except Exception as e:
-                self._log(f'Error checking {title}: {e}')
+            status = None
+            if self.torrent_config.preferred_client == 'qbittorrent':
+                try:
+                    status = self.download_status.poll()
+                except Exception as e:
+                    print(f"[DEBUG] Download status poll error: {e}")
+                # An empty result still clears the column of torrents that were removed
+                self.root.after(0, self._update_tree_download_status)
+            self.stop_event.wait(NetworkSettings.QB_STATUS_INTERVAL if status is not None
+                                 else NetworkSettings.QB_STATUS_RETRY_INTERVAL)
+
+    def _update_tree_download_status(self):
+        for title in self.anime_tree.get_children():
+            self.anime_tree.set(title, 'Download', DownloadStatusTracker.describe(self.download_status.get(title)))
 
     def _update_tree_episode(self, title, season, episode):
         if self.anime_tree.exists(title):
@@ -1376,7 +1544,14 @@ Backup: {SETTINGS_FILE}.backup"""
             self.anime_tree.item(title, values=vals)
 
     def on_close(self):
-        self.stop_event.set()
+        self.checker.stop()
+        # Checks not started yet are dropped by the stopped check loop; let the workers exit
+        shutdown_check_engine()
+        # Writes pending tracker changes (write-behind, or a check cycle still running)
+        self.tracker.close()
+        episode_cache = NyaaScraper.episode_cache()
+        if episode_cache:
+            episode_cache.save()
         self.root.destroy()
     
     # Utility methods
@@ -1507,73 +1682,152 @@ def run_headless():
         print(f"[DEBUG] QB Config: {qb_config.host}:{qb_config.port}")
         
         # Test qBittorrent connection with timeout
-        print("[DEBUG] Creating QBittorrentClient...")
-        qb = QBittorrentClient(qb_config)
+        print("[DEBUG] Creating torrent client for qBittorrent...")
+        torrent_config = TorrentClientConfig()
+        torrent_config.preferred_client = 'qbittorrent'
+        torrent_config.fallback_to_default = False  # no magnet handler to open without a desktop
+        torrent_client = GenericTorrentClient(torrent_config, qb_config)
         
         print("[DEBUG] Attempting to connect to qBittorrent...")
         try:
-            connected, err = qb.connect()
+            connected, err = torrent_client.test_connection()
             if not connected:
                 print(f'[ERROR] qBittorrent connection failed: {err}')
                 print("[INFO] Continuing without qBittorrent connection for testing...")
                 # Continue without qBittorrent for testing
-                qb = None
+                torrent_client = None
             else:
                 print("[DEBUG] Successfully connected to qBittorrent")
         except Exception as e:
             print(f"[ERROR] Exception during qBittorrent connection: {e}")
             print("[INFO] Continuing without qBittorrent connection for testing...")
-            qb = None
+            torrent_client = None
         
-        anime_list = list(tracker.get_all())
-        print(f"[DEBUG] Processing {len(anime_list)} anime entries")
+        print(f"[DEBUG] Processing {len(tracker.data)} anime entries")
         
         # Limit to first entries for testing
-        test_limit = min(TestSettings.HEADLESS_TEST_LIMIT, len(anime_list))
+        test_limit = min(TestSettings.HEADLESS_TEST_LIMIT, len(tracker.data))
         print(f"[DEBUG] Testing with first {test_limit} entries only")
         
         # Initialize quality settings for headless mode
         quality_settings = QualitySettings()
-        
-        for i, (title, info) in enumerate(anime_list[:test_limit]):
-            print(f"[DEBUG] Processing {i+1}/{test_limit}: {title}")
-            url = info['url']
+        # Magnets are sent together after the check, as in the GUI and daemon; the
+        # tracker only advances for those that landed (or the ledger already had)
+        submissions = SubmissionBatch(torrent_client) if torrent_client else None
+
+        def applied(title, result, missing, new_episode):
+            """Tracker updates of one series once its submissions are known"""
+            def callback(outcomes):
+                gaps_filled = True
+                for (season, episode, _), (ok, err, previous) in zip(missing, outcomes):
+                    if ok:
+                        tracker.mark_episodes(title, season, episode)
+                        if previous:
+                            print(f'[INFO] Missing episode S{season}E{episode} for {title} was already downloaded.')
+                        else:
+                            print(f'[SUCCESS] Missing episode S{season}E{episode} for {title} sent to qBittorrent.')
+                    else:
+                        gaps_filled = False
+                        print(f'[ERROR] Failed to add missing episode S{season}E{episode} for {title}: {err}')
+                if new_episode is not None:
+                    latest_s, latest_ep = new_episode
+                    ok, err, previous = outcomes[-1]
+                    if not ok:
+                        print(f'[ERROR] Failed to add magnet for {title}: {err}')
+                        return
+                    tracker.update_episode(title, latest_s, latest_ep)
+                    if previous:
+                        print(f"[INFO] S{latest_s}E{latest_ep} for {title} was already downloaded on {previous['timestamp']}.")
+                    else:
+                        print(f'[SUCCESS] New episode S{latest_s}E{latest_ep} for {title} sent to qBittorrent.')
+                if gaps_filled:
+                    tracker.set_last_torrent_id(title, getattr(result, 'max_torrent_id', None))
+            return callback
+
+        def apply(title, info, result, error):
+            """Decide what to send for a series; returns True if it has a new episode"""
             last_s = info.get('last_season', 1)
             last_ep = info.get('last_episode', 0)
-            print(f"[DEBUG] URL: {url}, Last tracked: S{last_s}E{last_ep}")
+            print(f"[DEBUG] Processing {title} - URL: {info['url']}, Last tracked: S{last_s}E{last_ep}")
 
-            try:
-                print(f"[DEBUG] Scraping latest episode for {title}...")
-                try:
-                    latest_s, latest_ep, magnet = NyaaScraper.get_latest_episode_and_magnet(url, title, tracker, quality_settings)
-                    print(f"[DEBUG] Scrape result - Season: {latest_s}, Episode: {latest_ep}, Magnet: {'Found' if magnet else 'None'}")
-                except Exception as scrape_error:
-                    print(f"[WARNING] Scraping failed for {title}: {scrape_error}")
-                    continue
+            if error is not None:
+                print(f"[WARNING] Scraping failed for {title}: {error}")
+                return False
 
-                if latest_ep is None or magnet is None:
-                    print(f'[WARNING] Failed to scrape: {title}')
-                    continue
+            if getattr(result, 'unchanged', False):
+                tracker.set_last_torrent_id(title, result.max_torrent_id)
+                print(f'[INFO] No new uploads for {title}.')
+                return False
 
-                if latest_s > last_s or (latest_s == last_s and latest_ep > last_ep):
-                    print(f"[DEBUG] New episode found: S{latest_s}E{latest_ep} > S{last_s}E{last_ep}")
-                    if qb:
-                        ok, err = qb.add_magnet(magnet, qb_config.category)
-                        if ok:
-                            tracker.update_episode(title, latest_s, latest_ep)
-                            print(f'[SUCCESS] New episode S{latest_s}E{latest_ep} for {title} sent to qBittorrent.')
-                        else:
-                            print(f'[ERROR] Failed to add magnet for {title}: {err}')
-                    else:
-                        print(f'[INFO] Would download episode S{latest_s}E{latest_ep} for {title} (qBittorrent not connected)')
-                        # Update tracker anyway for testing
-                        tracker.update_episode(title, latest_s, latest_ep)
-                else:
-                    print(f'[INFO] No new episode for {title} (current: S{latest_s}E{latest_ep}, last: S{last_s}E{last_ep}).')
-            except Exception as e:
-                print(f'[ERROR] Exception checking {title}: {e}')
-                import traceback
-                traceback.print_exc()
+            latest_s, latest_ep, magnet = result
+            print(f"[DEBUG] Scrape result - Season: {latest_s}, Episode: {latest_ep}, Magnet: {'Found' if magnet else 'None'}")
+
+            if latest_ep is None or magnet is None:
+                print(f'[WARNING] Failed to scrape: {title}')
+                return False
+
+            missing = list(getattr(result, 'missing', ()))
+            is_new = latest_s > last_s or (latest_s == last_s and latest_ep > last_ep)
+            if is_new:
+                print(f"[DEBUG] New episode found: S{latest_s}E{latest_ep} > S{last_s}E{last_ep}")
+            else:
+                print(f'[INFO] No new episode for {title} (current: S{latest_s}E{latest_ep}, last: S{last_s}E{last_ep}).')
+
+            if submissions is None:
+                # Update tracker anyway for testing
+                for season, episode, _ in missing:
+                    print(f'[INFO] Would download missing episode S{season}E{episode} for {title} (qBittorrent not connected)')
+                    tracker.mark_episodes(title, season, episode)
+                if is_new:
+                    print(f'[INFO] Would download episode S{latest_s}E{latest_ep} for {title} (qBittorrent not connected)')
+                    tracker.update_episode(title, latest_s, latest_ep)
+                tracker.set_last_torrent_id(title, getattr(result, 'max_torrent_id', None))
+                return is_new
+
+            batch = [{'magnet': gap_magnet, 'category': qb_config.category, 'series': title,
+                      'season': season, 'episode': episode} for season, episode, gap_magnet in missing]
+            if is_new:
+                batch.append({'magnet': magnet, 'category': qb_config.category, 'series': title,
+                              'season': latest_s, 'episode': latest_ep})
+            submissions.add(batch, applied(title, result, missing, (latest_s, latest_ep) if is_new else None))
+            return is_new
+
+        # Several headless runs (and the GUI) may share the tracker; only one checks at a time
+        if TrackerSettings.SINGLE_CHECK_INSTANCE and not tracker.check_lock.acquire(blocking=False):
+            print("[INFO] Another process is checking for new episodes, exiting.")
+            return
+        try:
+            tracker.refresh()
+            if ScheduleSettings.ADAPTIVE:
+                # Runs from cron only check the series whose release window is due
+                scheduler = PollScheduler(tracker, DEFAULT_INTERVAL)
+                entries = scheduler.due(tracker.get_all())[:test_limit]
+                print(f"[DEBUG] {len(entries)} series due for a check")
+
+                def apply_and_reschedule(title, info, result, error):
+                    found_new = apply(title, info, result, error)
+                    if not isinstance(error, CircuitOpenError):
+                        # Skipped series stay due for the next run
+                        scheduler.record(title, result, found_new)
+                check_fn = apply_and_reschedule
+            else:
+                # Only the series that are checked get their records loaded
+                entries = [(title, tracker.series(title)) for title in itertools.islice(tracker.data, test_limit)]
+                check_fn = apply
+            with tracker.batch():
+                requests_needed = check_latest_episodes(entries, tracker, quality_settings, check_fn,
+                                                        incremental=True)
+                if submissions is not None:
+                    print(f"[DEBUG] Sending {submissions.pending} torrent(s) to qBittorrent...")
+                    submissions.flush()
+        finally:
+            if TrackerSettings.SINGLE_CHECK_INSTANCE:
+                tracker.check_lock.release()
+        print(f"[DEBUG] Checked {test_limit} entries with {requests_needed} requests")
+        episode_cache = NyaaScraper.episode_cache()
+        if episode_cache:
+            episode_cache.save()
+            print(f"[DEBUG] Episode cache stats: {episode_cache.stats()}")
         
         print("[DEBUG] Headless check completed successfully.")
         
@@ -1583,6 +1837,66 @@ def run_headless():
         traceback.print_exc()
 
 
+def run_daemon(pidfile=None):
+    """Run the periodic check of the whole tracker without the GUI until SIGTERM or SIGINT.
+
+    Settings, tracker, caches and pooled connections are loaded once and kept
+    between cycles. SIGHUP reloads the settings and the tracker file. On
+    SIGTERM the check in progress drops the series not started yet and
+    applies the ones in flight, then the tracker is written and the pidfile
+    removed.
+    """
+    settings_manager = SettingsManager()
+    qb_config, torrent_config, quality_settings, check_interval = settings_manager.load_settings()
+    tracker = AnimeTracker()
+    service = CheckService(tracker, GenericTorrentClient(torrent_config, qb_config), qb_config, quality_settings,
+                           check_interval)
+
+    def reload():
+        qb_config, torrent_config, quality_settings, check_interval = settings_manager.load_settings()
+        service.tracker.close()
+        tracker = AnimeTracker()
+        if quality_settings.filter_signature() != service.quality_settings.filter_signature():
+            # Uploads rejected by the old filter have to be looked at again
+            tracker.reset_last_torrent_id()
+        service.set_tracker(tracker)
+        service.torrent_client = GenericTorrentClient(torrent_config, qb_config)
+        service.qb_config = qb_config
+        service.quality_settings = quality_settings
+        service.check_interval = check_interval
+        logging.info(f'Reloaded settings and tracker ({len(tracker.data)} series, check interval {check_interval}s)')
+
+    def stop(signum, frame):
+        logging.info(f'Received signal {signum}, finishing the current check before exiting')
+        service.request_stop()
+
+    service.reload_handler = reload
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    if hasattr(signal, 'SIGHUP'):  # not on Windows
+        signal.signal(signal.SIGHUP, lambda signum, frame: service.request_reload())
+
+    try:
+        with PidFile(pidfile or DaemonSettings.PID_FILE):
+            logging.info(f'Daemon started (pid {os.getpid()}) with {len(tracker.data)} series, '
+                         f'check interval {check_interval}s')
+            try:
+                service.run()
+            finally:
+                shutdown_check_engine()
+                # Writes pending tracker changes
+                service.tracker.close()
+                episode_cache = NyaaScraper.episode_cache()
+                if episode_cache:
+                    episode_cache.save()
+                get_session_manager().close()
+    except PidFileError as e:
+        logging.error(f'Not starting the daemon: {e}')
+        return 1
+    logging.info('Daemon stopped.')
+    return 0
+
+
 def main():
     try:
         # Setup logging
@@ -1596,10 +1910,16 @@ def main():
                            help='Run in headless mode (no GUI, single check)')
         parser.add_argument('--no-gui', action='store_true', 
                            help='Alias for --headless')
+        parser.add_argument('--daemon', action='store_true',
+                           help='Run without GUI, checking the whole tracker periodically until stopped')
+        parser.add_argument('--pidfile', default=None,
+                           help=f'Pidfile of the daemon (default: {DaemonSettings.PID_FILE})')
 
         args = parser.parse_args()
         
-        if args.headless or args.no_gui:
+        if args.daemon:
+            sys.exit(run_daemon(args.pidfile))
+        elif args.headless or args.no_gui:
             run_headless()
         else:
             # Run GUI mode
@@ -1,75 +1,192 @@
-import json
-import os
 import logging
+from modules.episode_inventory import EpisodeInventory
+from modules.tracker_storage import get_tracker_storage
 from settings import TRACKER_FILE
+from utils.file_lock import FileLock
 
 
 class AnimeTracker:
-    def __init__(self, tracker_file=TRACKER_FILE):
+    def __init__(self, tracker_file=TRACKER_FILE, storage=None):
         self.tracker_file = tracker_file
+        self.storage = storage or get_tracker_storage(tracker_file=tracker_file)
         self.data = self.load()
+        # Held for a whole check cycle, so only one process checks at a time
+        self.check_lock = FileLock(f'{tracker_file}.check.lock')
 
     def load(self):
-        logging.debug(f'[DEBUG] AnimeTracker.load called, tracker_file: {self.tracker_file}')
-        if not os.path.exists(self.tracker_file):
-            logging.debug('[DEBUG] Tracker file does not exist, returning empty dict')
-            return {}
-        try:
-            with open(self.tracker_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                logging.debug(f'[DEBUG] Loaded tracker data with {len(data)} entries: {list(data.keys())}')
-                return data
-        except Exception as e:
-            logging.debug(f'[DEBUG] Exception loading tracker file: {e}')
-            return {}
+        logging.debug(f'[DEBUG] AnimeTracker.load called, storage: {self.storage.name}')
+        return self.storage.load()
 
     def save(self):
-        with open(self.tracker_file, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        """Write the whole tracker (after editing self.data directly)"""
+        self.storage.save_all()
+
+    def series(self, title):
+        """A series' record (KeyError if it is not tracked).
+
+        Read records through this (or get_all) rather than ``self.data[title]``:
+        with lazy loading the dict holds a placeholder until a record is first used.
+        """
+        return self.storage.record(title)
+
+    def _save_series(self, title):
+        self.storage.put(title, self.series(title))
+
+    def batch(self):
+        """Group every change made inside the block into one write/transaction"""
+        return self.storage.batch()
+
+    def refresh(self):
+        """Pick up changes another process (GUI or headless run) wrote to the tracker"""
+        return self.storage.refresh()
+
+    def close(self):
+        self.storage.close()
 
     def get_all(self):
-        logging.debug(f'[DEBUG] AnimeTracker.get_all called, data keys: {list(self.data.keys())}')
+        logging.debug(f'[DEBUG] AnimeTracker.get_all called, {len(self.data)} series')
+        self.storage.load_all()
         return self.data.items()
 
     def add(self, title, url, allow_multi_episode=False):
         if title in self.data:
             return False
         self.data[title] = {'url': url, 'last_season': 1, 'last_episode': 0, 'allow_multi_episode': allow_multi_episode}
-        self.save()
+        self._save_series(title)
         return True
 
     def remove(self, title):
         if title in self.data:
             del self.data[title]
-            self.save()
+            self.storage.delete(title)
             return True
         return False
 
     def update_episode(self, title, season, episode):
         if title in self.data:
-            self.data[title]['last_season'] = season
-            self.data[title]['last_episode'] = episode
-            self.save()
-    
+            # Seeded from the old last episode before it moves, so skipped episodes show up as gaps.
+            # A season reached for the first time starts complete up to this episode instead,
+            # so a newly added series does not report its whole back catalogue as missing.
+            inventory = self.get_inventory(title)
+            if season in inventory.seasons:
+                inventory.add(season, episode)
+            else:
+                inventory.add_range(season, 1, episode)
+            info = self.series(title)
+            info['episodes'] = inventory.to_dict()
+            info['last_season'] = season
+            info['last_episode'] = episode
+            self._save_series(title)
+
+    def get_inventory(self, title):
+        """EpisodeInventory of a series; series without one are seeded from their last episode"""
+        if title not in self.data:
+            return EpisodeInventory()
+        info = self.series(title)
+        if 'episodes' in info:
+            return EpisodeInventory.from_dict(info['episodes'])
+        return EpisodeInventory.seeded(info.get('last_season', 1), info.get('last_episode', 0))
+
+    def mark_episodes(self, title, season, first, last=None):
+        """Record episodes first..last (or just first) of a season as obtained,
+        without moving the series' last episode
+        """
+        if title in self.data:
+            inventory = self.get_inventory(title)
+            inventory.add_range(season, first, first if last is None else last)
+            self.series(title)['episodes'] = inventory.to_dict()
+            self._save_series(title)
+
+    def has_episode(self, title, season, episode):
+        return self.get_inventory(title).has(season, episode)
+
+    def missing_episodes(self, title, season, upto):
+        """Episodes 1..upto of a season the series has not obtained, ascending"""
+        return self.get_inventory(title).missing(season, upto)
+
     def edit_title(self, old_title, new_title):
         if old_title in self.data and new_title not in self.data:
-            self.data[new_title] = self.data.pop(old_title)
-            self.save()
+            self.data[new_title] = self.series(old_title)
+            del self.data[old_title]
+            self.storage.rename(old_title, new_title)
             return True
         return False
 
     def get_url(self, title):
-        return self.data[title]['url'] if title in self.data else None
+        return self.series(title)['url'] if title in self.data else None
+
+    def set_url(self, title, url):
+        """Change a series' URL; its high-water torrent ID no longer applies"""
+        if title in self.data:
+            info = self.series(title)
+            info['url'] = url
+            info.pop('last_torrent_id', None)
+            self._save_series(title)
 
     def get_last_season_and_episode(self, title):
         if title in self.data:
-            return self.data[title].get('last_season', 1), self.data[title]['last_episode']
+            info = self.series(title)
+            return info.get('last_season', 1), info['last_episode']
         return 1, 0
-    
+
     def allows_multi_episode(self, title):
-        return self.data[title].get('allow_multi_episode', False) if title in self.data else False
-    
+        return self.series(title).get('allow_multi_episode', False) if title in self.data else False
+
     def set_multi_episode_flag(self, title, allow_multi_episode):
         if title in self.data:
-            self.data[title]['allow_multi_episode'] = allow_multi_episode
-            self.save()
+            self.series(title)['allow_multi_episode'] = allow_multi_episode
+            self._save_series(title)
+
+    def get_feed_backend(self, title):
+        """Per-series feed backend override ('html'/'rss'), or None for the global default"""
+        return self.series(title).get('feed_backend') if title in self.data else None
+
+    def set_feed_backend(self, title, backend):
+        if title in self.data:
+            if backend:
+                self.series(title)['feed_backend'] = backend
+            else:
+                self.series(title).pop('feed_backend', None)
+            self._save_series(title)
+
+    def set_schedule(self, title, schedule):
+        """Store a series' poll schedule (release history and next check, see PollScheduler)"""
+        if title in self.data:
+            self.series(title)['schedule'] = schedule
+            self._save_series(title)
+
+    def get_poll_interval(self, title):
+        """Fixed poll interval of a series in seconds, or None for the adaptive schedule"""
+        return self.series(title).get('poll_interval') if title in self.data else None
+
+    def set_poll_interval(self, title, seconds):
+        if title in self.data:
+            info = self.series(title)
+            if seconds:
+                info['poll_interval'] = seconds
+            else:
+                info.pop('poll_interval', None)
+            # Due again right away, so the new interval applies from now
+            info.get('schedule', {}).pop('next_check', None)
+            self._save_series(title)
+
+    def get_last_torrent_id(self, title):
+        """Highest Nyaa torrent ID already checked for a series, or None"""
+        return self.series(title).get('last_torrent_id') if title in self.data else None
+
+    def set_last_torrent_id(self, title, torrent_id):
+        """Raise a series' high-water torrent ID; lower or equal IDs are ignored"""
+        if title in self.data and torrent_id is not None:
+            info = self.series(title)
+            current = info.get('last_torrent_id')
+            if current is None or torrent_id > current:
+                info['last_torrent_id'] = torrent_id
+                self._save_series(title)
+
+    def reset_last_torrent_id(self, title=None):
+        """Forget the high-water mark of one series (or all), forcing a full re-check"""
+        titles = [title] if title is not None else list(self.data)
+        with self.batch():
+            for name in titles:
+                if name in self.data and self.series(name).pop('last_torrent_id', None) is not None:
+                    self._save_series(name)
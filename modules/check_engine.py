@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from modules.http_session import current_priority, get_session_manager, request_priority, request_stop_event
+from settings import NetworkSettings
+
+# Result of a check whose worker only got to it after the stop event was set
+_NOT_STARTED = object()
+
+
+class CheckEngine:
+    """Concurrent check engine shared by the GUI loop, force checks, the bulk
+    panel and headless mode.
+
+    Series are scraped on a bounded worker pool. Each check holds a per-host
+    semaphore (so one slow host cannot take every worker); the requests
+    themselves go through the session manager's process-wide rate limiter.
+    Checks on a host whose circuit breaker is open fail immediately with
+    CircuitOpenError. Results are handed to
+    ``apply_fn`` on the calling thread, strictly in the order the series were
+    given, so tracker updates and torrent submissions happen exactly as they
+    would in a sequential loop.
+    """
+
+    def __init__(self, max_workers=None, per_host_limit=None):
+        self.max_workers = max_workers or NetworkSettings.CHECK_WORKERS
+        self.per_host_limit = per_host_limit or NetworkSettings.PER_HOST_CONCURRENCY
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='check')
+        self._host_slots = {}
+        self._lock = threading.Lock()
+
+    def _host_slot(self, url):
+        host = urlsplit(url).hostname or ''
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_slots[host]
+
+    def _run_one(self, check_fn, title, info, priority, stop_event):
+        if stop_event is not None and stop_event.is_set():
+            return _NOT_STARTED
+        url = info.get('url', '') if isinstance(info, dict) else getattr(info, 'url', '')
+        # Fail at once for a host that is down instead of taking a worker slot for it
+        get_session_manager().check_circuit(url)
+        with self._host_slot(url), request_priority(priority), request_stop_event(stop_event):
+            return check_fn(title, info)
+
+    def run(self, entries, check_fn, apply_fn=None, stop_event=None, priority=None):
+        """Check every (title, info) entry concurrently.
+
+        Args:
+            entries: iterable of (title, info) pairs, as returned by AnimeTracker.get_all();
+                info may also be any object with a ``url`` attribute
+            check_fn: check_fn(title, info) -> result, runs on a worker thread
+            apply_fn: apply_fn(title, info, result, error), runs on the calling
+                thread in entry order; error is the exception raised by check_fn or None
+            stop_event: optional threading.Event; once set, the checks not started yet
+                are cancelled and the running ones stop retrying failed requests, then
+                applied as usual
+            priority: request priority of the checks (default: the calling thread's)
+
+        Returns:
+            list: (title, result, error) tuples in entry order
+        """
+        entries = list(entries)
+        started = time.monotonic()
+        priority = current_priority() if priority is None else priority
+        futures = [self._executor.submit(self._run_one, check_fn, title, info, priority, stop_event)
+                   for title, info in entries]
+
+        results = []
+        for (title, info), future in zip(entries, futures):
+            # A check already running is waited for and applied, its requests are sent
+            if stop_event is not None and stop_event.is_set() and future.cancel():
+                continue
+            try:
+                result, error = future.result(), None
+            except Exception as e:
+                result, error = None, e
+            if result is _NOT_STARTED:
+                continue
+            if apply_fn is not None:
+                try:
+                    apply_fn(title, info, result, error)
+                except Exception as e:
+                    logging.error(f"Error applying check result for {title}: {e}", exc_info=True)
+            results.append((title, result, error))
+
+        logging.info(f"Ran {len(results)} checks in {time.monotonic() - started:.1f}s "
+                     f"({self.max_workers} workers)")
+        return results
+
+    def shutdown(self, wait=False):
+        """Stop the worker threads once the checks already submitted are done"""
+        self._executor.shutdown(wait=wait)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_check_engine():
+    """Return the process-wide CheckEngine, creating it on first use"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = CheckEngine()
+        return _engine
+
+
+def shutdown_check_engine(wait=False):
+    """Shut down the process-wide CheckEngine if it was created; a later get_check_engine() makes a new one"""
+    global _engine
+    with _engine_lock:
+        engine, _engine = _engine, None
+    if engine is not None:
+        engine.shutdown(wait=wait)
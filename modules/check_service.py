@@ -0,0 +1,283 @@
+import logging
+import threading
+import time
+
+from modules.generic_torrent_client import SubmissionBatch
+from modules.http_session import CircuitOpenError, get_session_manager
+from modules.nyaa_scraper import NyaaScraper
+from modules.poll_scheduler import PollScheduler
+from modules.query_planner import check_latest_episodes
+from modules.response_cache import get_response_cache
+from settings import ScheduleSettings, TorrentClientConfig, TrackerSettings
+
+
+class CheckService:
+    """The periodic check for new episodes, shared by the GUI and the headless daemon.
+
+    ``run`` is the check loop: it sleeps until the first series in the
+    PollScheduler's queue is due, then checks every series due by then in
+    one cycle, sends new episodes to the torrent client and updates the
+    tracker. It returns once ``stop`` is called; a cycle in progress drops
+    the checks that have not started and applies the ones in flight.
+    Signal handlers use ``request_stop`` and ``request_reload`` instead,
+    which only set a flag the loop looks at.
+
+    The service knows nothing about its front end. Messages go to ``log``;
+    the optional hooks are called (from the loop's thread) with
+    on_episode(title, season, episode) after a new episode was sent,
+    on_tracker_changed() after changes of other processes were loaded and
+    on_client_failed(error) when the torrent client is unreachable.
+    """
+
+    def __init__(self, tracker, torrent_client, qb_config, quality_settings, check_interval,
+                 log=logging.info, stop_event=None, on_episode=None, on_tracker_changed=None,
+                 on_client_failed=None):
+        self.tracker = tracker
+        self.torrent_client = torrent_client
+        self.qb_config = qb_config
+        self.quality_settings = quality_settings
+        self.scheduler = PollScheduler(tracker, check_interval)
+        self.log = log
+        self.stop_event = stop_event or threading.Event()
+        self.on_episode = on_episode
+        self.on_tracker_changed = on_tracker_changed
+        self.on_client_failed = on_client_failed
+        self.reload_handler = None  # called by the loop after request_reload()
+        self._reload_requested = False
+        self._stop_requested = False
+        self._wake_event = threading.Event()  # wakes the loop early (force check, new series, stop)
+        self._check_lock = threading.Lock()
+
+    @property
+    def check_interval(self):
+        return self.scheduler.base_interval
+
+    @check_interval.setter
+    def check_interval(self, seconds):
+        self.scheduler.base_interval = seconds
+
+    def set_tracker(self, tracker):
+        """Switch to another (reloaded) tracker; call from the loop's thread or before run()"""
+        self.tracker = tracker
+        self.scheduler.tracker = tracker
+        self.scheduler.rebuild(tracker.get_all())
+
+    def wake(self):
+        """Make the loop look at the queue (and the tracker's series) right away"""
+        self._wake_event.set()
+
+    def force_check(self, titles=None):
+        """Move series (default: all) to the front of the queue; their check replaces the next scheduled one"""
+        self.scheduler.bump(titles)
+        self.wake()
+
+    def request_reload(self):
+        """Have the loop call reload_handler before its next cycle (safe from a signal handler)"""
+        self._reload_requested = True
+
+    def request_stop(self):
+        """Have the loop stop as with stop() (safe from a signal handler)"""
+        self._stop_requested = True
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake()
+
+    def _handle_stop_request(self):
+        """Turn a request_stop() into stop() on the loop's thread"""
+        if self._stop_requested and not self.stop_event.is_set():
+            self.stop()
+
+    def _sleep(self, timeout):
+        """Wait until woken up or timeout, returning early for request_stop() and request_reload()"""
+        deadline = time.monotonic() + timeout
+        while not (self._stop_requested or self._reload_requested):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._wake_event.wait(min(remaining, ScheduleSettings.REQUEST_POLL_INTERVAL)):
+                break
+        self._wake_event.clear()
+        self._handle_stop_request()
+
+    def run(self):
+        """Check loop, returns after stop()"""
+        self.scheduler.rebuild(self.tracker.get_all())
+        self._handle_stop_request()
+        while not self.stop_event.is_set():
+            if self._reload_requested:
+                self._reload_requested = False
+                if self.reload_handler:
+                    self.reload_handler()
+            if self.tracker.refresh():
+                # Another process changed the tracker, maybe checked some series
+                if self.on_tracker_changed:
+                    self.on_tracker_changed()
+                self.scheduler.rebuild(self.tracker.get_all())
+            # Series added meanwhile are queued, removed ones dropped
+            self.scheduler.sync(self.tracker.data)
+            next_time = self.scheduler.next_time()
+            # Wake up at least once per check interval to pick up tracker changes of other processes
+            timeout = self.check_interval if next_time is None else min(next_time - time.time(), self.check_interval)
+            self._sleep(timeout)
+            if self.stop_event.is_set() or self._reload_requested:
+                continue
+            titles = self.scheduler.pop_due()
+            if titles:
+                self.check(titles)
+
+    def check(self, titles=None):
+        """Check the given series (default: all) for new episodes"""
+        if not self._check_lock.acquire(blocking=False):
+            self.log('A check is already running.')
+            return
+        try:
+            # Other processes (headless runs from cron, another window) share the tracker
+            if TrackerSettings.SINGLE_CHECK_INSTANCE and not self.tracker.check_lock.acquire(blocking=False):
+                self.log('Another process is checking for new episodes, skipping this check.')
+                if titles:
+                    self.scheduler.bump(titles, time.time() + ScheduleSettings.MIN_WAKE_INTERVAL)
+                return
+            try:
+                self._run_check_cycle(titles)
+            finally:
+                if TrackerSettings.SINGLE_CHECK_INSTANCE:
+                    self.tracker.check_lock.release()
+        finally:
+            self._check_lock.release()
+
+    def _run_check_cycle(self, titles=None):
+        # Start from what other processes have downloaded meanwhile
+        if self.tracker.refresh() and self.on_tracker_changed:
+            self.on_tracker_changed()
+
+        if titles is None:
+            entries = list(self.tracker.get_all())
+            self.log('Checking for new episodes...')
+        else:
+            entries = [(title, self.tracker.series(title)) for title in titles if title in self.tracker.data]
+            if not entries:
+                return
+            self.log(f'Checking for new episodes ({len(entries)} of {len(self.tracker.data)} series due)...')
+        available, err = self.torrent_client.test_connection()
+        if not available:
+            self.log(f'Torrent client connection failed: {err}')
+            if self.on_client_failed:
+                self.on_client_failed(err)
+            # Try these series again after a check interval
+            self.scheduler.bump([title for title, _ in entries], time.time() + self.check_interval)
+            return
+
+        # Magnets are sent together at the end of the cycle; the tracker only advances for those that landed
+        submissions = SubmissionBatch(self.torrent_client)
+
+        def applied(title, result, missing, new_episode):
+            """Tracker updates of one series once its submissions are known"""
+            def callback(outcomes):
+                # Gaps filled by uploads on the same page; a failed one keeps the old mark as well
+                gaps_filled = True
+                for (season, episode, _), (ok, err, previous) in zip(missing, outcomes):
+                    if ok:
+                        self.tracker.mark_episodes(title, season, episode)
+                        status = self.torrent_client.already_message(previous) if previous else 'sent'
+                        self.log(f'Missing episode S{season:02d}E{episode:02d} for {title}: {status}.')
+                    else:
+                        gaps_filled = False
+                        self.log(f'Failed to add missing episode S{season:02d}E{episode:02d} for {title}: {err}')
+                if new_episode is None:
+                    if gaps_filled:
+                        self.tracker.set_last_torrent_id(title, getattr(result, 'max_torrent_id', None))
+                    return
+                latest_s, latest_ep = new_episode
+                ok, err, previous = outcomes[-1]
+                if ok:
+                    self.tracker.update_episode(title, latest_s, latest_ep)
+                    if gaps_filled:
+                        self.tracker.set_last_torrent_id(title, getattr(result, 'max_torrent_id', None))
+                    if self.on_episode:
+                        self.on_episode(title, latest_s, latest_ep)
+                    if previous:
+                        # Found in the download ledger, nothing was sent
+                        self.log(f'Episode {latest_ep} for {title}: {self.torrent_client.already_message(previous)}')
+                    else:
+                        client_name = TorrentClientConfig.SUPPORTED_CLIENTS.get(
+                            self.torrent_client.config.preferred_client, "Torrent client")
+                        self.log(f'New episode {latest_ep} for {title} sent to {client_name}.')
+                else:
+                    # Keep the old mark so the upload is looked at again next time
+                    self.log(f'Failed to add magnet for {title}: {err}')
+            return callback
+
+        def apply(title, info, result, error):
+            """Decide what to send for a series; returns True if it has a new episode"""
+            if error is not None:
+                self.log(f'Error checking {title}: {error}')
+                return False
+            if getattr(result, 'unchanged', False):
+                self.tracker.set_last_torrent_id(title, result.max_torrent_id)
+                self.log(f'No new uploads for {title}.')
+                return False
+            latest_s, latest_ep, magnet = result
+            last_s, last_ep = self.tracker.get_last_season_and_episode(title)
+            if latest_ep is None or magnet is None:
+                self.log(f'Failed to scrape: {title}')
+                return False
+            missing = list(getattr(result, 'missing', ()))
+            is_new = latest_s > last_s or (latest_s == last_s and latest_ep > last_ep)
+            if not is_new:
+                self.log(f'No new episode for {title}.')
+            batch = [{'magnet': gap_magnet, 'category': self.qb_config.category, 'series': title,
+                      'season': season, 'episode': episode} for season, episode, gap_magnet in missing]
+            if is_new:
+                batch.append({'magnet': magnet, 'category': self.qb_config.category, 'series': title,
+                              'season': latest_s, 'episode': latest_ep})
+            submissions.add(batch, applied(title, result, missing, (latest_s, latest_ep) if is_new else None))
+            return is_new
+
+        skipped = {}  # host -> (CircuitOpenError, number of series)
+
+        def apply_and_reschedule(title, info, result, error):
+            # A stop requested by a signal meanwhile cancels the checks not started yet
+            self._handle_stop_request()
+            if isinstance(error, CircuitOpenError):
+                # Not a miss: try the series again once the host's circuit lets a probe through
+                skipped[error.host] = (error, skipped.get(error.host, (None, 0))[1] + 1)
+                self.scheduler.bump([title], error.retry_at)
+                return
+            found_new = apply(title, info, result, error)
+            self.scheduler.record(title, result, found_new)
+
+        # All tracker updates of the cycle are written together
+        flushes_before = self.tracker.storage.stats().get('flushes', 0)
+        with self.tracker.batch():
+            check_latest_episodes(entries, self.tracker, self.quality_settings, apply_and_reschedule, self.stop_event,
+                                  incremental=True)
+            if submissions.pending:
+                self.log(f'Sending {submissions.pending} torrent(s)...')
+            submissions.flush()
+        for error, count in skipped.values():
+            self.log(f'Skipped {count} series: {error}')
+
+        http_stats = get_session_manager().stats()
+        self.log(f"Check complete. HTTP requests: {http_stats['requests']}, "
+                 f"connections reused: {http_stats['connections_reused']}, "
+                 f"opened: {http_stats['connections_opened']}, "
+                 f"retries: {http_stats['retries']}")
+        queue_wait = http_stats['queue_wait']['background']
+        if queue_wait['requests']:
+            self.log(f"Rate limiter: checks waited {queue_wait['total_wait'] / queue_wait['requests'] * 1000:.0f} ms "
+                     f"on average, {queue_wait['max_wait']:.1f}s at most")
+        cache = get_response_cache()
+        if cache:
+            # Counters are reset, so they cover this cycle only
+            cache_stats = cache.report(reset=True)
+            self.log(f"Response cache: {cache_stats['hits']} not-modified, {cache_stats['misses']} fetched, "
+                     f"{cache_stats['bytes_saved'] // 1024} KB saved")
+        episode_cache = NyaaScraper.episode_cache()
+        if episode_cache:
+            episode_cache.save()
+            episode_stats = episode_cache.stats()
+            self.log(f"Episode cache: {episode_stats['hit_rate']:.0%} hit rate over "
+                     f"{episode_stats['hits'] + episode_stats['misses']} titles")
+        storage_stats = self.tracker.storage.stats()
+        if storage_stats:
+            self.log(f"Tracker saved {storage_stats['flushes'] - flushes_before} time(s) this cycle, "
+                     f"last write {storage_stats['last_flush_ms']:.1f} ms")
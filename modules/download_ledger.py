@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from settings import TrackerSettings
+from utils.magnet_utils import parse_infohash
+
+
+class DownloadLedger:
+    """Append-only record of every magnet sent to a torrent client.
+
+    Each submission is one JSON line: infohash, series, season, episode,
+    title, timestamp and the client backend used. Lines are only ever
+    appended, so a crash can at worst lose the last, partially written one,
+    which is skipped on load.
+
+    The file is read lazily the first time it is queried, into a dict
+    keyed by infohash, so duplicate checks are O(1) afterwards. Lines
+    appended later by other processes are read on the next query.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or TrackerSettings.DOWNLOAD_LEDGER_FILE
+        self._index = None  # infohash -> latest entry
+        self._offset = 0    # bytes of the file already read
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """Read the lines appended since the last call (lock held)"""
+        if self._index is None:
+            self._index = {}
+            self._offset = 0
+        try:
+            if os.path.getsize(self.path) <= self._offset:
+                return
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                chunk = f.read()
+        except OSError:
+            return
+        # A line still being written by another process is read next time
+        complete = chunk.rfind(b'\n') + 1
+        self._offset += complete
+        skipped = 0
+        for line in chunk[:complete].decode('utf-8', errors='replace').splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if entry.get('infohash'):
+                self._index[entry['infohash']] = entry
+        if skipped:
+            logging.warning(f"Skipped {skipped} unreadable line(s) in {self.path}")
+        logging.debug(f"Ledger has {len(self._index)} downloads from {self.path}")
+
+    def find(self, magnet_or_infohash):
+        """Return the ledger entry for a magnet link or infohash, or None"""
+        if magnet_or_infohash and magnet_or_infohash.startswith('magnet:'):
+            infohash = parse_infohash(magnet_or_infohash)
+        else:
+            infohash = magnet_or_infohash.lower() if magnet_or_infohash else None
+        if not infohash:
+            return None
+        with self._lock:
+            self._load()
+            return self._index.get(infohash)
+
+    def contains(self, magnet_or_infohash):
+        return self.find(magnet_or_infohash) is not None
+
+    def entries(self):
+        """Return the latest entry of every infohash in the ledger"""
+        with self._lock:
+            self._load()
+            return list(self._index.values())
+
+    def record(self, magnet, series=None, season=None, episode=None, title=None, backend=None):
+        """Append a successful submission to the ledger"""
+        entry = {
+            'infohash': parse_infohash(magnet),
+            'series': series,
+            'season': season,
+            'episode': episode,
+            'title': title,
+            'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'backend': backend,
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._load()
+            try:
+                # One write() of a whole line in append mode, so lines of concurrent processes never interleave
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                logging.error(f"Could not write to the download ledger {self.path}: {e}")
+                return
+            if entry['infohash']:
+                self._index[entry['infohash']] = entry
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_download_ledger():
+    """Return the process-wide DownloadLedger, or None when it is disabled"""
+    global _ledger
+    if not TrackerSettings.DOWNLOAD_LEDGER_ENABLED:
+        return None
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = DownloadLedger()
+        return _ledger
@@ -0,0 +1,136 @@
+import threading
+
+from modules.download_ledger import get_download_ledger
+from modules.qbittorrent_client import get_client_manager
+from settings import QBittorrentConfig
+
+
+# qBittorrent torrent states, grouped for display
+ERROR_STATES = {'error', 'missingFiles'}
+PAUSED_STATES = {'pausedDL', 'stoppedDL'}
+STALLED_STATES = {'stalledDL', 'metaDL', 'forcedMetaDL'}
+QUEUED_STATES = {'queuedDL', 'checkingDL', 'allocating', 'checkingResumeData', 'moving'}
+
+
+def format_speed(bytes_per_second):
+    """Format a transfer rate, e.g. 1.2 MB/s"""
+    value = float(bytes_per_second or 0)
+    for unit in ('B/s', 'KB/s', 'MB/s'):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == 'B/s' else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB/s"
+
+
+class DownloadStatusTracker:
+    """Download progress of the torrents we sent to qBittorrent, per tracker series.
+
+    The torrents come from the download ledger, which records the series,
+    season and episode of every submission. Their progress, state and speed
+    come from the QBittorrentClient's torrent list, which is kept current
+    with sync/maindata deltas: a poll only transfers what changed since the
+    last one, however many torrents qBittorrent holds. Torrents removed
+    from qBittorrent are no longer reported.
+
+    ``poll`` returns a summary per series; ``describe`` turns one into the
+    text shown in the anime list.
+    """
+
+    def __init__(self, qb_config: QBittorrentConfig = None):
+        self.qb_config = qb_config or QBittorrentConfig()
+        self.status = {}  # series -> summary of the last poll
+        self._lock = threading.Lock()
+
+    def poll(self):
+        """Fetch the changes from qBittorrent and summarize the torrents of each series.
+
+        Returns:
+            dict: series -> {'torrents', 'complete', 'downloading', 'progress', 'dlspeed', 'state', 'episode'},
+            or None if qBittorrent (or the ledger) is not available
+        """
+        ledger = get_download_ledger()
+        torrents = None
+        if not ledger:
+            err = "the download ledger is disabled"
+        else:
+            qb, err = get_client_manager().get(self.qb_config)
+            if qb:
+                by_hash = {entry['infohash']: entry for entry in ledger.entries() if entry.get('series')}
+                torrents = qb.torrent_status(by_hash)
+                err = "could not sync the torrent list"
+        if torrents is None:
+            print(f"[DEBUG] Download status unavailable: {err}")
+            # Don't keep showing what may no longer be true
+            with self._lock:
+                self.status = {}
+            return None
+
+        status = {}
+        for infohash, fields in torrents.items():
+            entry = by_hash[infohash]
+            summary = status.setdefault(entry['series'], {
+                'torrents': 0, 'complete': 0, 'downloading': 0, 'progress': 0.0, 'dlspeed': 0,
+                'state': None, 'episode': None,
+            })
+            summary['torrents'] += 1
+            progress = fields.get('progress', 0.0)
+            if progress >= 1:
+                summary['complete'] += 1
+                continue
+            # Only the unfinished torrents count towards progress, speed and state
+            summary['downloading'] += 1
+            summary['progress'] += progress
+            summary['dlspeed'] += fields.get('dlspeed', 0)
+            summary['state'] = self._worst_state(summary['state'], fields.get('state'))
+            if entry.get('episode') is not None:
+                episode = (entry.get('season') or 1, entry['episode'])
+                summary['episode'] = max(summary['episode'] or episode, episode)
+        for summary in status.values():
+            if summary['downloading']:
+                summary['progress'] /= summary['downloading']
+
+        with self._lock:
+            self.status = status
+        return status
+
+    @staticmethod
+    def _worst_state(current, state):
+        """The state shown for a series: errors first, then paused, stalled, queued, downloading"""
+        def rank(value):
+            for index, states in enumerate((ERROR_STATES, PAUSED_STATES, STALLED_STATES, QUEUED_STATES)):
+                if value in states:
+                    return index
+            return 4
+        if current is None or rank(state) < rank(current):
+            return state
+        return current
+
+    def get(self, series):
+        """Summary of a series from the last poll, or None"""
+        with self._lock:
+            return self.status.get(series)
+
+    @staticmethod
+    def describe(summary):
+        """Text for the anime list, e.g. "E05 42% 1.2 MB/s" or "Done"; '' without torrents"""
+        if not summary or not summary['torrents']:
+            return ''
+        if not summary['downloading']:
+            return 'Done'
+        state = summary['state']
+        if state in ERROR_STATES:
+            label = 'Error'
+        elif state in PAUSED_STATES:
+            label = 'Paused'
+        elif state in STALLED_STATES:
+            label = 'Stalled'
+        elif state in QUEUED_STATES:
+            label = 'Queued'
+        else:
+            label = format_speed(summary['dlspeed'])
+        text = f"{summary['progress']:.0%} {label}"
+        if summary['episode']:
+            text = f"E{summary['episode'][1]:02d} " + text
+        if summary['downloading'] > 1:
+            text += f" ({summary['downloading']} torrents)"
+        return text
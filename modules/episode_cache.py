@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from settings import CACHE_DIRECTORY, ScraperSettings
+
+
+class EpisodeInfoCache:
+    """Bounded LRU memo of ``NyaaScraper.extract_episode_info`` results.
+
+    Torrent titles never change once uploaded, so the same title always
+    parses to the same result for a given parser. Entries are tagged with a
+    parser version (derived from the episode regex and the parsing code
+    revision); a cache loaded with a different version starts empty.
+
+    When a ``path`` is given the cache can be saved between runs. It is
+    written as a single file, most recently used titles last, so the newest
+    ``max_entries`` titles survive a reload.
+    """
+
+    def __init__(self, version, max_entries=None, path=None):
+        self.version = version
+        self.max_entries = max_entries or ScraperSettings.EPISODE_CACHE_SIZE
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loaded = path is None
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        """Read the persisted entries once, discarding them if the parser changed"""
+        self._loaded = True
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.debug(f"Ignoring unreadable episode cache {self.path}: {e}")
+            return
+        if data.get('version') != self.version:
+            logging.info("Episode parser changed, discarding the persisted episode cache")
+            self._dirty = True
+            return
+        for title, result in data.get('entries', [])[-self.max_entries:]:
+            episode_info, episode_type, matched_text, season_info = result
+            if isinstance(episode_info, list):
+                episode_info = tuple(episode_info)
+            self._entries[title] = (episode_info, episode_type, matched_text, season_info)
+        logging.debug(f"Loaded {len(self._entries)} cached episode parses from {self.path}")
+
+    def get(self, title, parse_fn):
+        """Return the cached parse of a title, calling parse_fn(title) on a miss"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            result = self._entries.get(title)
+            if result is not None:
+                self._entries.move_to_end(title)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        result = parse_fn(title)
+        with self._lock:
+            self._entries[title] = result
+            self._entries.move_to_end(title)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+        return result
+
+    def get_many(self, titles, parse_many_fn):
+        """Return {title: result} for a batch of titles.
+        All uncached titles are handed to parse_many_fn(titles) -> {title: result} in one call.
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            for title in dict.fromkeys(titles):
+                result = self._entries.get(title)
+                if result is None:
+                    missing.append(title)
+                    continue
+                self._entries.move_to_end(title)
+                found[title] = result
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            parsed = parse_many_fn(missing)
+            with self._lock:
+                for title in missing:
+                    self._entries[title] = parsed[title]
+                    self._entries.move_to_end(title)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                self._dirty = True
+            found.update(parsed)
+        return found
+
+    def invalidate(self):
+        """Drop every entry, in memory and on disk (e.g. after changing EPISODE_REGEX)"""
+        with self._lock:
+            self._entries.clear()
+            self._loaded = True
+            self._dirty = False
+            if self.path:
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+
+    def save(self):
+        """Persist the cache if it changed since the last save"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = {'version': self.version, 'entries': list(self._entries.items())}
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not save the episode cache to {self.path}: {e}")
+
+    def stats(self):
+        """Return hit/miss counters, hit rate and the number of cached titles"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'entries': len(self._entries),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_episode_cache(version):
+    """Return the process-wide EpisodeInfoCache for a parser version.
+    A different version (the regex changed at runtime) replaces the cache.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None or _cache.version != version:
+            path = os.path.join(CACHE_DIRECTORY, 'episode_info.cache') if ScraperSettings.EPISODE_CACHE_PERSIST else None
+            if _cache is not None:
+                _cache.invalidate()
+            _cache = EpisodeInfoCache(version, path=path)
+        return _cache
@@ -0,0 +1,61 @@
+class EpisodeInventory:
+    """Episodes obtained for one series, as one bitset per season.
+
+    Bit n of a season's integer is set once episode n was obtained. Python
+    integers are arrays of machine words, so finding the gaps below an
+    episode number is a mask and a complement, O(words) rather than
+    O(episodes). In the tracker a season is stored as a hex string:
+    ``{"1": "3e"}`` means episodes 1-5 of season 1.
+
+    Only seasons present in the inventory can have gaps. A series tracked
+    before inventories existed is seeded with every episode up to its
+    ``last_episode``, so nothing it already had is reported missing.
+    """
+
+    def __init__(self, seasons=None):
+        self.seasons = dict(seasons or {})  # season -> bitset of episodes
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls({int(season): int(bits, 16) for season, bits in (data or {}).items()})
+
+    @classmethod
+    def seeded(cls, last_season, last_episode):
+        """Inventory holding episodes 1..last_episode of last_season"""
+        inventory = cls()
+        if last_episode > 0:
+            inventory.add_range(last_season, 1, last_episode)
+        return inventory
+
+    def to_dict(self):
+        return {str(season): format(bits, 'x') for season, bits in sorted(self.seasons.items())}
+
+    def add(self, season, episode):
+        self.add_range(season, episode, episode)
+
+    def add_range(self, season, first, last):
+        """Mark episodes first..last (inclusive) of a season as obtained"""
+        if first < 1 or last < first:
+            return
+        mask = ((1 << (last - first + 1)) - 1) << first
+        self.seasons[season] = self.seasons.get(season, 0) | mask
+
+    def has(self, season, episode):
+        return bool(self.seasons.get(season, 0) >> episode & 1)
+
+    def missing(self, season, upto):
+        """Episodes 1..upto of a season that were not obtained, ascending.
+        Seasons without an inventory report nothing.
+        """
+        if season not in self.seasons or upto < 1:
+            return []
+        gaps = ~self.seasons[season] & (((1 << upto) - 1) << 1)
+        episodes = []
+        while gaps:
+            lowest = gaps & -gaps
+            episodes.append(lowest.bit_length() - 1)
+            gaps ^= lowest
+        return episodes
+
+    def count(self, season):
+        return bin(self.seasons.get(season, 0)).count('1')
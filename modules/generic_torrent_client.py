@@ -1,52 +1,152 @@
+import logging
 import subprocess
 import webbrowser
 import platform
 import os
-from settings import TorrentClientConfig
+from modules.download_ledger import get_download_ledger
+from modules.qbittorrent_client import get_client_manager
+from settings import QBittorrentConfig, TorrentClientConfig
 
 class GenericTorrentClient:
-    """Generic torrent client launcher that works with any torrent client"""
+    """Generic torrent client launcher that works with any torrent client.
 
-    def __init__(self, config: TorrentClientConfig = None):
+    qBittorrent is reached through the process-wide QBittorrentClientManager,
+    so connection tests and submissions share one logged in session.
+    """
+
+    def __init__(self, config: TorrentClientConfig = None, qb_config: QBittorrentConfig = None):
         self.config = config or TorrentClientConfig()
+        self.qb_config = qb_config or QBittorrentConfig()
+
+    @staticmethod
+    def already_downloaded(magnet_link):
+        """Return the download ledger entry of a magnet that was already sent, or None"""
+        ledger = get_download_ledger()
+        return ledger.find(magnet_link) if ledger else None
+
+    @staticmethod
+    def already_message(previous):
+        """Describe a download ledger entry, e.g. for a log line about a skipped magnet"""
+        return f"Already downloaded on {previous['timestamp']} ({previous.get('title') or previous.get('series') or previous['infohash']})"
 
-    def launch_magnet(self, magnet_link, category=None):
+    def launch_magnet(self, magnet_link, category=None, series=None, season=None, episode=None, title=None,
+                      force=False):
         """
         Launch a magnet link using the configured torrent client
 
         Args:
             magnet_link (str): The magnet link to launch
             category (str, optional): Category for qBittorrent (ignored for other clients)
+            series, season, episode, title (optional): Recorded in the download ledger
+            force (bool): Send the magnet even if the ledger shows it was already sent
 
         Returns:
-            tuple: (success: bool, error_message: str)
+            tuple: (success: bool, error_message: str, previous: dict or None)
+            A magnet found in the ledger is not sent again and counts as a
+            success; previous is then its ledger entry, otherwise None.
         """
+        if not force:
+            previous = self.already_downloaded(magnet_link)
+            if previous:
+                return True, '', previous
+
         try:
             if self.config.preferred_client == 'qbittorrent':
-                return self._launch_with_qbittorrent(magnet_link, category)
+                ok, err = self._launch_with_qbittorrent(magnet_link, category)
             elif self.config.preferred_client == 'custom':
-                return self._launch_with_custom_command(magnet_link)
+                ok, err = self._launch_with_custom_command(magnet_link)
             elif self.config.preferred_client == 'default':
-                return self._launch_with_system_default(magnet_link)
+                ok, err = self._launch_with_system_default(magnet_link)
             else:
-                return False, f"Unsupported torrent client: {self.config.preferred_client}"
+                return False, f"Unsupported torrent client: {self.config.preferred_client}", None
+
+            ledger = get_download_ledger()
+            if ok and ledger:
+                ledger.record(magnet_link, series, season, episode, title, self.config.preferred_client)
+            return ok, err, None
 
         except Exception as e:
             error_msg = f"Failed to launch magnet link: {str(e)}"
             print(f"[ERROR] {error_msg}")
-            return False, error_msg
+            return False, error_msg, None
+
+    def launch_magnets(self, submissions, force=False):
+        """
+        Launch several magnet links with as few calls to the torrent client as possible
+
+        qBittorrent gets one call per category (see QBittorrentClient.add_magnets);
+        other clients are launched one magnet at a time.
+
+        Args:
+            submissions (list): dicts with a 'magnet' and optionally 'category',
+                'series', 'season', 'episode' and 'title' (as for launch_magnet)
+            force (bool): Send magnets even if the ledger shows they were already sent
+
+        Returns:
+            list: (success: bool, error_message: str, previous: dict or None) per submission,
+            in order, as for launch_magnet
+        """
+        results = [None] * len(submissions)
+        pending = []
+        for index, submission in enumerate(submissions):
+            previous = None if force else self.already_downloaded(submission['magnet'])
+            if previous:
+                results[index] = (True, '', previous)
+            else:
+                pending.append(index)
+        if not pending:
+            return results
+
+        if self.config.preferred_client == 'qbittorrent':
+            outcomes = self._launch_many_with_qbittorrent([submissions[index] for index in pending])
+            ledger = get_download_ledger()
+            for index, (ok, err) in zip(pending, outcomes):
+                submission = submissions[index]
+                if ok and ledger:
+                    ledger.record(submission['magnet'], submission.get('series'), submission.get('season'),
+                                  submission.get('episode'), submission.get('title'), self.config.preferred_client)
+                results[index] = (ok, err, None)
+        else:
+            for index in pending:
+                submission = submissions[index]
+                results[index] = self.launch_magnet(submission['magnet'], submission.get('category'),
+                                                    submission.get('series'), submission.get('season'),
+                                                    submission.get('episode'), submission.get('title'), force=True)
+        return results
+
+    def _launch_many_with_qbittorrent(self, submissions):
+        """Add magnets to qBittorrent, one batch per category; returns (ok, err) per submission"""
+        try:
+            qb, err = get_client_manager().get(self.qb_config)
+            if not qb:
+                if self.config.fallback_to_default:
+                    print(f"[INFO] qBittorrent not available, falling back to system default")
+                    return [self._launch_with_system_default(submission['magnet']) for submission in submissions]
+                return [(False, f"qBittorrent connection failed: {err}")] * len(submissions)
+
+            by_category = {}
+            for index, submission in enumerate(submissions):
+                by_category.setdefault(submission.get('category'), []).append(index)
+            results = [None] * len(submissions)
+            for category, indexes in by_category.items():
+                outcome = qb.add_magnets([submissions[index]['magnet'] for index in indexes], category)
+                for index in indexes:
+                    ok, err = outcome[submissions[index]['magnet']]
+                    results[index] = (True, "") if ok else (False, f"qBittorrent error: {err}")
+            return results
+
+        except Exception as e:
+            if self.config.fallback_to_default:
+                print(f"[INFO] qBittorrent failed, falling back to system default: {e}")
+                return [self._launch_with_system_default(submission['magnet']) for submission in submissions]
+            return [(False, f"qBittorrent error: {str(e)}")] * len(submissions)
 
     def _launch_with_qbittorrent(self, magnet_link, category=None):
         """Launch magnet link using qBittorrent"""
         try:
-            from modules.qbittorrent_client import QBittorrentClient
-            from settings import QBittorrentConfig
+            qb, err = get_client_manager().get(self.qb_config)
 
-            qb_config = QBittorrentConfig()
-            qb = QBittorrentClient(qb_config)
-            connected, err = qb.connect()
-
-            if connected:
+            if qb:
                 ok, err = qb.add_magnet(magnet_link, category)
                 if ok:
                     return True, ""
@@ -140,12 +240,14 @@ class GenericTorrentClient:
     def _test_qbittorrent_connection(self):
         """Test qBittorrent connection"""
         try:
-            from modules.qbittorrent_client import QBittorrentClient
-            from settings import QBittorrentConfig
-
-            qb_config = QBittorrentConfig()
-            qb = QBittorrentClient(qb_config)
-            connected, err = qb.connect()
+            qb, err = get_client_manager().get(self.qb_config)
+            if qb:
+                # The session is reused; make sure qBittorrent still answers on it
+                connected, err = qb.ping()
+                if not connected:
+                    get_client_manager().invalidate(self.qb_config)
+            else:
+                connected = False
 
             if connected:
                 return True, ""
@@ -175,3 +277,40 @@ class GenericTorrentClient:
 
         except Exception as e:
             return False, f"Custom command validation error: {str(e)}"
+
+
+class SubmissionBatch:
+    """Magnets decided during a check cycle (or picked in the bulk panel), sent together.
+
+    ``add`` queues the submissions of one decision with a callback;
+    ``flush`` launches everything queued in one launch_magnets call and then
+    calls each callback with the (success, error_message, previous) results
+    of its own submissions, in the order they were added. Tracker updates belong
+    in the callbacks, so they only happen for torrents that landed.
+    """
+
+    def __init__(self, torrent_client):
+        self.torrent_client = torrent_client
+        self._submissions = []
+        self._callbacks = []  # (first index, end index, callback)
+
+    @property
+    def pending(self):
+        return len(self._submissions)
+
+    def add(self, submissions, callback):
+        start = len(self._submissions)
+        self._submissions.extend(submissions)
+        self._callbacks.append((start, len(self._submissions), callback))
+
+    def flush(self):
+        submissions, callbacks = self._submissions, self._callbacks
+        self._submissions, self._callbacks = [], []
+        if not callbacks:
+            return
+        results = self.torrent_client.launch_magnets(submissions) if submissions else []
+        for start, end, callback in callbacks:
+            try:
+                callback(results[start:end])
+            except Exception as e:
+                logging.error(f"Error applying submission results: {e}", exc_info=True)
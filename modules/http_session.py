@@ -0,0 +1,416 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from settings import NetworkSettings
+
+
+# Responses that mean the host is overloaded or failing, as opposed to a bad request
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+# Request priorities, most urgent first
+PRIORITY_INTERACTIVE = 0  # the user is waiting: search, episodes and bulk panels
+PRIORITY_BACKGROUND = 1   # scheduled checks
+PRIORITY_NAMES = ('interactive', 'background')
+
+_context = threading.local()
+
+
+def current_priority():
+    """Priority of requests made by the calling thread"""
+    return getattr(_context, 'priority', PRIORITY_BACKGROUND)
+
+
+@contextmanager
+def request_priority(priority):
+    """Send the requests made by the calling thread inside the block with the given priority"""
+    previous = current_priority()
+    _context.priority = priority
+    try:
+        yield
+    finally:
+        _context.priority = previous
+
+
+def current_stop_event():
+    """Stop event of the requests made by the calling thread, or None"""
+    return getattr(_context, 'stop_event', None)
+
+
+@contextmanager
+def request_stop_event(stop_event):
+    """Stop retrying the requests made by the calling thread inside the block once stop_event is set"""
+    previous = current_stop_event()
+    _context.stop_event = stop_event
+    try:
+        yield
+    finally:
+        _context.stop_event = previous
+
+
+class TokenBucket:
+    """Process-wide request budget: ``rate`` tokens per second, up to ``burst`` saved up.
+
+    Every request takes a token, waiting for one if the bucket is empty.
+    Waiting requests are served by priority, then first come first served,
+    so interactive requests overtake a queue of background checks. How long
+    requests waited is kept per priority.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._queue = []  # heap of (priority, ticket) of the waiting requests
+        self._tickets = itertools.count()
+        self._waits = [[0, 0.0, 0.0] for _ in PRIORITY_NAMES]  # requests, total and longest wait
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=PRIORITY_BACKGROUND):
+        """Take a token, blocking until one is available; returns the seconds waited"""
+        started = time.monotonic()
+        with self._condition:
+            if self.rate:
+                ticket = (priority, next(self._tickets))
+                heapq.heappush(self._queue, ticket)
+                try:
+                    while True:
+                        self._refill(time.monotonic())
+                        first = self._queue[0] == ticket
+                        if first and self._tokens >= 1:
+                            self._tokens -= 1
+                            break
+                        # Requests further back are woken when the queue moves
+                        self._condition.wait((1 - self._tokens) / self.rate if first else None)
+                finally:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                    self._condition.notify_all()
+            waited = time.monotonic() - started
+            stats = self._waits[priority]
+            stats[0] += 1
+            stats[1] += waited
+            stats[2] = max(stats[2], waited)
+        return waited
+
+    def stats(self):
+        """Queue wait per priority name: requests, total_wait and max_wait (seconds)"""
+        with self._condition:
+            return {name: {'requests': count, 'total_wait': total, 'max_wait': longest}
+                    for name, (count, total, longest) in zip(PRIORITY_NAMES, self._waits)}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request to a host whose circuit breaker is open"""
+
+    def __init__(self, host, retry_at):
+        self.host = host
+        self.retry_at = retry_at  # time.time() of the next probe
+        super().__init__(f"{host} is failing, not retrying before {time.strftime('%H:%M:%S', time.localtime(retry_at))}")
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta seconds or an HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, AttributeError):  # Python < 3.10 fails with TypeError on bad dates
+        return None
+
+
+class CircuitBreaker:
+    """Circuit breaker for one host.
+
+    Closed: requests pass. After FAILURE_THRESHOLD failures in a row
+    (timeouts, connection errors, 429/5xx) the breaker opens and every
+    request fails at once with CircuitOpenError. When the open period is
+    over it is half-open: a single probe request is let through, and it
+    closes the breaker on success or opens it again on failure. Each
+    consecutive opening doubles the open period, up to MAX_OPEN_SECONDS; a
+    Retry-After sent by the host is honoured when it asks for longer.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, host):
+        self.host = host
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0      # consecutive openings, drives the back-off
+        self.retry_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request to the host may be sent now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.time() >= self.retry_at:
+                self.state = self.HALF_OPEN
+                logging.info(f"Circuit for {self.host} half-open, sending a probe request")
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            # While the probe is out, callers come back after one more open period at the earliest
+            raise CircuitOpenError(self.host, max(self.retry_at, time.time() + NetworkSettings.OPEN_SECONDS)
+                                   if self.state == self.HALF_OPEN else self.retry_at)
+
+    def release_probe(self):
+        """Let another request probe the host after an attempt that ended without telling
+        whether the host is up (a bad URL, a broken response body...)
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info(f"Circuit for {self.host} closed, host is responding again")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened = 0
+            self._probing = False
+
+    def record_failure(self, retry_after=None):
+        """Count a failed request; returns True if the breaker is (now) open"""
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.OPEN:
+                # Requests sent before the breaker opened are failing as well
+                self.retry_at = max(self.retry_at, time.time() + (retry_after or 0))
+                return True
+            long_wait = retry_after is not None and retry_after > NetworkSettings.MAX_RETRY_DELAY
+            if self.state == self.CLOSED and self.failures < NetworkSettings.FAILURE_THRESHOLD and not long_wait:
+                return False
+            self.opened += 1
+            backoff = min(NetworkSettings.OPEN_SECONDS * 2 ** (self.opened - 1), NetworkSettings.MAX_OPEN_SECONDS)
+            self.state = self.OPEN
+            self.retry_at = time.time() + max(backoff, retry_after or 0)
+            logging.warning(f"Circuit for {self.host} open after {self.failures} failure(s), "
+                            f"next attempt in {self.retry_at - time.time():.0f}s")
+            return True
+
+
+class HttpSessionManager:
+    """Shared, thread-safe keep-alive HTTP layer for all Nyaa.si traffic.
+
+    A single requests.Session is reused by every scraper call so TCP/TLS
+    connections survive between series. The mounted adapter keeps one
+    urllib3 pool per host (``pool_connections`` hosts, ``pool_maxsize``
+    sockets each), and the pools' own counters are used to report how many
+    requests were served over an already open connection.
+
+    All requests share one TokenBucket (NetworkSettings.REQUEST_RATE_LIMIT
+    per second, REQUEST_BURST at once), taken in priority order: see
+    ``request_priority``. Every host has a CircuitBreaker. Timeouts, connection errors and
+    429/5xx responses are retried up to MAX_RETRIES times with exponential
+    back-off and jitter (or the delay a Retry-After header asks for, if it
+    is short enough); while a host's breaker is open, requests to it fail
+    at once with CircuitOpenError instead of waiting for another timeout.
+    The wait before a retry ends early when the stop event of the calling
+    thread is set (see ``request_stop_event``).
+    """
+
+    def __init__(self, pool_connections=None, pool_maxsize=None, timeout=None, rate_limit=None, burst=None):
+        self.pool_connections = pool_connections or NetworkSettings.POOL_CONNECTIONS
+        self.pool_maxsize = pool_maxsize or NetworkSettings.POOL_MAXSIZE
+        self.timeout = timeout or NetworkSettings.REQUEST_TIMEOUT
+        self.limiter = TokenBucket(NetworkSettings.REQUEST_RATE_LIMIT if rate_limit is None else rate_limit,
+                                   burst or NetworkSettings.REQUEST_BURST)
+        self._lock = threading.Lock()
+        self._session = None
+        self._adapter = None
+        self._requests_by_host = {}
+        self._breakers = {}
+        self.retries = 0
+        self.short_circuited = 0
+
+    def _get_session(self):
+        with self._lock:
+            if self._session is None:
+                self._adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                                            pool_maxsize=self.pool_maxsize,
+                                            pool_block=False)
+                session = requests.Session()
+                session.headers.update({
+                    'User-Agent': NetworkSettings.USER_AGENT,
+                    'Connection': 'keep-alive',
+                })
+                session.mount('http://', self._adapter)
+                session.mount('https://', self._adapter)
+                self._session = session
+                logging.debug(f"HTTP session created (pool_connections={self.pool_connections}, "
+                              f"pool_maxsize={self.pool_maxsize})")
+            return self._session
+
+    def breaker(self, url):
+        """The CircuitBreaker of a URL's host"""
+        host = urlsplit(url).hostname or url
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(host)
+            return self._breakers[host]
+
+    def check_circuit(self, url):
+        """Raise CircuitOpenError if requests to the URL's host are currently refused"""
+        breaker = self.breaker(url)
+        if breaker.state == CircuitBreaker.OPEN and time.time() < breaker.retry_at:
+            with self._lock:
+                self.short_circuited += 1
+            raise CircuitOpenError(breaker.host, breaker.retry_at)
+
+    @staticmethod
+    def _retry_delay(attempt, retry_after):
+        """Seconds to wait before retry number attempt (1-based), or None to give up"""
+        if retry_after is not None:
+            return retry_after if retry_after <= NetworkSettings.MAX_RETRY_DELAY else None
+        delay = min(NetworkSettings.RETRY_BACKOFF * 2 ** (attempt - 1), NetworkSettings.MAX_RETRY_DELAY)
+        return delay * random.uniform(0.5, 1.0)
+
+    def get(self, url, priority=None, stop_event=None, **kwargs):
+        """GET a URL through the pooled session (same semantics as requests.get).
+
+        Every attempt waits for a rate limiter token at priority (default: the
+        thread's ``request_priority``). Failed attempts are retried with
+        back-off until stop_event (default: the thread's
+        ``request_stop_event``) is set; the last 429/5xx response is returned,
+        the last network error raised. Raises CircuitOpenError while the
+        host's circuit breaker is open.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        priority = current_priority() if priority is None else priority
+        stop_event = current_stop_event() if stop_event is None else stop_event
+        session = self._get_session()
+        breaker = self.breaker(url)
+        host = breaker.host
+        attempt = 0
+        while True:
+            try:
+                breaker.before_request()
+            except CircuitOpenError:
+                with self._lock:
+                    self.short_circuited += 1
+                raise
+            attempt += 1
+            resp = error = retry_after = None
+            try:
+                self.limiter.acquire(priority)
+                with self._lock:
+                    self._requests_by_host[host] = self._requests_by_host.get(host, 0) + 1
+                resp = session.get(url, **kwargs)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                error = e
+            except BaseException:
+                # Not a sign of the host failing, so not retried; a probe must not stay out forever
+                breaker.release_probe()
+                raise
+            if error is None and resp.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return resp
+            if error is None:
+                retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+            opened = breaker.record_failure(retry_after)
+            delay = None if opened or attempt > NetworkSettings.MAX_RETRIES else self._retry_delay(attempt, retry_after)
+            if delay is not None:
+                reason = error.__class__.__name__ if error is not None else f"HTTP {resp.status_code}"
+                logging.warning(f"{reason} for {url}, retrying in {delay:.1f}s")
+                with self._lock:
+                    self.retries += 1
+                if stop_event is None:
+                    time.sleep(delay)
+                elif stop_event.wait(delay):
+                    delay = None
+            if delay is None:
+                if error is not None:
+                    raise error
+                return resp
+            if resp is not None:
+                resp.close()
+
+    def stats(self):
+        """Return connection reuse counters.
+
+        Returns:
+            dict: ``requests``, ``connections_opened``, ``connections_reused``,
+            ``retries`` and ``short_circuited`` (requests refused by an open
+            circuit) totals, a ``hosts`` breakdown keyed by host name and the
+            rate limiter's ``queue_wait`` per priority (see TokenBucket.stats).
+        """
+        hosts = {}
+        with self._lock:
+            requests_by_host = dict(self._requests_by_host)
+            adapter = self._adapter
+
+        if adapter is not None:
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                entry = hosts.setdefault(pool.host, {'requests': 0, 'connections_opened': 0})
+                entry['connections_opened'] += pool.num_connections
+                entry['requests'] += pool.num_requests
+
+        total_requests = sum(requests_by_host.values())
+        total_opened = sum(entry['connections_opened'] for entry in hosts.values())
+        for entry in hosts.values():
+            entry['connections_reused'] = max(0, entry['requests'] - entry['connections_opened'])
+
+        with self._lock:
+            for host, breaker in self._breakers.items():
+                hosts.setdefault(host, {'requests': 0, 'connections_opened': 0, 'connections_reused': 0})
+                hosts[host]['circuit'] = breaker.state
+            retries, short_circuited = self.retries, self.short_circuited
+
+        return {
+            'requests': total_requests,
+            'connections_opened': total_opened,
+            'connections_reused': max(0, total_requests - total_opened),
+            'retries': retries,
+            'short_circuited': short_circuited,
+            'hosts': hosts,
+            'queue_wait': self.limiter.stats(),
+        }
+
+    def close(self):
+        """Close all pooled connections; the next request opens a new session"""
+        with self._lock:
+            session, self._session, self._adapter = self._session, None, None
+        if session is not None:
+            session.close()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_session_manager():
+    """Return the process-wide HttpSessionManager, creating it on first use"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = HttpSessionManager()
+        return _manager
@@ -0,0 +1,136 @@
+import logging
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+from datetime import timezone
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote
+
+from modules.row_extractor import VIEW_ID_REGEX
+from settings import ScraperSettings
+
+
+NYAA_NS = '{https://nyaa.si/xmlns/nyaa}'
+
+
+class NyaaRssParser:
+    """Streaming parser for Nyaa.si RSS feeds (``&page=rss``).
+
+    The feed is fed to an ``XMLPullParser`` chunk by chunk as it arrives and
+    every ``<item>`` is converted and then dropped from the tree, so memory
+    use stays constant regardless of the feed length. Rows have the same
+    shape as the ones produced from the HTML listing.
+    """
+
+    CHUNK_SIZE = 16 * 1024
+
+    @staticmethod
+    def to_rss_url(url):
+        """Convert a Nyaa.si listing/search URL to its RSS equivalent"""
+        parts = urlsplit(url)
+        params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in ('page', 'p')]
+
+        # User pages (/user/<name>) are expressed with the u= parameter in the feed
+        path = parts.path or '/'
+        if path.startswith('/user/'):
+            params.append(('u', path[len('/user/'):].strip('/')))
+            path = '/'
+        params.append(('page', 'rss'))
+        return urlunsplit((parts.scheme, parts.netloc, path, urlencode(params), ''))
+
+    @staticmethod
+    def build_magnet(infohash, title):
+        """Build a magnet link from an infohash the same way the site does"""
+        trackers = ''.join(f"&tr={quote(tracker, safe='')}" for tracker in ScraperSettings.MAGNET_TRACKERS)
+        return f"magnet:?xt=urn:btih:{infohash}&dn={quote(title)}{trackers}"
+
+    @staticmethod
+    def parse_pub_date(pub_date):
+        """Convert an RFC 822 pubDate to the (date, time) pair used by the HTML rows"""
+        if not pub_date:
+            return '', ''
+        try:
+            parsed = parsedate_to_datetime(pub_date).astimezone(timezone.utc)
+        except (TypeError, ValueError):
+            return '', ''
+        return parsed.strftime('%Y-%m-%d'), parsed.strftime('%H:%M')
+
+    @staticmethod
+    def _item_to_row(item, row_index):
+        def text(tag):
+            value = item.findtext(tag)
+            return value.strip() if value else ''
+
+        def number(tag):
+            try:
+                return int(text(tag))
+            except ValueError:
+                return 0
+
+        title = text('title')
+        url = text('guid')
+        id_match = VIEW_ID_REGEX.search(url)
+        infohash = text(f'{NYAA_NS}infoHash').lower()
+        date, time = NyaaRssParser.parse_pub_date(text('pubDate'))
+        return {
+            'title': title,
+            'url': url,
+            'torrent_id': int(id_match.group(1)) if id_match else None,
+            'magnet': NyaaRssParser.build_magnet(infohash, title) if infohash else None,
+            'infohash': infohash or None,
+            'size': text(f'{NYAA_NS}size') or 'Unknown',
+            'seeders': number(f'{NYAA_NS}seeders'),
+            'leechers': number(f'{NYAA_NS}leechers'),
+            'date': date,
+            'time': time,
+            'row_index': row_index,
+        }
+
+    @staticmethod
+    def iter_rows(chunks, stop_at_id=None):
+        """Yield rows from an iterable of raw feed chunks (bytes).
+        Feeds are newest first; with stop_at_id, iteration ends at the first
+        item whose torrent ID is at or below it.
+        """
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        channel = None
+        row_index = 0
+        for chunk in chunks:
+            if not chunk:
+                continue
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if elem.tag == 'channel':
+                        channel = elem
+                    continue
+                if elem.tag != 'item':
+                    continue
+                title = elem.findtext('title')
+                if title:
+                    row = NyaaRssParser._item_to_row(elem, row_index)
+                    if stop_at_id is not None and row['torrent_id'] is not None and row['torrent_id'] <= stop_at_id:
+                        return
+                    yield row
+                    row_index += 1
+                # Drop the finished item so the tree never grows
+                elem.clear()
+                if channel is not None:
+                    channel.remove(elem)
+        parser.close()
+
+    @staticmethod
+    def parse_response(resp, stop_at_id=None):
+        """Consume a streamed requests response, closing it early when
+        stop_at_id is reached (see iter_rows).
+        Returns: (rows, body_bytes)
+        """
+        received = [0]
+
+        def chunks():
+            for chunk in resp.iter_content(chunk_size=NyaaRssParser.CHUNK_SIZE):
+                received[0] += len(chunk)
+                yield chunk
+
+        rows = list(NyaaRssParser.iter_rows(chunks(), stop_at_id))
+        resp.close()
+        logging.debug(f"Parsed {len(rows)} RSS items ({received[0]} bytes) from {resp.url}")
+        return rows, received[0]
@@ -1,7 +1,39 @@
 import re
+import calendar
+import hashlib
 import requests
 import logging
-from bs4 import BeautifulSoup
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from modules.episode_cache import get_episode_cache
+from modules.http_session import CircuitOpenError, current_priority, get_session_manager, request_priority
+from modules.response_cache import ResponseCache, get_response_cache
+from modules.nyaa_rss import NyaaRssParser
+from modules.row_extractor import get_row_extractor
+from settings import NetworkSettings, ScraperSettings
+
+
+class LatestEpisodeResult(tuple):
+    """(season, episode, magnet) of a check, with extra attributes:
+
+    unchanged: True when nothing newer than the series' high-water torrent ID
+        produced an episode, so the check can be skipped without a download
+    max_torrent_id: highest torrent ID seen for the series, to store as its new mark
+    missing: [(season, episode, magnet)] of uploads on the same page that fill
+        gaps in the series' episode inventory (AnimeTracker.get_inventory)
+    release_times: {(season, episode): epoch seconds} of the first upload of
+        every episode on the page, which PollScheduler learns the cadence from
+    """
+
+    def __new__(cls, season, episode, magnet, unchanged=False, max_torrent_id=None, missing=None,
+                release_times=None):
+        result = super().__new__(cls, (season, episode, magnet))
+        result.unchanged = unchanged
+        result.max_torrent_id = max_torrent_id
+        result.missing = missing or []
+        result.release_times = release_times or {}
+        return result
 
 
 class NyaaScraper:
@@ -23,54 +55,49 @@ class NyaaScraper:
         r'\b(?:ep?\.?|episode)\s*(\d{1,4})\b',  # Group 11: Explicit episode markers
         re.IGNORECASE
     )
+
+    # Bump when the parsing logic below changes without the regex changing,
+    # so memoized results from the episode cache are invalidated
+    EPISODE_PARSER_REVISION = 1
+    _parser_version = (None, None)  # (regex, version string) of the last computed version
     
     @staticmethod
-    def search(query, quality_settings=None):
+    def build_search_url(query):
+        """Build the Nyaa.si search URL for a free-text query"""
+        return NetworkSettings.NYAA_SEARCH_URL.format(requests.utils.quote(query))
+
+    @staticmethod
+    def search(query, quality_settings=None, backend=None, max_pages=1):
         """Search Nyaa.si for the given query and return the results"""
         logging.info(f"Searching Nyaa.si for: {query}")
         try:
-            # Construct the search URL
-            search_url = f"https://nyaa.si/?f=0&c=0_0&q={requests.utils.quote(query)}&s=seeders&o=desc"
-            logging.debug(f"Search URL: {search_url}")
-            
-            # Send the request
-            resp = requests.get(search_url, timeout=15)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            
-            # Find all torrent rows
-            torrent_rows = soup.select('tbody tr')
-            if not torrent_rows:
-                torrent_rows = soup.select('tr')
+            results = [result for page in NyaaScraper.iter_search(query, quality_settings, backend, max_pages=max_pages)
+                       for result in page]
+            logging.info(f"Found {len(results)} results for query: {query}")
+            return results
             
+        except Exception as e:
+            logging.error(f"Error searching Nyaa.si for {query}: {e}")
+            return []
+
+    @staticmethod
+    def iter_search(query, quality_settings=None, backend=None, **stream_options):
+        """Stream search results page by page; yields a list of result dicts per page.
+        Accepts the same early-termination and prefetch options as iter_row_pages.
+        """
+        # Construct the search URL
+        search_url = NyaaScraper.build_search_url(query)
+        logging.debug(f"Search URL: {search_url}")
+
+        for rows in NyaaScraper.iter_row_pages(search_url, backend or ScraperSettings.FEED_BACKEND, **stream_options):
             results = []
+            parsed = NyaaScraper.extract_episode_info_many(row['title'] for row in rows)
             
-            for row in torrent_rows:
-                # Find the title link (exclude comments links)
-                title_link = None
-                all_view_links = row.find_all('a', href=re.compile(r'/view/\d+'))
-                for link in all_view_links:
-                    href = link.get('href', '')
-                    classes = link.get('class', [])
-                    # Skip comment links
-                    if '#comments' not in href and 'comments' not in classes:
-                        title_link = link
-                        break
-                        
-                if not title_link:
-                    continue
-                    
-                title = title_link.get('title') or title_link.get_text().strip()
-                
-                # Get the torrent URL
-                torrent_url = f"https://nyaa.si{title_link.get('href')}"
-                
-                # Find magnet link
-                magnet_link_tag = row.find('a', href=re.compile(r'^magnet:'))
-                magnet = magnet_link_tag['href'] if magnet_link_tag else None
+            for row, episode_parse in zip(rows, parsed):
+                title = row['title']
                 
                 # Extract episode information
-                episode_info, episode_type, matched_text, season_info = NyaaScraper.extract_episode_info(title)
+                episode_info, episode_type, matched_text, season_info = episode_parse
                 
                 # Format episode number for display
                 if episode_type == "range":
@@ -80,31 +107,6 @@ class NyaaScraper:
                 else:
                     ep_text = "Unknown"
                 
-                # Get file size
-                size_cells = row.find_all('td')
-                size = 'Unknown'
-                if len(size_cells) >= 4:
-                    size = size_cells[3].get_text().strip()
-                
-                # Get seeders/leechers
-                seeders = leechers = 0
-                if len(size_cells) >= 6:
-                    try:
-                        seeders = int(size_cells[5].get_text().strip())
-                        leechers = int(size_cells[6].get_text().strip())
-                    except (ValueError, IndexError):
-                        pass
-                
-                # Get date information
-                date = ''
-                time = ''
-                if len(size_cells) >= 5:  # Date is in column 4 (index 4)
-                    date_text = size_cells[4].get_text().strip()
-                    # Parse date and time from Nyaa.si format (e.g., "2024-01-15 14:30")
-                    parsed_date, parsed_time = NyaaScraper.parse_date_time(date_text)
-                    date = parsed_date
-                    time = parsed_time
-
                 # Apply quality filtering if settings provided
                 if quality_settings and not quality_settings.matches_quality_filter(title):
                     continue
@@ -114,27 +116,69 @@ class NyaaScraper:
                     'episode': episode_info,
                     'episode_text': ep_text,
                     'season': season_info,
-                    'magnet': magnet,
-                    'url': torrent_url,
-                    'size': size,
-                    'seeders': seeders,
-                    'leechers': leechers,
-                    'date': date,
-                    'time': time
+                    'magnet': row['magnet'],
+                    'url': row['url'],
+                    'size': row['size'],
+                    'seeders': row['seeders'],
+                    'leechers': row['leechers'],
+                    'date': row['date'],
+                    'time': row['time']
                 })
-            
-            logging.info(f"Found {len(results)} results for query: {query}")
-            return results
-            
-        except Exception as e:
-            logging.error(f"Error searching Nyaa.si for {query}: {e}")
-            return []
+            yield results
     
+    @staticmethod
+    def episode_parser_version():
+        """Version tag of the episode parser: the parser revision plus a hash of EPISODE_REGEX"""
+        regex = NyaaScraper.EPISODE_REGEX
+        cached_regex, version = NyaaScraper._parser_version
+        if cached_regex is not regex:
+            digest = hashlib.sha1(f"{regex.pattern}/{regex.flags}".encode('utf-8')).hexdigest()[:12]
+            version = f"{NyaaScraper.EPISODE_PARSER_REVISION}:{digest}"
+            NyaaScraper._parser_version = (regex, version)
+        return version
+
+    @staticmethod
+    def episode_cache():
+        """The EpisodeInfoCache for the current parser version, or None when disabled"""
+        if not ScraperSettings.EPISODE_CACHE_ENABLED:
+            return None
+        return get_episode_cache(NyaaScraper.episode_parser_version())
+
     @staticmethod
     def extract_episode_info(title):
         """Extract episode information and determine if it's a single episode or range
+        Results are memoized per title in the episode cache.
         Returns: (episode_info, episode_type, matched_text, season_info)
         """
+        cache = NyaaScraper.episode_cache()
+        if cache is None:
+            return NyaaScraper._parse_episode_info(title)
+        return cache.get(title, NyaaScraper._parse_episode_info)
+
+    @staticmethod
+    def extract_episode_info_many(titles):
+        """Batch form of extract_episode_info for a whole page of titles.
+        The cache is consulted once for the batch and each distinct uncached
+        title is parsed once.
+        Returns: list of (episode_info, episode_type, matched_text, season_info), in title order
+        """
+        titles = list(titles)
+        cache = NyaaScraper.episode_cache()
+        if cache is None:
+            parsed = NyaaScraper._parse_episode_info_many(titles)
+        else:
+            parsed = cache.get_many(titles, NyaaScraper._parse_episode_info_many)
+        return [parsed[title] for title in titles]
+
+    @staticmethod
+    def _parse_episode_info_many(titles):
+        """Uncached batch parsing. Returns: {title: result}"""
+        parse = NyaaScraper._parse_episode_info
+        return {title: parse(title) for title in dict.fromkeys(titles)}
+
+    @staticmethod
+    def _parse_episode_info(title):
+        """Uncached episode parsing behind extract_episode_info"""
         match = NyaaScraper.EPISODE_REGEX.search(title)
         if not match:
             return None, None, "No match", None
@@ -207,43 +251,51 @@ class NyaaScraper:
         return date, time
     
     @staticmethod
-    def get_all_episodes(url, anime_title=None, tracker=None):
+    def upload_timestamp(row):
+        """Upload time of a row as epoch seconds (Nyaa dates are UTC), or None"""
+        if not row.get('date'):
+            return None
+        try:
+            uploaded = datetime.strptime(f"{row['date']} {row.get('time') or '00:00'}", '%Y-%m-%d %H:%M')
+        except ValueError:
+            return None
+        return int(calendar.timegm(uploaded.timetuple()))
+
+    @staticmethod
+    def get_all_episodes(url, anime_title=None, tracker=None, max_pages=1):
         """Get all episodes from a Nyaa.si page with their magnet links"""
         logging.info(f"Fetching all episodes from URL: {url}")
         try:
-            resp = requests.get(url, timeout=15)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, 'html.parser')
+            episodes = [episode for page in NyaaScraper.iter_episodes(url, anime_title, tracker, max_pages=max_pages)
+                        for episode in page]
             
-            torrent_rows = soup.select('tbody tr')
-            if not torrent_rows:
-                torrent_rows = soup.select('tr')
+            # Sort by episode number (descending)
+            episodes.sort(key=lambda x: x['episode'] or 0, reverse=True)
+            logging.info(f"Found {len(episodes)} episodes")
+            return episodes
             
+        except Exception as e:
+            logging.error(f"Error fetching episodes from {url}: {e}")
+            return []
+
+    @staticmethod
+    def iter_episodes(url, anime_title=None, tracker=None, **stream_options):
+        """Stream the episodes of a listing page by page; yields a list of episode
+        dicts per page, each sorted by episode number (descending).
+        Accepts the same early-termination and prefetch options as iter_row_pages.
+        """
+        allow_multi_episode = tracker.allows_multi_episode(anime_title) if tracker and anime_title else False
+        backend = NyaaScraper.resolve_backend(anime_title, tracker)
+
+        for rows in NyaaScraper.iter_row_pages(url, backend, **stream_options):
             episodes = []
-            allow_multi_episode = tracker.allows_multi_episode(anime_title) if tracker and anime_title else False
+            parsed = NyaaScraper.extract_episode_info_many(row['title'] for row in rows)
             
-            for row in torrent_rows:
-                # Find the title link (exclude comments links)
-                title_link = None
-                all_view_links = row.find_all('a', href=re.compile(r'/view/\d+'))
-                for link in all_view_links:
-                    href = link.get('href', '')
-                    classes = link.get('class', [])
-                    # Skip comment links (either by href containing #comments or by having 'comments' class)
-                    if '#comments' not in href and 'comments' not in classes:
-                        title_link = link
-                        break
-                if not title_link:
-                    continue
-                    
-                title = title_link.get('title') or title_link.get_text().strip()
-                
-                # Find magnet link
-                magnet_link_tag = row.find('a', href=re.compile(r'^magnet:'))
-                magnet = magnet_link_tag['href'] if magnet_link_tag else None
+            for row, episode_parse in zip(rows, parsed):
+                title = row['title']
                 
                 # Extract episode information using new method
-                episode_info, episode_type, matched_text, season_info = NyaaScraper.extract_episode_info(title)
+                episode_info, episode_type, matched_text, season_info = episode_parse
                 
                 # Skip multi-episode files (ranges) unless allowed for this anime
                 if episode_type == "range" and not allow_multi_episode:
@@ -263,187 +315,397 @@ class NyaaScraper:
                 else:
                     logging.debug(f"Episode extraction - Title: '{title}' -> No episode number found")
                 
-                # Get file size
-                size_cells = row.find_all('td')
-                size = 'Unknown'
-                if len(size_cells) >= 4:
-                    size = size_cells[3].get_text().strip()
-                
-                # Get seeders/leechers
-                seeders = leechers = 0
-                if len(size_cells) >= 6:
-                    try:
-                        seeders = int(size_cells[5].get_text().strip())
-                        leechers = int(size_cells[6].get_text().strip())
-                    except (ValueError, IndexError):
-                        pass
-                
-                # Get date information
-                date = ''
-                time = ''
-                if len(size_cells) >= 5:  # Date is in column 4 (index 4)
-                    date_text = size_cells[4].get_text().strip()
-                    # Parse date and time from Nyaa.si format
-                    parsed_date, parsed_time = NyaaScraper.parse_date_time(date_text)
-                    date = parsed_date
-                    time = parsed_time
-                
                 episodes.append({
                     'title': title,
                     'episode': episode_num,
-                    'magnet': magnet,
-                    'size': size,
-                    'seeders': seeders,
-                    'leechers': leechers,
-                    'date': date,
-                    'time': time
+                    'magnet': row['magnet'],
+                    'size': row['size'],
+                    'seeders': row['seeders'],
+                    'leechers': row['leechers'],
+                    'date': row['date'],
+                    'time': row['time']
                 })
             
-            # Sort by episode number (descending)
             episodes.sort(key=lambda x: x['episode'] or 0, reverse=True)
-            logging.info(f"Found {len(episodes)} episodes")
-            return episodes
-            
-        except Exception as e:
-            logging.error(f"Error fetching episodes from {url}: {e}")
-            return []
+            yield episodes
 
     @staticmethod
-    def get_latest_episode_and_magnet(url, anime_title=None, tracker=None, quality_settings=None):
-        """Returns (season, episode, magnet)"""
-        logging.info(f"Attempting to scrape URL: {url}")
+    def page_url(url, page):
+        """URL of page N (1-based) of a listing; page 1 is the URL itself"""
+        if page <= 1:
+            return url
+        parts = urlsplit(url)
+        params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'p']
+        params.append(('p', str(page)))
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(params), parts.fragment))
+
+    @staticmethod
+    def iter_row_pages(url, backend='html', max_pages=None, limit=None, since_id=None, until_date=None,
+                       prefetch=None, stop_event=None):
+        """Lazily walk a listing (&p=1, 2, ...) and yield its raw rows one page at a time.
+
+        Iteration ends after max_pages pages (default ScraperSettings.MAX_PAGES),
+        on a short or empty page, once limit rows have been yielded, at the first
+        row whose torrent ID is at or below since_id, at the first row dated
+        before until_date ('YYYY-MM-DD'), when stop_event is set, or simply when
+        the caller stops consuming. The cutoffs assume newest-first ordering.
+
+        With prefetch (default ScraperSettings.PREFETCH_PAGES) the next page is
+        downloaded in the background while the caller handles the current one.
+        The RSS backend has no pagination, so it always yields a single page.
+        A failure on page 1 is raised; later pages just end the stream.
+        """
+        max_pages = max_pages or ScraperSettings.MAX_PAGES
+        if backend == 'rss':
+            max_pages = 1
+        prefetch = ScraperSettings.PREFETCH_PAGES if prefetch is None else prefetch
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch') if prefetch and max_pages > 1 else None
+
+        # Prefetched pages keep the priority of the thread reading the stream
+        priority = current_priority()
+
+        def fetch(page):
+            with request_priority(priority):
+                return NyaaScraper.fetch_rows(NyaaScraper.page_url(url, page), backend, since_id=since_id)
+
+        pending = executor.submit(fetch, 1) if executor else None
+        remaining = limit
         try:
-            resp = requests.get(url, timeout=15)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            
-            # Try different selectors to find torrent rows
-            torrent_rows = soup.select('tbody tr')
-            if not torrent_rows:
-                torrent_rows = soup.select('tr')
-            
-            logging.debug(f"Found {len(torrent_rows)} potential torrent rows in the HTML.")
+            for page in range(1, max_pages + 1):
+                try:
+                    rows = pending.result() if pending else fetch(page)
+                except requests.exceptions.RequestException as e:
+                    if page == 1:
+                        raise
+                    logging.warning(f"Stopping at page {page} of {url}: {e}")
+                    return
+                pending = None
+
+                last_page = len(rows) < ScraperSettings.PAGE_SIZE or page == max_pages
+                if executor and not last_page:
+                    pending = executor.submit(fetch, page + 1)
+
+                if until_date:
+                    kept = [row for row in rows if not row['date'] or row['date'] >= until_date]
+                    last_page = last_page or len(kept) < len(rows)
+                    rows = kept
+                if remaining is not None:
+                    last_page = last_page or len(rows) >= remaining
+                    rows = rows[:remaining]
+                    remaining -= len(rows)
+
+                logging.debug(f"Page {page} of {url}: {len(rows)} rows")
+                # With since_id an empty page still tells the caller the mark was reached
+                if rows or page == 1 or since_id is not None:
+                    yield rows
+                if last_page or (stop_event is not None and stop_event.is_set()):
+                    return
+        finally:
+            if pending is not None:
+                pending.cancel()
+            if executor:
+                executor.shutdown(wait=False)
+
+    @staticmethod
+    def resolve_backend(anime_title=None, tracker=None):
+        """Feed backend ('html' or 'rss') for a series: per-series override or the global default"""
+        if tracker and anime_title:
+            backend = tracker.get_feed_backend(anime_title)
+            if backend:
+                return backend
+        return ScraperSettings.FEED_BACKEND
+
+    @staticmethod
+    def incremental_url(url):
+        """Rewrite a listing URL to sort by torrent ID, newest first (s=id&o=desc)"""
+        parts = urlsplit(url)
+        params = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in ('s', 'o', 'p')]
+        params += [('s', 'id'), ('o', 'desc')]
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(params), parts.fragment))
+
+    @staticmethod
+    def fetch_new_rows(url, backend='html', since_id=None, quality_settings=None):
+        """Rows of a listing sorted by ID (see incremental_url) newer than since_id, across pages.
+
+        Pages are read until the one holding since_id, at most
+        ScraperSettings.MAX_PAGES; without since_id only page 1 is read.
+        Returns (rows, complete): complete is False when every page read was
+        full without reaching since_id (or a later page failed), so older new
+        uploads were not seen and the mark must not move past them. Row
+        indexes continue across pages, a lower one still being more recent.
+        """
+        if since_id is None:
+            return NyaaScraper.fetch_rows(url, backend, quality_settings), True
+        rows = []
+        complete = False
+        for number, page in enumerate(NyaaScraper.iter_row_pages(url, backend, since_id=since_id)):
+            offset = number * ScraperSettings.PAGE_SIZE
+            # Cached rows are shared, so renumbered rows are copies
+            rows.extend(dict(row, row_index=row['row_index'] + offset) if offset else row for row in page)
+            complete = len(page) < ScraperSettings.PAGE_SIZE
+        return rows, complete
+
+    @staticmethod
+    def parse_html_rows(html, title_filter=None, stop_at_id=None):
+        """Parse a Nyaa.si listing page into raw torrent rows (see RowExtractor)"""
+        return get_row_extractor().extract(html, title_filter, stop_at_id)
+
+    @staticmethod
+    def fetch_rows(url, backend='html', quality_settings=None, since_id=None):
+        """Fetch a listing URL and return its raw torrent rows.
+
+        backend 'html' parses the page itself, 'rss' streams the page's RSS feed
+        instead; both return the same row shape. When quality_settings are given,
+        rejected titles are dropped before the rest of the row is extracted.
+        Responses are revalidated against the response cache, and on 304 Not
+        Modified the cached rows are returned without parsing.
+
+        since_id is for pages sorted by ID (see incremental_url): parsing stops
+        at the first torrent at or below it, so only newer rows are returned.
+        """
+        fetch_url = NyaaRssParser.to_rss_url(url) if backend == 'rss' else url
+        filter_signature = quality_settings.filter_signature() if quality_settings else None
+        title_filter = quality_settings.matches_quality_filter if filter_signature else None
+
+        # Filtered and partial row sets are cached separately from the full page
+        cache_key = f"{fetch_url}#quality={filter_signature}" if filter_signature else fetch_url
+        if since_id is not None:
+            cache_key = f"{cache_key}#since={since_id}"
+        cache = get_response_cache()
+        entry = cache.lookup(cache_key) if cache else None
+
+        resp = get_session_manager().get(fetch_url, headers=ResponseCache.conditional_headers(entry),
+                                         stream=(backend == 'rss'))
+        if resp.status_code == 304 and entry is not None:
+            cache.record_hit(cache_key, entry)
+            logging.debug(f"Not modified, using {len(entry['rows'])} cached rows for {fetch_url}")
+            return entry['rows']
+
+        resp.raise_for_status()
+        if backend == 'rss':
+            rows, body_bytes = NyaaRssParser.parse_response(resp, since_id)
+            if title_filter:
+                rows = [row for row in rows if title_filter(row['title'])]
+        else:
+            rows, body_bytes = NyaaScraper.parse_html_rows(resp.text, title_filter, since_id), len(resp.content)
+        if cache:
+            cache.store(cache_key, resp, rows, body_bytes)
+        return rows
+
+    @staticmethod
+    def select_latest_episode(rows, anime_title=None, tracker=None, quality_settings=None, source=''):
+        """Pick the latest episode from already fetched rows.
+        Returns a LatestEpisodeResult (season, episode, magnet), or (None, None, None) if no row qualifies.
+        """
+        allow_multi_episode = tracker.allows_multi_episode(anime_title) if tracker and anime_title else False
+        
+        # Collect all valid episodes with their metadata
+        episodes = []
+        parsed = NyaaScraper.extract_episode_info_many(row['title'] for row in rows)
+        
+        for row, episode_parse in zip(rows, parsed):
+            i = row['row_index']
+            torrent_title = row['title']
+            logging.debug(f"Processing torrent title: {torrent_title}")
+
+            # Extract episode information using enhanced method
+            episode_info, episode_type, matched_text, season_info = episode_parse
             
-            allow_multi_episode = tracker.allows_multi_episode(anime_title) if tracker and anime_title else False
+            # Skip multi-episode files (ranges) unless allowed for this anime
+            if episode_type == "range" and not allow_multi_episode:
+                logging.debug(f"Episode extraction - Title: '{torrent_title}' -> SKIPPED multi-episode range: {episode_info} (matched: '{matched_text}')")
+                continue
             
-            # Collect all valid episodes with their metadata
-            episodes = []
+            # For multi-episode ranges, use the highest episode number
+            if episode_type == "range" and allow_multi_episode:
+                ep_num = episode_info[1]  # Use the end episode of the range
+                logging.debug(f"Episode extraction - Title: '{torrent_title}' -> Multi-episode range allowed: {episode_info} -> Using episode {ep_num} (matched: '{matched_text}')")
+            else:
+                ep_num = episode_info if episode_type == "single" else None
             
-            for i, row in enumerate(torrent_rows):
-                logging.debug(f"Processing row {i}")
+            if ep_num:
+                magnet = row['magnet']
                 
-                # Find the title link (exclude comments links)
-                title_link = None
-                all_view_links = row.find_all('a', href=re.compile(r'/view/\d+'))
-                for link in all_view_links:
-                    href = link.get('href', '')
-                    classes = link.get('class', [])
-                    if '#comments' not in href and 'comments' not in classes:
-                        title_link = link
-                        break
-                        
-                if not title_link:
-                    logging.debug(f"No title link found in row {i}")
-                    continue
-                    
-                torrent_title = title_link.get('title') or title_link.get_text().strip()
-                logging.debug(f"Processing torrent title: {torrent_title}")
+                season_text = f" Season {season_info}" if season_info else ""
+                logging.debug(f"Episode extraction - Title: '{torrent_title}' -> Episode: {ep_num}{season_text} (matched: '{matched_text}') - Row index: {i}")
 
-                # Extract episode information using enhanced method
-                episode_info, episode_type, matched_text, season_info = NyaaScraper.extract_episode_info(torrent_title)
-                
-                # Skip multi-episode files (ranges) unless allowed for this anime
-                if episode_type == "range" and not allow_multi_episode:
-                    logging.debug(f"Episode extraction - Title: '{torrent_title}' -> SKIPPED multi-episode range: {episode_info} (matched: '{matched_text}')")
+                # Apply quality filtering if settings provided
+                if quality_settings and not quality_settings.matches_quality_filter(torrent_title):
+                    logging.debug(f"Quality filter rejected: {torrent_title}")
                     continue
-                
-                # For multi-episode ranges, use the highest episode number
-                if episode_type == "range" and allow_multi_episode:
-                    ep_num = episode_info[1]  # Use the end episode of the range
-                    logging.debug(f"Episode extraction - Title: '{torrent_title}' -> Multi-episode range allowed: {episode_info} -> Using episode {ep_num} (matched: '{matched_text}')")
-                else:
-                    ep_num = episode_info if episode_type == "single" else None
-                
-                if ep_num:
-                    # Find the magnet link within the current row
-                    magnet_link_tag = row.find('a', href=re.compile(r'^magnet:'))
-                    magnet = magnet_link_tag['href'] if magnet_link_tag else None
-                    
-                    season_text = f" Season {season_info}" if season_info else ""
-                    logging.debug(f"Episode extraction - Title: '{torrent_title}' -> Episode: {ep_num}{season_text} (matched: '{matched_text}') - Row index: {i}")
-
-                    # Apply quality filtering if settings provided
-                    if quality_settings and not quality_settings.matches_quality_filter(torrent_title):
-                        logging.debug(f"Quality filter rejected: {torrent_title}")
-                        continue
-
-                    episodes.append({
-                        'episode': ep_num,
-                        'season': season_info,
-                        'magnet': magnet,
-                        'title': torrent_title,
-                        'row_index': i,  # Lower index = more recent upload
-                        'matched_text': matched_text
-                    })
-                else:
-                    logging.debug(f"No episode number found in title: {torrent_title}")
-            
-            if not episodes:
-                logging.info(f"No valid episodes found in {url}")
-                return None, None, None
-            
-            # Smart episode selection logic:
-            # 1. If we have season info, prioritize the highest season
-            # 2. Within the same season (or no season), prioritize the highest episode
-            # 3. If episodes are equal, prioritize the most recent upload (lower row_index)
-            
-            # Separate episodes with and without season info
-            episodes_with_season = [ep for ep in episodes if ep['season'] is not None]
-            episodes_without_season = [ep for ep in episodes if ep['season'] is None]
+
+                episodes.append({
+                    'episode': ep_num,
+                    'first_episode': episode_info[0] if episode_type == "range" else ep_num,
+                    'season': season_info,
+                    'magnet': magnet,
+                    'title': torrent_title,
+                    'row_index': i,  # Lower index = more recent upload
+                    'matched_text': matched_text,
+                    'uploaded': NyaaScraper.upload_timestamp(row),
+                })
+            else:
+                logging.debug(f"No episode number found in title: {torrent_title}")
+        
+        if not episodes:
+            logging.info(f"No valid episodes found in {source}")
+            return None, None, None
+        
+        # Smart episode selection logic:
+        # 1. If we have season info, prioritize the highest season
+        # 2. Within the same season (or no season), prioritize the highest episode
+        # 3. If episodes are equal, prioritize the most recent upload (lower row_index)
+        
+        # Separate episodes with and without season info
+        episodes_with_season = [ep for ep in episodes if ep['season'] is not None]
+        episodes_without_season = [ep for ep in episodes if ep['season'] is None]
+        
+        latest_episode = None
+        
+        if episodes_with_season:
+            # Find the highest season
+            max_season = max(ep['season'] for ep in episodes_with_season)
+            current_season_episodes = [ep for ep in episodes_with_season if ep['season'] == max_season]
             
-            latest_episode = None
+            # Within the highest season, find the highest episode number
+            # If tied, prefer the most recent upload (lower row_index)
+            latest_episode = max(current_season_episodes, 
+                               key=lambda x: (x['episode'], -x['row_index']))
             
-            if episodes_with_season:
-                # Find the highest season
-                max_season = max(ep['season'] for ep in episodes_with_season)
-                current_season_episodes = [ep for ep in episodes_with_season if ep['season'] == max_season]
-                
-                # Within the highest season, find the highest episode number
-                # If tied, prefer the most recent upload (lower row_index)
-                latest_episode = max(current_season_episodes, 
-                                   key=lambda x: (x['episode'], -x['row_index']))
-                
-                logging.info(f"Found episodes with season info. Latest: Season {latest_episode['season']} Episode {latest_episode['episode']} (row {latest_episode['row_index']})")
+            logging.info(f"Found episodes with season info. Latest: Season {latest_episode['season']} Episode {latest_episode['episode']} (row {latest_episode['row_index']})")
+        
+        # If no season info available, or if episodes without season info have higher episode numbers
+        # than the latest seasoned episode, consider them
+        if episodes_without_season:
+            # Find the highest episode number among non-seasoned episodes
+            # If tied, prefer the most recent upload (lower row_index)
+            latest_no_season = max(episodes_without_season, 
+                                 key=lambda x: (x['episode'], -x['row_index']))
             
-            # If no season info available, or if episodes without season info have higher episode numbers
-            # than the latest seasoned episode, consider them
-            if episodes_without_season:
-                # Find the highest episode number among non-seasoned episodes
-                # If tied, prefer the most recent upload (lower row_index)
-                latest_no_season = max(episodes_without_season, 
-                                     key=lambda x: (x['episode'], -x['row_index']))
+            # If we don't have a seasoned episode, or if the non-seasoned episode
+            # appears more recent (lower row index) and has a reasonable episode number
+            if (latest_episode is None or 
+                (latest_no_season['row_index'] < latest_episode['row_index'] and 
+                 latest_no_season['episode'] >= latest_episode['episode'] - 5)):  # Allow some tolerance
                 
-                # If we don't have a seasoned episode, or if the non-seasoned episode
-                # appears more recent (lower row index) and has a reasonable episode number
+                # Additional check: if the non-seasoned episode has a much higher number,
+                # it might be from an older season, so be more conservative
                 if (latest_episode is None or 
-                    (latest_no_season['row_index'] < latest_episode['row_index'] and 
-                     latest_no_season['episode'] >= latest_episode['episode'] - 5)):  # Allow some tolerance
-                    
-                    # Additional check: if the non-seasoned episode has a much higher number,
-                    # it might be from an older season, so be more conservative
-                    if (latest_episode is None or 
-                        latest_no_season['episode'] <= latest_episode['episode'] + 10):
-                        latest_episode = latest_no_season
-                        logging.info(f"Selected non-seasoned episode: Episode {latest_episode['episode']} (row {latest_episode['row_index']})")
-            
-            if latest_episode:
-                season_to_return = latest_episode.get('season') if latest_episode.get('season') is not None else 1
-                logging.info(f"Final selection - Episode: {latest_episode['episode']}, Season: {season_to_return}, Title: {latest_episode['title'][:100]}...")
-                return season_to_return, latest_episode['episode'], latest_episode['magnet']
-            else:
-                logging.info(f"No suitable episode found in {url}")
-                return None, None, None
-                
+                    latest_no_season['episode'] <= latest_episode['episode'] + 10):
+                    latest_episode = latest_no_season
+                    logging.info(f"Selected non-seasoned episode: Episode {latest_episode['episode']} (row {latest_episode['row_index']})")
+        
+        if latest_episode:
+            season_to_return = latest_episode.get('season') if latest_episode.get('season') is not None else 1
+            logging.info(f"Final selection - Episode: {latest_episode['episode']}, Season: {season_to_return}, Title: {latest_episode['title'][:100]}...")
+            missing = NyaaScraper.find_missing_episodes(episodes, (season_to_return, latest_episode['episode']),
+                                                        anime_title, tracker)
+            return LatestEpisodeResult(season_to_return, latest_episode['episode'], latest_episode['magnet'],
+                                       missing=missing, release_times=NyaaScraper.release_times(episodes))
+        else:
+            logging.info(f"No suitable episode found in {source}")
+            return None, None, None
+
+    @staticmethod
+    def find_missing_episodes(episodes, latest, anime_title=None, tracker=None):
+        """Pick uploads that fill gaps in a series' episode inventory.
+
+        episodes are the candidates collected by select_latest_episode and
+        latest is the (season, episode) it selected. Every single-episode
+        upload up to the highest episode of its season that the inventory
+        lacks is returned, the most recent upload of each episode, as
+        [(season, episode, magnet)] in ascending order. The selected latest
+        episode is left out when it is newer than the tracked one, since the
+        caller downloads it anyway.
+        """
+        if not tracker or not anime_title:
+            return []
+        inventory = tracker.get_inventory(anime_title)
+        latest_is_new = latest > tuple(tracker.get_last_season_and_episode(anime_title))
+
+        by_season = {}
+        for ep in episodes:
+            # Uploads without season info count as season 1, as in the latest episode selection
+            by_season.setdefault(ep['season'] if ep['season'] is not None else 1, []).append(ep)
+
+        missing = []
+        for season, season_episodes in sorted(by_season.items()):
+            gaps = set(inventory.missing(season, max(ep['episode'] for ep in season_episodes)))
+            if latest_is_new and season == latest[0]:
+                gaps.discard(latest[1])
+            best = {}
+            for ep in season_episodes:
+                if ep['first_episode'] == ep['episode'] and ep['episode'] in gaps:
+                    if ep['episode'] not in best or ep['row_index'] < best[ep['episode']]['row_index']:
+                        best[ep['episode']] = ep
+            missing.extend((season, episode, best[episode]['magnet']) for episode in sorted(best))
+        if missing:
+            logging.info(f"Found {len(missing)} upload(s) filling gaps for {anime_title}: "
+                         f"{', '.join(f'S{s}E{e}' for s, e, _ in missing)}")
+        return missing
+
+    @staticmethod
+    def release_times(episodes):
+        """{(season, episode): first upload time} of the single-episode candidates"""
+        times = {}
+        for ep in episodes:
+            if ep['uploaded'] is None or ep['first_episode'] != ep['episode']:
+                continue
+            key = (ep['season'] if ep['season'] is not None else 1, ep['episode'])
+            if key not in times or ep['uploaded'] < times[key]:
+                times[key] = ep['uploaded']
+        return times
+
+    @staticmethod
+    def select_new_episode(rows, since_id, anime_title=None, tracker=None, quality_settings=None, source='',
+                           complete=True):
+        """Incremental select_latest_episode: only rows newer than since_id are considered.
+        With complete=False (see fetch_new_rows) the rows do not reach since_id, and the
+        high-water mark stays where it is. Returns a LatestEpisodeResult.
+        """
+        if since_id is not None:
+            rows = [row for row in rows if row.get('torrent_id') is None or row['torrent_id'] > since_id]
+            if not rows:
+                logging.info(f"No uploads newer than torrent {since_id} in {source}")
+                return LatestEpisodeResult(None, None, None, unchanged=True, max_torrent_id=since_id)
+
+        max_torrent_id = max((row['torrent_id'] for row in rows if row.get('torrent_id') is not None),
+                             default=since_id)
+        if not complete:
+            logging.warning(f"More than {ScraperSettings.MAX_PAGES} pages of new uploads in {source}, "
+                            f"keeping the torrent ID mark {since_id}")
+            max_torrent_id = since_id
+        latest = NyaaScraper.select_latest_episode(rows, anime_title, tracker, quality_settings, source=source)
+        season, episode, magnet = latest
+        # New uploads that hold no usable episode leave the series as it was
+        unchanged = since_id is not None and episode is None
+        return LatestEpisodeResult(season, episode, magnet, unchanged=unchanged, max_torrent_id=max_torrent_id,
+                                   missing=getattr(latest, 'missing', None),
+                                   release_times=getattr(latest, 'release_times', None))
+
+    @staticmethod
+    def get_latest_episode_and_magnet(url, anime_title=None, tracker=None, quality_settings=None, incremental=False):
+        """Returns (season, episode, magnet).
+        Raises CircuitOpenError while requests to the host are refused.
+
+        With incremental=True the listing is read newest first and only uploads
+        above the series' high-water torrent ID (AnimeTracker.get_last_torrent_id)
+        are parsed, page after page down to it; a LatestEpisodeResult is returned.
+        """
+        logging.info(f"Attempting to scrape URL: {url}")
+        try:
+            backend = NyaaScraper.resolve_backend(anime_title, tracker)
+            if incremental:
+                since_id = tracker.get_last_torrent_id(anime_title) if tracker and anime_title else None
+                rows, complete = NyaaScraper.fetch_new_rows(NyaaScraper.incremental_url(url), backend, since_id,
+                                                            quality_settings)
+                return NyaaScraper.select_new_episode(rows, since_id, anime_title, tracker, quality_settings,
+                                                      source=url, complete=complete)
+            rows = NyaaScraper.fetch_rows(url, backend, quality_settings)
+            return NyaaScraper.select_latest_episode(rows, anime_title, tracker, quality_settings, source=url)
+        except CircuitOpenError:
+            # The host is known to be failing; let the caller skip the rest of its series
+            raise
         except requests.exceptions.RequestException as e:
             logging.error(f"Network or HTTP error during scraping {url}: {e}")
             return None, None, None
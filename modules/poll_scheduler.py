@@ -0,0 +1,205 @@
+import heapq
+import itertools
+import logging
+import random
+import statistics
+import threading
+import time
+
+from settings import ScheduleSettings
+
+
+class PollScheduler:
+    """Decides when each tracked series is next due for a check.
+
+    The first upload time of every episode seen on a series' page is kept
+    in its release history (tracker field ``schedule``). The median gap
+    between the last few releases is the series' period, e.g. a week for a
+    simulcast, and the last release plus the period is the expected next
+    one. Inside the window around that time the series is polled every
+    DENSE_INTERVAL. Outside it, the interval doubles after every check
+    that found nothing, up to MAX_INTERVAL, but a check is never scheduled
+    past the start of the next window.
+
+    Series without a learned cadence (or all of them, with
+    ScheduleSettings.ADAPTIVE off) are polled every ``base_interval`` (the
+    check interval), and a per-series ``poll_interval`` stored in the
+    tracker overrides the schedule. Every next check time gets a random
+    jitter, so series drift apart instead of coming due together.
+
+    For a long-running loop the scheduler also keeps a priority queue (a
+    heap of next check times) of the tracked series: ``pop_due`` returns
+    the series whose time has come and ``next_time`` tells how long the loop
+    may sleep. Heap entries are replaced rather than removed; an entry whose
+    time no longer matches the series' current one is skipped when popped.
+    """
+
+    def __init__(self, tracker, base_interval):
+        self.tracker = tracker
+        self.base_interval = base_interval
+        self._heap = []   # (due time, sequence, title)
+        self._due = {}    # title -> due time of its current heap entry
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cadence(schedule):
+        """Return (period, spread, last release) learned from a schedule, or None"""
+        times = sorted(ts for _, _, ts in schedule.get('releases', []))
+        gaps = [b - a for a, b in zip(times, times[1:]) if b - a >= ScheduleSettings.MIN_RELEASE_GAP]
+        if len(gaps) < 2:
+            return None
+        period = statistics.median(gaps)
+        if period > ScheduleSettings.MAX_RELEASE_PERIOD:
+            return None
+        spread = statistics.median(abs(gap - period) for gap in gaps)
+        return period, spread, times[-1]
+
+    @staticmethod
+    def window(cadence, now):
+        """(start, end) of the release window containing now, or else the next one"""
+        period, spread, last_release = cadence
+        # Irregular series get a wider window, on both sides
+        before = ScheduleSettings.WINDOW_BEFORE + 2 * spread
+        after = ScheduleSettings.WINDOW_AFTER + 2 * spread
+        expected = last_release + period
+        if expected + after < now:
+            # Late or on a break: move on to the next expected release
+            expected += ((now - expected - after) // period + 1) * period
+        return expected - before, expected + after
+
+    def next_check(self, info, now):
+        """When to check a series again after a check at now (jittered)"""
+        return self._jitter(self._next_check(info, now), now)
+
+    def _next_check(self, info, now):
+        override = info.get('poll_interval')
+        if override:
+            return now + override
+        schedule = info.get('schedule', {})
+        cadence = self.cadence(schedule) if ScheduleSettings.ADAPTIVE else None
+        if cadence is None:
+            return now + self.base_interval
+        start, end = self.window(cadence, now)
+        if start <= now <= end:
+            return now + ScheduleSettings.DENSE_INTERVAL
+        backoff = min(ScheduleSettings.DENSE_INTERVAL * 2 ** schedule.get('misses', 0), ScheduleSettings.MAX_INTERVAL)
+        return min(now + backoff, start)
+
+    @staticmethod
+    def _jitter(when, now):
+        spread = min((when - now) * ScheduleSettings.JITTER_FRACTION, ScheduleSettings.MAX_JITTER)
+        return max(when + random.uniform(-spread, spread), now + ScheduleSettings.MIN_WAKE_INTERVAL)
+
+    @staticmethod
+    def is_due(info, now):
+        next_check = info.get('schedule', {}).get('next_check')
+        return next_check is None or next_check <= now
+
+    def due(self, entries, now=None):
+        """The (title, info) entries due for a check"""
+        now = time.time() if now is None else now
+        return [(title, info) for title, info in entries if self.is_due(info, now)]
+
+    def _push(self, title, due):
+        """Queue a series (lock held), replacing its previous entry"""
+        self._due[title] = due
+        heapq.heappush(self._heap, (due, next(self._sequence), title))
+
+    def _spread(self, titles, now):
+        """Queue series that are due now spread over STARTUP_SPREAD instead of all at once (lock held)"""
+        titles = list(titles)
+        step = ScheduleSettings.STARTUP_SPREAD / len(titles) if titles else 0
+        for i, title in enumerate(titles):
+            self._push(title, now + (i + random.random()) * step if i else now)
+
+    def rebuild(self, entries, now=None):
+        """Fill the queue from the tracker's stored next check times.
+        Overdue and never checked series are spread out so they do not all fire at once;
+        a series already queued for an earlier time (e.g. bumped) keeps that time.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            queued = self._due
+            self._heap = []
+            self._due = {}
+            overdue = []
+            for title, info in entries:
+                next_check = info.get('schedule', {}).get('next_check')
+                if title in queued and (next_check is None or queued[title] < next_check):
+                    self._push(title, queued[title])
+                elif next_check is None or next_check <= now:
+                    overdue.append(title)
+                else:
+                    self._push(title, next_check)
+            self._spread(overdue, now)
+
+    def sync(self, titles, now=None):
+        """Queue series added to the tracker (or dropped by an interrupted check) and forget removed ones"""
+        now = time.time() if now is None else now
+        with self._lock:
+            missing = [title for title in titles if title not in self._due]
+            for title in [title for title in self._due if title not in titles]:
+                del self._due[title]
+            if missing:
+                self._spread(missing, now)
+
+    def bump(self, titles=None, when=None):
+        """Move series (default: all queued) to the front of the queue, due at when (default now)"""
+        when = time.time() if when is None else when
+        with self._lock:
+            for title in list(self._due) if titles is None else titles:
+                self._push(title, when)
+
+    def next_time(self):
+        """Due time of the first queued series, or None when the queue is empty"""
+        with self._lock:
+            while self._heap:
+                due, _, title = self._heap[0]
+                if self._due.get(title) == due:
+                    return due
+                heapq.heappop(self._heap)  # replaced or removed
+            return None
+
+    def pop_due(self, now=None):
+        """Take every series due by now (or within COALESCE_WINDOW of it) off the queue.
+        They are queued again by record().
+        """
+        now = time.time() if now is None else now
+        titles = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now + ScheduleSettings.COALESCE_WINDOW:
+                due, _, title = heapq.heappop(self._heap)
+                if self._due.get(title) == due:
+                    del self._due[title]
+                    titles.append(title)
+        return titles
+
+    def record(self, title, result, found_new, now=None):
+        """Update a series' schedule after a check.
+
+        result may carry ``release_times`` (LatestEpisodeResult); found_new
+        tells whether the check produced a new episode.
+        """
+        now = time.time() if now is None else now
+        if title not in self.tracker.data:
+            return
+        info = self.tracker.series(title)
+        schedule = dict(info.get('schedule', {}))
+
+        releases = {(season, episode): ts for season, episode, ts in schedule.get('releases', [])}
+        for key, ts in getattr(result, 'release_times', {}).items():
+            if key not in releases or ts < releases[key]:
+                releases[key] = ts
+        newest = sorted(releases.items(), key=lambda item: item[1])[-ScheduleSettings.HISTORY:]
+        schedule['releases'] = [[season, episode, ts] for (season, episode), ts in newest]
+
+        # The back-off restarts after a new episode and after every pass through the window
+        cadence = self.cadence(schedule)
+        in_window = cadence is not None and self.window(cadence, now)[0] <= now
+        schedule['misses'] = 0 if found_new or in_window else schedule.get('misses', 0) + 1
+        schedule['next_check'] = int(self.next_check(dict(info, schedule=schedule), now))
+        self.tracker.set_schedule(title, schedule)
+        with self._lock:
+            self._push(title, schedule['next_check'])
+        logging.debug(f"Next check of {title} in {(schedule['next_check'] - now) / 60:.0f} min")
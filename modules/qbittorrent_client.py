@@ -1,11 +1,32 @@
+import threading
+import time
+
 import qbittorrentapi
-from settings import QBittorrentConfig
+from settings import NetworkSettings, QBittorrentConfig
+from utils.magnet_utils import parse_infohash
 
 
 class QBittorrentClient:
+    # Fields of each torrent kept from sync/maindata
+    STATUS_FIELDS = ('name', 'progress', 'state', 'dlspeed', 'eta')
+
     def __init__(self, config: QBittorrentConfig):
         self.config = config
+        # Later changes to the (mutable) config object must not go unnoticed
+        self.signature = self.config_signature(config)
         self.client = None
+        self.logins = 0
+        self._login_lock = threading.Lock()
+        # Torrents in qBittorrent (infohash -> STATUS_FIELDS), kept current with sync/maindata deltas
+        self._torrents = None
+        self._rid = 0
+        self._synced_at = 0.0
+        self._torrents_lock = threading.Lock()
+
+    @staticmethod
+    def config_signature(config):
+        """The settings a client's session depends on"""
+        return str(config.host), str(config.port), config.username, config.password
 
     def connect(self):
         try:
@@ -17,7 +38,7 @@ class QBittorrentClient:
                 REQUESTS_ARGS={'timeout': (5, 10)}  # 5s connect, 10s read timeout
             )
             print("[DEBUG] Attempting authentication...")
-            self.client.auth_log_in()
+            self._log_in()
             print("[DEBUG] Authentication successful")
             return True, ''
         except qbittorrentapi.exceptions.APIConnectionError as e:
@@ -36,12 +57,103 @@ class QBittorrentClient:
             print(f"[DEBUG] Connection failed: {error_msg}")
             return False, error_msg
 
+    def _log_in(self):
+        with self._login_lock:
+            self.logins += 1
+            self.client.auth_log_in()
+
+    def call(self, method, *args, **kwargs):
+        """Call a qbittorrentapi.Client method; an expired session (403) is logged in again once"""
+        try:
+            return getattr(self.client, method)(*args, **kwargs)
+        except qbittorrentapi.exceptions.Forbidden403Error:
+            print("[DEBUG] qBittorrent session expired, logging in again")
+            self._log_in()
+            return getattr(self.client, method)(*args, **kwargs)
+
+    def ping(self):
+        """Check that qBittorrent answers on the current session; returns (ok, error)"""
+        try:
+            self.call('app_version')
+            return True, ''
+        except qbittorrentapi.exceptions.APIConnectionError as e:
+            return False, f"Cannot connect to qBittorrent at {self.config.host}:{self.config.port}: {e}"
+        except Exception as e:
+            return False, f"qBittorrent connection error: {str(e)}"
+
+    def _sync_torrents(self, max_age):
+        """Bring the cached torrent list up to date; the caller holds _torrents_lock.
+
+        The first sync downloads the full list (sync/maindata with rid 0);
+        later ones only ask for the changes since the last response id
+        (new torrents, the fields that changed, removed torrents), and not
+        at all within max_age seconds. On failure the cache stays as it was
+        (None before the first successful sync).
+        """
+        if self._torrents is not None and time.monotonic() - self._synced_at < max_age:
+            return
+        try:
+            data = self.call('sync_maindata', rid=self._rid)
+        except Exception as e:
+            print(f"[DEBUG] Could not sync the qBittorrent torrent list: {e}")
+            return
+        if data.get('full_update') or self._torrents is None:
+            self._torrents = {}
+        for infohash, fields in (data.get('torrents') or {}).items():
+            torrent = self._torrents.setdefault(infohash.lower(), {})
+            torrent.update((field, value) for field, value in fields.items() if field in self.STATUS_FIELDS)
+        for infohash in data.get('torrents_removed') or ():
+            self._torrents.pop(infohash.lower(), None)
+        self._rid = data.get('rid', 0)
+        self._synced_at = time.monotonic()
+
+    def torrent_hashes(self, max_age=None):
+        """Infohashes of all torrents in qBittorrent, or None if they can't be fetched.
+
+        The list is cached and kept current with sync/maindata deltas at most
+        every max_age seconds (default NetworkSettings.QB_SYNC_INTERVAL).
+        """
+        with self._torrents_lock:
+            self._sync_torrents(NetworkSettings.QB_SYNC_INTERVAL if max_age is None else max_age)
+            return None if self._torrents is None else set(self._torrents)
+
+    def torrent_status(self, infohashes, max_age=None):
+        """STATUS_FIELDS of the given torrents that are in qBittorrent, or None if the list can't be fetched.
+
+        Returns:
+            dict: infohash -> {field: value}, for the infohashes qBittorrent has
+        """
+        with self._torrents_lock:
+            self._sync_torrents(NetworkSettings.QB_SYNC_INTERVAL if max_age is None else max_age)
+            if self._torrents is None:
+                return None
+            return {infohash: dict(self._torrents[infohash]) for infohash in infohashes if infohash in self._torrents}
+
+    def _remember(self, infohashes):
+        """Add torrents we know were just added to the cached list (their fields come with the next sync)"""
+        with self._torrents_lock:
+            if self._torrents is not None:
+                for infohash in infohashes:
+                    self._torrents.setdefault(infohash, {})
+
+    def present(self, magnets):
+        """The magnets whose torrent is already in qBittorrent, checked against the cached list"""
+        with self._torrents_lock:
+            self._sync_torrents(NetworkSettings.QB_SYNC_INTERVAL)
+            if not self._torrents:
+                return set()
+            return {magnet for magnet in magnets if parse_infohash(magnet) in self._torrents}
+
     def add_magnet(self, magnet, category=None):
+        if self.present([magnet]):
+            print("[DEBUG] Torrent is already in qBittorrent, not adding it again")
+            return True, ''
         try:
             kwargs = {'urls': magnet}
             if category:
                 kwargs['category'] = category
-            self.client.torrents_add(**kwargs)
+            self.call('torrents_add', **kwargs)
+            self._remember(filter(None, [parse_infohash(magnet)]))
             return True, ''
         except qbittorrentapi.exceptions.Conflict409Error as e:
             error_msg = "Torrent already exists in qBittorrent or the magnet link is invalid."
@@ -52,3 +164,155 @@ class QBittorrentClient:
         except Exception as e:
             error_msg = f"Failed to add torrent to qBittorrent: {str(e)}"
             return False, error_msg
+
+    def add_magnets(self, magnets, category=None):
+        """Add several magnets with one torrents_add call per QB_BATCH_SIZE magnets.
+
+        Magnets whose torrent is already in qBittorrent (see _sync_torrents)
+        are not sent and count as added. qBittorrent only answers for the
+        call as a whole, so afterwards the infohashes are looked up with
+        torrents_info: a magnet whose torrent is listed succeeded.
+
+        Returns:
+            dict: magnet -> (success, error_message)
+        """
+        magnets = list(dict.fromkeys(magnets))
+        present = self.present(magnets)
+        results = {magnet: (True, '') for magnet in present}
+        if present:
+            print(f"[DEBUG] {len(present)} torrent(s) already in qBittorrent, not adding them again")
+        magnets = [magnet for magnet in magnets if magnet not in present]
+        for start in range(0, len(magnets), NetworkSettings.QB_BATCH_SIZE):
+            results.update(self._add_batch(magnets[start:start + NetworkSettings.QB_BATCH_SIZE], category))
+        return results
+
+    def _wait_listed(self, infohashes):
+        """Which of the infohashes qBittorrent lists, or None if it can't be asked.
+
+        torrents_add returns before the torrents are added, so the ones not
+        listed yet are looked up again, up to QB_RECONCILE_ATTEMPTS times
+        with a doubling delay.
+        """
+        listed = set()
+        delay = NetworkSettings.QB_RECONCILE_DELAY
+        for attempt in range(NetworkSettings.QB_RECONCILE_ATTEMPTS):
+            pending = infohashes - listed
+            if not pending:
+                break
+            if attempt:
+                time.sleep(delay)
+                delay *= 2
+            try:
+                found = {torrent.hash.lower() for torrent in self.call('torrents_info', torrent_hashes='|'.join(pending))}
+            except Exception as e:
+                # Can't tell which ones landed; go by the answer to the add call
+                print(f"[DEBUG] Could not look up added torrents: {e}")
+                return None
+            self._remember(found)
+            listed |= found
+        return listed
+
+    def _add_batch(self, magnets, category):
+        kwargs = {'urls': magnets}
+        if category:
+            kwargs['category'] = category
+        error_msg = ''
+        try:
+            self.call('torrents_add', **kwargs)
+        except qbittorrentapi.exceptions.Conflict409Error:
+            error_msg = "Torrent already exists in qBittorrent or the magnet link is invalid."
+        except qbittorrentapi.exceptions.Forbidden403Error:
+            return {magnet: (False, "Access denied. Please check your qBittorrent permissions.") for magnet in magnets}
+        except Exception as e:
+            return {magnet: (False, f"Failed to add torrent to qBittorrent: {str(e)}") for magnet in magnets}
+
+        hashes = {magnet: parse_infohash(magnet) for magnet in magnets}
+        listed = self._wait_listed({infohash for infohash in hashes.values() if infohash})
+
+        results = {}
+        for magnet, infohash in hashes.items():
+            if listed is None or infohash is None:
+                results[magnet] = (not error_msg, error_msg)
+            elif infohash in listed:
+                results[magnet] = (True, '')
+            else:
+                results[magnet] = (False, error_msg or "qBittorrent did not add the torrent.")
+        return results
+
+
+class QBittorrentClientManager:
+    """Long-lived, logged in QBittorrentClients shared by the whole process.
+
+    One client (one authenticated session) is kept per qBittorrent host and
+    port. It is created and logged in on first use and reused for every
+    later connection test and submission; QBittorrentClient.call logs in
+    again when the session has expired. A client is only replaced when the
+    configuration of its host changes (other credentials), or after
+    ``invalidate``.
+    """
+
+    def __init__(self):
+        self._clients = {}  # (host, port) -> QBittorrentClient
+        self._connecting = {}  # (host, port) -> lock held while a client for it logs in
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(config):
+        return str(config.host), str(config.port)
+
+    def _current(self, key, config):
+        """The stored client of key if it was created with config's settings (lock held)"""
+        client = self._clients.get(key)
+        if client is not None and client.signature == QBittorrentClient.config_signature(config):
+            return client
+        return None
+
+    def get(self, config):
+        """Return (client, error): the logged in client for config, or (None, error) if it can't connect"""
+        key = self._key(config)
+        with self._lock:
+            client = self._current(key, config)
+            if client is not None:
+                return client, ''
+            connecting = self._connecting.setdefault(key, threading.Lock())
+        # Logging in can take the whole connect and read timeout: only callers
+        # for the same host wait for it, and they get the client it produces
+        with connecting:
+            with self._lock:
+                client = self._current(key, config)
+            if client is not None:
+                return client, ''
+            client = QBittorrentClient(config)
+            connected, err = client.connect()
+            with self._lock:
+                if not connected:
+                    self._clients.pop(key, None)
+                    return None, err
+                self._clients[key] = client
+            return client, ''
+
+    def invalidate(self, config=None):
+        """Forget the client of a config's host (default: all clients); the next get() logs in again"""
+        with self._lock:
+            if config is None:
+                self._clients.clear()
+            else:
+                self._clients.pop(self._key(config), None)
+
+    def stats(self):
+        """Logins per host ("host:port") since each client was created"""
+        with self._lock:
+            return {f"{host}:{port}": client.logins for (host, port), client in self._clients.items()}
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_client_manager():
+    """Return the process-wide QBittorrentClientManager, creating it on first use"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = QBittorrentClientManager()
+        return _manager
@@ -0,0 +1,224 @@
+import logging
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import requests
+
+from modules.check_engine import get_check_engine
+from modules.http_session import CircuitOpenError
+from modules.nyaa_scraper import NyaaScraper
+from settings import ScraperSettings
+
+
+# Characters with a meaning in Nyaa's search syntax; queries using them are never merged
+SPECIAL_QUERY_CHARS = set('|()"*')
+
+# Query parameters that are rewritten for combined searches instead of compared
+COMBINED_PARAMS = ('q', 's', 'o', 'p', 'page')
+
+# Words as Nyaa's full-text search sees them: runs of letters and digits
+WORD_REGEX = re.compile(r'[^\W_]+')
+
+
+class QueryGroup:
+    """One request in a check plan: a single series or several merged into one search"""
+
+    def __init__(self, url, backend, members):
+        self.url = url
+        self.backend = backend
+        self.members = members  # list of (title, info, terms)
+
+    @property
+    def combined(self):
+        return len(self.members) > 1
+
+
+class QueryPlanner:
+    """Groups tracked series whose URLs only differ by search text into
+    combined Nyaa searches using the OR syntax: ``(q1)|(q2)|...``.
+
+    Series are compatible when they share host, path (so the same uploader
+    for /user/<name> pages), category, filter and any other parameter, as
+    well as the feed backend. The combined search is sorted newest first and
+    read down to the oldest member's torrent ID mark (falling back to
+    one request per series when that takes more than MAX_PAGES pages); the
+    rows are handed back to each series by matching its search words against the
+    words of the title, the way Nyaa matches the series' own search. The
+    other URL filters (category, filter, uploader) are part of the group
+    key, so the combined page already applies each series' own filters.
+    """
+
+    def __init__(self, max_series=None, max_query_length=None):
+        self.max_series = max_series or ScraperSettings.COALESCE_MAX_SERIES
+        self.max_query_length = max_query_length or ScraperSettings.COALESCE_MAX_QUERY_LENGTH
+
+    @staticmethod
+    def _split_url(url):
+        """Return (compatibility key, query text) for a URL, or None if it can't be merged"""
+        parts = urlsplit(url)
+        params = parse_qsl(parts.query, keep_blank_values=True)
+        query = ' '.join(value for key, value in params if key == 'q').strip()
+        if not query or SPECIAL_QUERY_CHARS.intersection(query):
+            return None
+        if any(token.startswith('-') for token in query.split()):
+            return None
+        others = tuple(sorted((key, value) for key, value in params if key not in COMBINED_PARAMS))
+        return (parts.scheme, parts.netloc, parts.path, others), query
+
+    @staticmethod
+    def query_terms(query):
+        return [term.lower() for term in WORD_REGEX.findall(query)]
+
+    @staticmethod
+    def matches(terms, title):
+        """True if every search term is a whole word of the torrent title (so "one" doesn't match "someone")"""
+        words = set(WORD_REGEX.findall(title.lower()))
+        return all(term in words for term in terms)
+
+    @classmethod
+    def assign(cls, members, rows):
+        """Hand the rows of a combined page to the members whose search they match.
+
+        When a row matches several members and one's search words include all
+        of another's ("one piece film red" and "one piece"), only the more
+        specific member gets it, so a series doesn't take the uploads of
+        another tracked series that shares its name.
+
+        Returns:
+            dict: title -> list of rows, in page order
+        """
+        assigned = {title: [] for title, _, _ in members}
+        for row in rows:
+            matching = [(title, set(terms)) for title, _, terms in members if cls.matches(terms, row['title'])]
+            for title, terms in matching:
+                if not any(terms < other for _, other in matching):
+                    assigned[title].append(row)
+        return assigned
+
+    def _combined_url(self, key, queries):
+        scheme, netloc, path, others = key
+        combined_query = '|'.join(f'({query})' for query in queries)
+        params = list(others) + [('q', combined_query), ('s', 'id'), ('o', 'desc')]
+        return urlunsplit((scheme, netloc, path, urlencode(params), ''))
+
+    def plan(self, entries, tracker=None):
+        """Split (title, info) entries into QueryGroups, keeping the entry order"""
+        groups = []
+        open_groups = {}  # compatibility key -> (members, queries) still accepting series
+
+        for title, info in entries:
+            backend = NyaaScraper.resolve_backend(title, tracker)
+            split = self._split_url(info['url']) if ScraperSettings.COALESCE_QUERIES else None
+            if split is None:
+                groups.append(QueryGroup(info['url'], backend, [(title, info, None)]))
+                continue
+
+            key, query = split
+            group_key = (key, backend)
+            pending = open_groups.get(group_key)
+            if pending is not None:
+                members, queries = pending
+                combined_length = sum(len(q) + 3 for q in queries) + len(query) + 2
+                if len(members) >= self.max_series or combined_length > self.max_query_length:
+                    pending = None
+            if pending is None:
+                members, queries = [], []
+                open_groups[group_key] = (members, queries)
+                groups.append((group_key, members, queries))
+            members.append((title, info, self.query_terms(query)))
+            queries.append(query)
+
+        plan = []
+        for group in groups:
+            if isinstance(group, QueryGroup):
+                plan.append(group)
+                continue
+            (key, backend), members, queries = group
+            if len(members) == 1:
+                title, info, _ = members[0]
+                plan.append(QueryGroup(info['url'], backend, [(title, info, None)]))
+            else:
+                plan.append(QueryGroup(self._combined_url(key, queries), backend, members))
+        return plan
+
+
+def _check_group(group, tracker, quality_settings, incremental=False):
+    """Resolve the latest episode of every member of a group.
+    Returns: {title: (season, episode, magnet)}, LatestEpisodeResults when incremental
+    """
+    if not group.combined:
+        title, info, _ = group.members[0]
+        return {title: NyaaScraper.get_latest_episode_and_magnet(info['url'], title, tracker, quality_settings,
+                                                                 incremental)}
+
+    # The combined listing is sorted newest first; it is read down to the oldest member mark
+    marks = {title: tracker.get_last_torrent_id(title) if incremental and tracker else None
+             for title, _, _ in group.members}
+    since_id = min(marks.values()) if incremental and None not in marks.values() else None
+
+    logging.info(f"Combined search for {len(group.members)} series: {group.url}")
+    try:
+        rows, complete = NyaaScraper.fetch_new_rows(group.url, group.backend, since_id, quality_settings)
+    except CircuitOpenError:
+        raise
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Network or HTTP error during combined search {group.url}: {e}")
+        return {title: (None, None, None) for title, _, _ in group.members}
+
+    if not complete:
+        # Busy members filled every page before the oldest mark; moving the marks
+        # from these rows would skip the quieter members' uploads further down
+        logging.info(f"Combined search did not reach the oldest mark, checking {len(group.members)} series one by one")
+        return {title: NyaaScraper.get_latest_episode_and_magnet(info['url'], title, tracker, quality_settings,
+                                                                 incremental)
+                for title, info, _ in group.members}
+
+    results = {}
+    assigned = QueryPlanner.assign(group.members, rows)
+    for title, info, _ in group.members:
+        member_rows = assigned[title]
+        if incremental and (member_rows or marks[title] is not None):
+            results[title] = NyaaScraper.select_new_episode(member_rows, marks[title], title, tracker,
+                                                            quality_settings, source=group.url)
+        elif member_rows:
+            results[title] = NyaaScraper.select_latest_episode(member_rows, title, tracker, quality_settings,
+                                                               source=group.url)
+        else:
+            # Nothing recognisable on the shared page; ask for this series on its own
+            logging.debug(f"No rows for {title} in combined search, falling back to its own URL")
+            results[title] = NyaaScraper.get_latest_episode_and_magnet(info['url'], title, tracker, quality_settings,
+                                                                       incremental)
+    return results
+
+
+def check_latest_episodes(entries, tracker, quality_settings, apply_fn, stop_event=None, engine=None,
+                          incremental=False, priority=None):
+    """Find the latest episode of every (title, info) entry with as few requests as possible.
+
+    Compatible series are coalesced by QueryPlanner and every resulting
+    request runs on the CheckEngine. apply_fn(title, info, result, error) is
+    called on the calling thread for every series, group by group in plan
+    order, where result is a (season, episode, magnet) tuple. Series on a
+    host whose circuit breaker is open get a CircuitOpenError as error.
+    priority is the request priority (modules.http_session), background by default.
+
+    With incremental=True only uploads above each series' high-water torrent
+    ID are parsed and results are LatestEpisodeResults; apply_fn should store
+    ``result.max_torrent_id`` once it has handled a result.
+
+    Returns:
+        int: number of requests the plan needed
+    """
+    engine = engine or get_check_engine()
+    plan = QueryPlanner().plan(entries, tracker)
+    logging.info(f"Check plan: {sum(len(g.members) for g in plan)} series in {len(plan)} requests")
+
+    def check(label, group):
+        return _check_group(group, tracker, quality_settings, incremental)
+
+    def apply(label, group, results, error):
+        for title, info, _ in group.members:
+            apply_fn(title, info, results.get(title) if results else None, error)
+
+    engine.run([(group.url, group) for group in plan], check, apply, stop_event, priority)
+    return len(plan)
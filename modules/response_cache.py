@@ -0,0 +1,195 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from settings import CACHE_DIRECTORY, NetworkSettings
+
+
+class ResponseCache:
+    """On-disk conditional-GET cache for Nyaa.si pages.
+
+    Each URL is stored as one small JSON file holding the response
+    validators (ETag / Last-Modified), the size of the original body and the
+    already parsed torrent rows. When the server answers a conditional
+    request with 304 Not Modified, the cached rows are returned and the page
+    is neither downloaded nor parsed again.
+
+    The directory is bounded by ``max_bytes``; the least recently used
+    entries are evicted first.
+    """
+
+    # Bump whenever the shape of the cached rows changes; older entries are ignored
+    FORMAT_VERSION = 3
+
+    def __init__(self, cache_dir=CACHE_DIRECTORY, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes or NetworkSettings.RESPONSE_CACHE_MAX_BYTES
+        self._lock = threading.Lock()
+        self._index = None  # key -> [size_on_disk, last_access]
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def _load_index(self):
+        """Build the size/access index from the files already on disk"""
+        if self._index is not None:
+            return
+        self._index = {}
+        if not os.path.isdir(self.cache_dir):
+            return
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.json'):
+                stat = entry.stat()
+                self._index[entry.name[:-5]] = [stat.st_size, stat.st_mtime]
+
+    def lookup(self, url):
+        """Return the cached entry for a URL, or None"""
+        key = self._key(url)
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                return None
+            try:
+                with open(self._path(key), 'r', encoding='utf-8') as f:
+                    entry = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.debug(f"Discarding unreadable cache entry for {url}: {e}")
+                self._remove(key)
+                return None
+        if entry.get('url') != url or entry.get('format') != self.FORMAT_VERSION:
+            return None
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Request headers that revalidate a cached entry"""
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def record_hit(self, url, entry):
+        """Account for a 304 answer and refresh the entry's LRU position"""
+        key = self._key(url)
+        now = time.time()
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += entry.get('body_bytes', 0)
+            if self._index is not None and key in self._index:
+                self._index[key][1] = now
+                try:
+                    os.utime(self._path(key), (now, now))
+                except OSError:
+                    pass
+
+    def store(self, url, response, rows, body_bytes=None):
+        """Store validators and parsed rows from a full (200) response"""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        with self._lock:
+            self.misses += 1
+        if not etag and not last_modified:
+            # Nothing to revalidate with, so caching the rows would never pay off
+            return
+
+        entry = {
+            'url': url,
+            'format': self.FORMAT_VERSION,
+            'etag': etag,
+            'last_modified': last_modified,
+            'body_bytes': body_bytes if body_bytes is not None else len(response.content),
+            'stored_at': time.time(),
+            'rows': rows,
+        }
+        key = self._key(url)
+        payload = json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+        with self._lock:
+            self._load_index()
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_path = self._path(key) + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(payload)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                logging.warning(f"Could not write response cache entry for {url}: {e}")
+                return
+            self._index[key] = [len(payload), time.time()]
+            self._evict()
+
+    def _evict(self):
+        total = sum(size for size, _ in self._index.values())
+        if total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+            self.evictions += 1
+
+    def _remove(self, key):
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                self._remove(key)
+
+    def report(self, reset=False):
+        """Return hit/miss/bytes-saved counters and the current cache size
+
+        With reset=True the counters start again from zero, so the next
+        report only covers what happened after this one (e.g. one check cycle).
+        """
+        with self._lock:
+            self._load_index()
+            lookups = self.hits + self.misses
+            report = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'evictions': self.evictions,
+                'entries': len(self._index),
+                'size_bytes': sum(size for size, _ in self._index.values()),
+            }
+            if reset:
+                self.hits = self.misses = self.bytes_saved = self.evictions = 0
+            return report
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the process-wide ResponseCache, or None when caching is disabled"""
+    global _cache
+    if not NetworkSettings.RESPONSE_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
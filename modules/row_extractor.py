@@ -0,0 +1,247 @@
+import logging
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from settings import NetworkSettings, ScraperSettings
+from utils.magnet_utils import parse_infohash
+
+try:
+    import lxml.html
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+
+VIEW_ID_REGEX = re.compile(r'/view/(\d+)')
+
+# Returned by RowExtractor._extract_row for a row at or below stop_at_id
+ALREADY_SEEN = object()
+
+
+class ParserBackend:
+    """Interface between RowExtractor and a concrete HTML parser.
+
+    A backend turns a page into row nodes and knows how to read links, cells
+    and text from them, so the extraction logic itself is written once.
+    """
+
+    name = None
+
+    def rows(self, html):
+        """Return the <tr> nodes that may hold torrents"""
+        raise NotImplementedError
+
+    def links(self, row):
+        """Yield (href, classes, node) for every link with an href in a row"""
+        raise NotImplementedError
+
+    def link_title(self, link):
+        raise NotImplementedError
+
+    def cells(self, row):
+        raise NotImplementedError
+
+    def text(self, node):
+        raise NotImplementedError
+
+
+class SoupBackend(ParserBackend):
+    """BeautifulSoup with a full document tree ('html.parser' or bs4's 'lxml' builder)"""
+
+    def __init__(self, features='html.parser'):
+        self.features = features
+        self.name = features
+
+    def rows(self, html):
+        return self._rows_from_soup(BeautifulSoup(html, self.features))
+
+    @staticmethod
+    def _rows_from_soup(soup):
+        # Try different selectors to find torrent rows
+        torrent_rows = soup.select('tbody tr')
+        if not torrent_rows:
+            torrent_rows = soup.select('tr')
+        return torrent_rows
+
+    def links(self, row):
+        for link in row.find_all('a', href=True):
+            yield link['href'], link.get('class', ()), link
+
+    def link_title(self, link):
+        return link.get('title') or link.get_text().strip()
+
+    def cells(self, row):
+        return row.find_all('td', recursive=False) or row.find_all('td')
+
+    def text(self, node):
+        return node.get_text().strip()
+
+
+class StrainerBackend(SoupBackend):
+    """BeautifulSoup that only builds the <tbody> subtree (SoupStrainer).
+    Falls back to a full parse for pages without a <tbody>.
+    """
+
+    def __init__(self, features='html.parser'):
+        super().__init__(features)
+        self.name = f'strainer/{features}'
+
+    def rows(self, html):
+        soup = BeautifulSoup(html, self.features, parse_only=SoupStrainer('tbody'))
+        torrent_rows = soup.find_all('tr')
+        if torrent_rows:
+            return torrent_rows
+        return super().rows(html)
+
+
+class LxmlBackend(ParserBackend):
+    """Native lxml.html tree; no BeautifulSoup objects are created at all"""
+
+    name = 'lxml'
+
+    def rows(self, html):
+        doc = lxml.html.fromstring(html)
+        torrent_rows = doc.xpath('//tbody/tr')
+        if not torrent_rows:
+            torrent_rows = doc.xpath('//tr')
+        return torrent_rows
+
+    def links(self, row):
+        for link in row.iter('a'):
+            href = link.get('href')
+            if href:
+                yield href, (link.get('class') or '').split(), link
+
+    def link_title(self, link):
+        return link.get('title') or link.text_content().strip()
+
+    def cells(self, row):
+        return [cell for cell in row if cell.tag == 'td']
+
+    def text(self, node):
+        return node.text_content().strip()
+
+
+def get_parser_backend(name=None):
+    """Create the parser backend named in ScraperSettings.PARSER_BACKEND.
+    'auto' picks native lxml when it is installed and the <tbody> strainer otherwise.
+    """
+    name = name or ScraperSettings.PARSER_BACKEND
+    if name == 'auto':
+        name = 'lxml' if LXML_AVAILABLE else 'strainer'
+    if name == 'lxml':
+        if LXML_AVAILABLE:
+            return LxmlBackend()
+        logging.warning("lxml is not installed, falling back to the html.parser strainer backend")
+        name = 'strainer'
+    if name == 'html.parser':
+        return SoupBackend('html.parser')
+    if name != 'strainer':
+        logging.warning(f"Unknown parser backend '{name}', using 'strainer'")
+    return StrainerBackend('lxml' if LXML_AVAILABLE else 'html.parser')
+
+
+class RowExtractor:
+    """Single-pass extraction of typed torrent rows from a Nyaa.si listing page.
+
+    Each row is walked once: one scan over its links finds both the title
+    link and the magnet, and the cells are read by position. An optional
+    ``title_filter`` runs on the title before any cell is touched, so
+    rejected rows cost almost nothing.
+
+    Rows are plain dicts: title, url, torrent_id (int), magnet, infohash,
+    size, seeders (int), leechers (int), date, time and row_index (position
+    on the page, lower = higher up).
+
+    For pages sorted by ID (newest first), ``stop_at_id`` ends the walk at
+    the first row whose torrent ID is at or below it, so only uploads newer
+    than an already seen torrent are extracted.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend if isinstance(backend, ParserBackend) else get_parser_backend(backend)
+
+    def extract(self, html, title_filter=None, stop_at_id=None):
+        torrent_rows = self.backend.rows(html)
+        logging.debug(f"Found {len(torrent_rows)} potential torrent rows in the HTML ({self.backend.name}).")
+
+        rows = []
+        for i, row in enumerate(torrent_rows):
+            extracted = self._extract_row(row, i, title_filter, stop_at_id)
+            if extracted is ALREADY_SEEN:
+                logging.debug(f"Reached already seen torrent {stop_at_id} at row {i}, stopping")
+                break
+            if extracted is not None:
+                rows.append(extracted)
+        return rows
+
+    def _extract_row(self, row, row_index, title_filter, stop_at_id=None):
+        backend = self.backend
+        title_link = title_href = None
+        magnet = None
+        for href, classes, link in backend.links(row):
+            if href.startswith('magnet:'):
+                if magnet is None:
+                    magnet = href
+            elif title_link is None and '/view/' in href:
+                # Skip comment links (either by href containing #comments or by having 'comments' class)
+                if '#comments' not in href and 'comments' not in classes and VIEW_ID_REGEX.search(href):
+                    title_link, title_href = link, href
+
+        if title_link is None:
+            logging.debug(f"No title link found in row {row_index}")
+            return None
+
+        torrent_id = int(VIEW_ID_REGEX.search(title_href).group(1))
+        if stop_at_id is not None and torrent_id <= stop_at_id:
+            return ALREADY_SEEN
+
+        title = backend.link_title(title_link)
+        if title_filter is not None and not title_filter(title):
+            return None
+
+        cells = backend.cells(row)
+        cell_count = len(cells)
+
+        size = backend.text(cells[3]) if cell_count >= 4 else 'Unknown'
+
+        seeders = leechers = 0
+        if cell_count >= 6:
+            try:
+                seeders = int(backend.text(cells[5]))
+                leechers = int(backend.text(cells[6]))
+            except (ValueError, IndexError):
+                pass
+
+        date = time = ''
+        if cell_count >= 5:  # Date is in column 4 (index 4), e.g. "2024-01-15 14:30"
+            parts = backend.text(cells[4]).split()
+            if parts:
+                date = parts[0]
+                time = parts[1] if len(parts) >= 2 else ''
+
+        return {
+            'title': title,
+            'url': f"{NetworkSettings.NYAA_BASE_URL}{title_href}",
+            'torrent_id': torrent_id,
+            'magnet': magnet,
+            'infohash': parse_infohash(magnet),
+            'size': size,
+            'seeders': seeders,
+            'leechers': leechers,
+            'date': date,
+            'time': time,
+            'row_index': row_index,
+        }
+
+
+_extractors = {}
+
+
+def get_row_extractor(backend=None):
+    """Return a shared RowExtractor for a backend name (default from settings)"""
+    name = backend or ScraperSettings.PARSER_BACKEND
+    if name not in _extractors:
+        _extractors[name] = RowExtractor(name)
+    return _extractors[name]
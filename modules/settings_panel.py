@@ -221,7 +221,7 @@ class SettingsPanel:
             })()
 
             # Test connection
-            torrent_client = GenericTorrentClient(torrent_temp_config)
+            torrent_client = GenericTorrentClient(torrent_temp_config, qb_temp_config)
             available, err = torrent_client.test_connection()
 
             if available:
@@ -0,0 +1,728 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from modules.episode_inventory import EpisodeInventory
+from settings import TRACKER_FILE, TrackerSettings
+from utils.file_lock import FileLock, FileLockTimeout
+
+
+def merge_series(ours, theirs):
+    """Combine this process' version of a series with one written by another process.
+
+    Our fields win, except for progress, which only moves forward: the later
+    (season, episode), the union of the episode inventories and the higher
+    torrent ID mark. A mark we dropped on purpose (no ``last_torrent_id``,
+    or a changed URL) stays dropped.
+    """
+    merged = dict(theirs)
+    merged.update(ours)
+    their_progress = (theirs.get('last_season', 1), theirs.get('last_episode', 0))
+    if their_progress > (ours.get('last_season', 1), ours.get('last_episode', 0)):
+        merged['last_season'], merged['last_episode'] = their_progress
+    if 'episodes' in ours and 'episodes' in theirs:
+        inventory = EpisodeInventory.from_dict(ours['episodes'])
+        for season, bits in EpisodeInventory.from_dict(theirs['episodes']).seasons.items():
+            inventory.seasons[season] = inventory.seasons.get(season, 0) | bits
+        merged['episodes'] = inventory.to_dict()
+    if 'last_torrent_id' not in ours or ours.get('url') != theirs.get('url'):
+        merged.pop('last_torrent_id', None)
+        if 'last_torrent_id' in ours:
+            merged['last_torrent_id'] = ours['last_torrent_id']
+    elif 'last_torrent_id' in theirs:
+        merged['last_torrent_id'] = max(ours['last_torrent_id'], theirs['last_torrent_id'])
+    return merged
+
+
+# Placeholder a lazy storage keeps in the loaded dict for a record it has not read yet
+_UNLOADED = object()
+
+
+class TrackerStorage:
+    """Persistence interface behind AnimeTracker.
+
+    ``load`` returns the tracker dict ({title: info}) and the storage keeps a
+    reference to it (as ``_data``). Every change is then reported per series
+    with ``put``, ``delete`` or ``rename``, so backends that can update a
+    single record do not rewrite everything. Inside ``batch()`` a backend may
+    defer or group the writes until the block ends.
+
+    With lazy loading the dict starts with every title but only placeholders
+    as values; ``record`` reads a series' record on first use and
+    ``load_all`` reads all that are left. Backends implement
+    ``_load_records`` for it.
+    """
+
+    name = None
+
+    # Reading more records than this is done with one bulk read
+    BULK_AFTER = 64
+
+    def load(self):
+        raise NotImplementedError
+
+    def record(self, title):
+        """The loaded record of a series, read first if it is still a placeholder (KeyError if unknown)"""
+        info = self._data[title]
+        if info is _UNLOADED:
+            info = self._load_records([title])[title]
+            # Another thread may have stored or removed the record meanwhile
+            if self._data.get(title) is _UNLOADED:
+                self._data[title] = info
+            else:
+                info = self._data.get(title, info)
+        return info
+
+    def load_all(self):
+        """Read every record still a placeholder into the loaded dict"""
+        pending = self._unloaded(self._data)
+        if pending:
+            records = self._load_records(pending)
+            for title in pending:
+                if self._data.get(title) is _UNLOADED:
+                    self._data[title] = records[title]
+
+    def _records(self):
+        """Copy of the loaded dict with every record read, leaving the dict itself as it is"""
+        data = dict(self._data)
+        pending = self._unloaded(data)
+        if pending:
+            data.update(self._load_records(pending))
+        return data
+
+    @staticmethod
+    def _unloaded(data):
+        return [title for title, info in list(data.items()) if info is _UNLOADED]
+
+    def _load_records(self, titles):
+        """Read the records of the given titles, {title: info} (lazy backends)"""
+        raise NotImplementedError
+
+    def put(self, title, info):
+        """Insert or update one series"""
+        raise NotImplementedError
+
+    def delete(self, title):
+        raise NotImplementedError
+
+    def rename(self, old_title, new_title):
+        """Give a series a new title, keeping its data"""
+        raise NotImplementedError
+
+    def save_all(self):
+        """Write every series (after direct edits to the loaded dict)"""
+        raise NotImplementedError
+
+    @contextmanager
+    def batch(self):
+        yield
+
+    def refresh(self):
+        """Pick up changes written by other processes into the loaded dict.
+        Returns True if anything was reloaded.
+        """
+        return False
+
+    def close(self):
+        """Write anything still pending (even inside an unfinished batch) and release the storage"""
+        pass
+
+    def stats(self):
+        """Write metrics of the backend (empty if it keeps none)"""
+        return {}
+
+
+class JsonTrackerStorage(TrackerStorage):
+    """The original tracker.json file, always rewritten as a whole.
+
+    With write-behind enabled, changes only mark the tracker dirty and a
+    debounce timer writes the file ``flush_delay`` seconds after the first
+    pending change. ``batch()`` (a check cycle) and ``close()`` flush at
+    once. Without write-behind every change is written immediately, except
+    inside ``batch()`` where the file is written once at the end.
+
+    Every flush writes a temp file, fsyncs it and renames it over the
+    tracker, so a crash leaves either the old or the new file, never a
+    truncated one.
+
+    Several processes (the GUI and headless runs) may share the file. Reads
+    and writes take an advisory lock on ``<tracker>.lock``, and every write
+    bumps the counter in ``<tracker>.version``. If the counter moved since
+    this process last read the file, a flush writes the file merged with the
+    series changed here (see merge_series) instead of overwriting it. The
+    loaded dict itself is only changed by ``refresh``, which belongs on the
+    thread that owns the tracker (the check loop); a flush may run on the
+    write-behind timer thread while other threads read the dict.
+
+    Each flush also writes ``<tracker>.index`` with the byte span of every
+    series' record. With ``lazy`` loading a matching index is read instead
+    of parsing the whole file, and the file's bytes are kept to parse the
+    records when they are first used.
+    """
+
+    name = 'json'
+
+    def __init__(self, path=TRACKER_FILE, write_behind=None, flush_delay=None, compact=None, lazy=None):
+        self.path = path
+        self.lazy = TrackerSettings.LAZY_LOAD if lazy is None else lazy
+        self.write_behind = TrackerSettings.WRITE_BEHIND if write_behind is None else write_behind
+        self.flush_delay = TrackerSettings.FLUSH_DELAY if flush_delay is None else flush_delay
+        self.compact = TrackerSettings.JSON_COMPACT if compact is None else compact
+        self._data = {}
+        self._payload = None    # bytes of the file the placeholders were indexed from
+        self._spans = {}        # title -> (offset, length) of its record in _payload
+        self._batch_depth = 0
+        self._dirty = False
+        self._timer = None
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(f'{path}.lock', TrackerSettings.LOCK_TIMEOUT)
+        self._version_path = f'{path}.version'
+        self._index_path = f'{path}.index'
+        self._version = 0
+        self._known = set()     # titles in the file when it was last read or written
+        self._changed_titles = set()
+        self._deleted_titles = set()
+        self.flushes = 0
+        self.merges = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    def load(self):
+        logging.debug(f'[DEBUG] JsonTrackerStorage.load called, path: {self.path}')
+        with self._lock:
+            try:
+                with self._file_lock:
+                    self._version = self._read_version()
+                    self._data = self._read_indexed() if self.lazy else None
+                    if self._data is None:
+                        self._data = self._read_file()
+            except FileLockTimeout as e:
+                # The file is only ever replaced atomically, so it can still be read
+                logging.warning(f'{e}, reading the tracker without the lock')
+                self._version = self._read_version()
+                self._data = self._read_file()
+            self._known = set(self._data)
+        return self._data
+
+    def _read_file(self):
+        if not os.path.exists(self.path):
+            logging.debug('[DEBUG] Tracker file does not exist, returning empty dict')
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+                logging.debug(f'[DEBUG] Loaded tracker data with {len(data)} entries')
+                return data
+        except Exception as e:
+            logging.debug(f'[DEBUG] Exception loading tracker file: {e}')
+            return {}
+
+    def _read_indexed(self):
+        """Load the titles from <tracker>.index and keep the records unparsed, or
+        None when there is no index matching the current file
+        """
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            stat = os.stat(self.path)
+            if (index.get('version') != self._version or index.get('size') != stat.st_size
+                    or index.get('mtime_ns') != stat.st_mtime_ns):
+                logging.debug('[DEBUG] Tracker index is out of date, parsing the whole file')
+                return None
+            with open(self.path, 'rb') as f:
+                payload = f.read()
+        except (OSError, ValueError):
+            return None
+
+        self._payload = payload
+        self._spans = {title: (offset, length) for title, offset, length in index['series']}
+        logging.debug(f'[DEBUG] Indexed {len(self._spans)} tracker entries')
+        return dict.fromkeys(self._spans, _UNLOADED)
+
+    def _load_records(self, titles):
+        if len(titles) > self.BULK_AFTER:
+            records = json.loads(self._payload)
+            return {title: records[title] for title in titles}
+        records = {}
+        for title in titles:
+            offset, length = self._spans[title]
+            records[title] = json.loads(self._payload[offset:offset + length])
+        return records
+
+    def _write_index(self, spans):
+        """Record where each series' record is in the file just written (file lock held)"""
+        stat = os.stat(self.path)
+        index = {'version': self._version, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'series': spans}
+        tmp_path = f'{self._index_path}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self._index_path)
+        except OSError as e:
+            logging.debug(f'[DEBUG] Could not write the tracker index: {e}')
+
+    def _read_version(self):
+        try:
+            with open(self._version_path, 'r', encoding='ascii') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_version(self, version):
+        tmp_path = f'{self._version_path}.tmp'
+        with open(tmp_path, 'w', encoding='ascii') as f:
+            f.write(str(version))
+        os.replace(tmp_path, self._version_path)
+        self._version = version
+
+    def _merged_with_disk(self):
+        """The loaded series combined with the file written by another process (both locks held).
+        Series changed here are merged, others take the file's version; series
+        deleted on one side stay deleted unless the other side added or changed them.
+        Returns (merged dict, titles in the file); the loaded dict is not changed.
+        """
+        theirs = self._read_file()
+        ours = self._records()
+        merged = {}
+        for title, info in ours.items():
+            if title in theirs:
+                merged[title] = merge_series(info, theirs[title]) if title in self._changed_titles else theirs[title]
+            elif title not in self._known or title in self._changed_titles:
+                merged[title] = info
+        for title, info in theirs.items():
+            if title not in merged and title not in self._deleted_titles:
+                merged[title] = info
+        self.merges += 1
+        logging.info(f'Tracker file was changed by another process, merged {len(theirs)} series')
+        return merged, set(theirs)
+
+    def refresh(self):
+        with self._lock:
+            try:
+                with self._file_lock:
+                    version = self._read_version()
+                    if version == self._version:
+                        return False
+                    merged, theirs = self._merged_with_disk()
+                    self._version = version
+            except FileLockTimeout as e:
+                logging.warning(f'Could not refresh the tracker: {e}')
+                return False
+            for title in [title for title in self._data if title not in merged]:
+                del self._data[title]
+            for title, info in merged.items():
+                if self._data.get(title) is not info:
+                    self._data[title] = info
+            self._known = theirs
+            return True
+
+    def _changed(self, title=None, deleted=None):
+        with self._lock:
+            if title is not None:
+                self._changed_titles.add(title)
+                self._deleted_titles.discard(title)
+            if deleted is not None:
+                self._deleted_titles.add(deleted)
+                self._changed_titles.discard(deleted)
+            self._dirty = True
+            if self._batch_depth:
+                return
+            if not self.write_behind:
+                self._flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _serialize(self, data=None):
+        """Encode the tracker (or the given dict) as json.dump would, one series at a time.
+        Returns (payload bytes, [[title, offset, length]] of every series' record in it).
+        """
+        return self._encode((self._records() if data is None else data).items())
+
+    def _encode(self, series):
+        if not series:
+            return b'{}', []
+        if self.compact:
+            opening, separator, closing, key_separator = '{', ',', '}', ':'
+        else:
+            opening, separator, closing, key_separator = '{\n  ', ',\n  ', '\n}', ': '
+        parts = []
+        spans = []
+        offset = 0
+        for title, info in series:
+            prefix = ((separator if parts else opening) + json.dumps(title, ensure_ascii=False)
+                      + key_separator).encode('utf-8')
+            if self.compact:
+                record = json.dumps(info, ensure_ascii=False, separators=(',', ':'))
+            else:
+                # JSON strings never hold a raw newline, so this only re-indents the structure
+                record = json.dumps(info, indent=2, ensure_ascii=False).replace('\n', '\n  ')
+            record = record.encode('utf-8')
+            offset += len(prefix)
+            spans.append([title, offset, len(record)])
+            offset += len(record)
+            parts.append(prefix)
+            parts.append(record)
+        parts.append(closing.encode('utf-8'))
+        return b''.join(parts), spans
+
+    def _flush(self):
+        """Atomically replace the tracker file with the current data (lock held)"""
+        started = time.perf_counter()
+        with self._file_lock:
+            disk_version = self._read_version()
+            # Another process wrote meanwhile: write the merge, and leave it to
+            # refresh() to bring the loaded dict up to date
+            merged = self._merged_with_disk()[0] if disk_version != self._version else None
+            payload, spans = self._serialize(merged)
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            version = max(disk_version, self._version) + 1
+            self._write_version(version)
+            if merged is not None:
+                self._version = disk_version  # the file still has changes the loaded dict lacks
+            self._write_index(spans)
+        if merged is None:
+            self._known = set(self._data)
+        else:
+            # Series deleted by the other process must still count as known
+            # here, so that refresh() drops them from the loaded dict
+            self._known |= set(self._data) & set(merged)
+        self._changed_titles.clear()
+        self._deleted_titles.clear()
+        self._dirty = False
+
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        self.total_flush_seconds += elapsed
+
+    def flush(self):
+        """Write pending changes now"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._dirty:
+                try:
+                    self._flush()
+                except (OSError, FileLockTimeout) as e:
+                    logging.error(f'Could not save the tracker to {self.path}: {e}')
+
+    def put(self, title, info):
+        self._changed(title)
+
+    def delete(self, title):
+        self._changed(deleted=title)
+
+    def rename(self, old_title, new_title):
+        with self._lock:
+            self._deleted_titles.add(old_title)
+            self._changed(new_title)
+
+    def save_all(self):
+        with self._lock:
+            self._changed_titles.update(self._data)
+            self._deleted_titles.update(self._known - set(self._data))
+            self._changed()
+
+    @contextmanager
+    def batch(self):
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self.flush()
+
+    def close(self):
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'flushes': self.flushes,
+                'merges': self.merges,
+                'pending': self._dirty,
+                'last_flush_ms': self.last_flush_seconds * 1000,
+                'max_flush_ms': self.max_flush_seconds * 1000,
+                'avg_flush_ms': (self.total_flush_seconds / self.flushes * 1000) if self.flushes else 0.0,
+            }
+
+
+class SqliteTrackerStorage(TrackerStorage):
+    """SQLite database with one row per series (``title`` is the primary key).
+
+    The database runs in WAL mode, so a write only appends the changed pages.
+    Every change is a couple of single-row statements. Outside ``batch()``
+    they are committed at once; inside it they are collected and committed
+    together in one short transaction when the block ends, so no
+    transaction (and no write lock) is held while a check cycle waits on
+    the network. The changes are already in the loaded dict, so they are
+    written even if the block raises. A commit that fails (the database
+    locked past the timeout, a full disk) keeps its statements queued, and
+    the next commit retries them first; until then ``refresh`` leaves the
+    loaded dict alone.
+
+    Each thread uses its own connection; none is shared between threads.
+
+    The well-known fields have their own columns. Any other per-series keys
+    are kept in a JSON ``extra`` column, so new tracker fields need no
+    schema change. The insertion order is kept in ``position``.
+
+    SQLite locks the database itself, so several processes can share it;
+    a writer waits up to TrackerSettings.LOCK_TIMEOUT for another one. Every
+    commit bumps the counter in the ``meta`` table, and ``refresh`` reloads
+    the rows when another process has moved it.
+
+    With ``lazy`` loading only the titles are read up front; a series' row
+    is fetched by its key when it is first used, and ``load_all`` fetches
+    the remaining rows in one query.
+    """
+
+    name = 'sqlite'
+
+    COLUMNS = ('url', 'last_season', 'last_episode', 'allow_multi_episode')
+
+    def __init__(self, path=None, migrate_from=TRACKER_FILE, lazy=None):
+        self.path = path or TrackerSettings.SQLITE_FILE
+        self.lazy = TrackerSettings.LAZY_LOAD if lazy is None else lazy
+        self.migrate_from = migrate_from
+        self._data = {}
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self._pending = []      # (sql, params) collected inside batch()
+        self._failed = []       # (sql, params) of a failed commit, retried by the next one
+        self._commit_lock = threading.Lock()  # keeps retried statements ahead of newer ones
+        self._local = threading.local()
+        self._connections = []  # every thread's connection, closed by close()
+        self._version = None    # meta version of the rows in self._data
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS series ('
+            ' title TEXT PRIMARY KEY,'
+            ' position INTEGER NOT NULL,'
+            ' url TEXT NOT NULL,'
+            ' last_season INTEGER NOT NULL DEFAULT 1,'
+            ' last_episode INTEGER NOT NULL DEFAULT 0,'
+            ' allow_multi_episode INTEGER NOT NULL DEFAULT 0,'
+            ' extra TEXT NOT NULL DEFAULT \'{}\')'
+        )
+        conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+
+    def _connection(self):
+        """The calling thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # check_same_thread=False only so close() can close the connections of other threads
+            conn = sqlite3.connect(self.path, timeout=TrackerSettings.LOCK_TIMEOUT, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _read_version(self, conn):
+        return conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    @staticmethod
+    def _row_values(info):
+        extra = {k: v for k, v in info.items() if k not in SqliteTrackerStorage.COLUMNS}
+        return (info.get('url', ''), info.get('last_season', 1), info.get('last_episode', 0),
+                int(bool(info.get('allow_multi_episode', False))),
+                json.dumps(extra, ensure_ascii=False, separators=(',', ':')))
+
+    def load(self):
+        conn = self._connection()
+        count = conn.execute('SELECT COUNT(*) FROM series').fetchone()[0]
+        if not count and self.migrate_from and os.path.exists(self.migrate_from):
+            self._migrate()
+        with self._lock:
+            if self.lazy:
+                self._version = self._read_version(conn)
+                titles = [title for title, in conn.execute('SELECT title FROM series ORDER BY position')]
+                self._data = dict.fromkeys(titles, _UNLOADED)
+            else:
+                self._data = self._read_rows()
+        logging.debug(f'[DEBUG] Loaded {len(self._data)} series from {self.path}')
+        return self._data
+
+    @staticmethod
+    def _record(url, last_season, last_episode, allow_multi, extra):
+        info = {'url': url, 'last_season': last_season, 'last_episode': last_episode,
+                'allow_multi_episode': bool(allow_multi)}
+        info.update(json.loads(extra or '{}'))
+        return info
+
+    def _load_records(self, titles):
+        conn = self._connection()
+        if len(titles) > self.BULK_AFTER:
+            rows = conn.execute('SELECT title, url, last_season, last_episode, allow_multi_episode, extra '
+                                'FROM series').fetchall()
+        else:
+            rows = [(title,) + row for title in titles for row in conn.execute(
+                'SELECT url, last_season, last_episode, allow_multi_episode, extra FROM series WHERE title = ?',
+                (title,))]
+        found = {title: self._record(*values) for title, *values in rows}
+        # Rows deleted by another process since the titles were read
+        empty = {'url': '', 'last_season': 1, 'last_episode': 0, 'allow_multi_episode': False}
+        return {title: found.get(title, dict(empty)) for title in titles}
+
+    def _read_rows(self):
+        conn = self._connection()
+        # One read transaction, so the version matches the rows
+        conn.execute('BEGIN')
+        try:
+            version = self._read_version(conn)
+            rows = conn.execute('SELECT title, url, last_season, last_episode, allow_multi_episode, extra '
+                                'FROM series ORDER BY position').fetchall()
+        finally:
+            conn.execute('COMMIT')
+        with self._lock:
+            self._version = version
+        return {title: self._record(*values) for title, *values in rows}
+
+    def refresh(self):
+        with self._lock:
+            # Changes of this process not written yet would be overwritten by the reload
+            if self._batch_depth or self._pending or self._failed:
+                return False
+            if self._read_version(self._connection()) == self._version:
+                return False
+            rows = self._read_rows()
+            for title in [title for title in self._data if title not in rows]:
+                del self._data[title]
+            for title, info in rows.items():
+                self._data[title] = info
+        logging.info(f'Tracker database was changed by another process, reloaded {len(rows)} series')
+        return True
+
+    def _migrate(self):
+        """One-shot import of tracker.json; the file is kept as <name>.migrated"""
+        data = JsonTrackerStorage(self.migrate_from, lazy=False).load()
+        self._transaction([('INSERT INTO series (title, position, url, last_season, last_episode, '
+                            'allow_multi_episode, extra) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (title, position) + self._row_values(info))
+                           for position, (title, info) in enumerate(data.items())])
+        os.replace(self.migrate_from, self.migrate_from + '.migrated')
+        logging.info(f'Migrated {len(data)} series from {self.migrate_from} to {self.path}')
+
+    def _transaction(self, statements):
+        """Run statements in one transaction on the calling thread's connection (sqlite3.Error on failure)"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = self._read_version(conn)
+            for sql, params in statements:
+                conn.execute(sql, params)
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'version'", (version + 1,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        with self._lock:
+            # Only our own write since the last read: the loaded rows are still current
+            if version == self._version:
+                self._version = version + 1
+
+    def _commit(self, statements):
+        """Commit statements after any that failed before.
+        On an error they all stay queued and are retried by the next commit,
+        so the loaded dict is never silently ahead of the database.
+        """
+        with self._commit_lock:
+            with self._lock:
+                statements, self._failed = self._failed + list(statements), []
+            if not statements:
+                return True
+            try:
+                self._transaction(statements)
+            except sqlite3.Error as e:
+                with self._lock:
+                    self._failed = statements
+                logging.error(f'Could not save the tracker to {self.path}, retrying with the next write: {e}')
+                return False
+            return True
+
+    def _write(self, *statements):
+        with self._lock:
+            if self._batch_depth:
+                self._pending.extend(statements)
+                return
+        self._commit(statements)
+
+    def put(self, title, info):
+        values = self._row_values(info)
+        self._write(
+            ('UPDATE series SET url = ?, last_season = ?, last_episode = ?, allow_multi_episode = ?, extra = ? '
+             'WHERE title = ?', values + (title,)),
+            ('INSERT OR IGNORE INTO series (title, position, url, last_season, last_episode, allow_multi_episode, '
+             'extra) VALUES (?, (SELECT COALESCE(MAX(position), -1) + 1 FROM series), ?, ?, ?, ?, ?)',
+             (title,) + values))
+
+    def delete(self, title):
+        self._write(('DELETE FROM series WHERE title = ?', (title,)))
+
+    def rename(self, old_title, new_title):
+        # A renamed series moves to the end of the list, like the re-inserted dict key
+        self._write(('UPDATE series SET title = ?, position = (SELECT MAX(position) + 1 FROM series) '
+                     'WHERE title = ?', (new_title, old_title)))
+
+    def save_all(self):
+        with self.batch():
+            self._write((f'DELETE FROM series WHERE title NOT IN ({",".join("?" * len(self._data))})',
+                         tuple(self._data)))
+            for title, info in self._records().items():
+                self.put(title, info)
+
+    @contextmanager
+    def batch(self):
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                statements = []
+                if not self._batch_depth:
+                    statements, self._pending = self._pending, []
+            self._commit(statements)
+
+    def close(self):
+        with self._lock:
+            statements, self._pending = self._pending, []
+        if not self._commit(statements):
+            logging.error(f'{len(self._failed)} tracker change(s) were not saved to {self.path}')
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._local = threading.local()
+
+
+def get_tracker_storage(backend=None, tracker_file=TRACKER_FILE):
+    """Create the storage backend named in TrackerSettings.STORAGE_BACKEND ('json' or 'sqlite')"""
+    backend = backend or TrackerSettings.STORAGE_BACKEND
+    if backend == 'sqlite':
+        return SqliteTrackerStorage(migrate_from=tracker_file)
+    if backend != 'json':
+        logging.warning(f"Unknown tracker storage backend '{backend}', using 'json'")
+    return JsonTrackerStorage(tracker_file)
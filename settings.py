@@ -26,6 +26,12 @@ def get_trace_path():
 
 TRACE_PATH = get_trace_path()
 
+def get_cache_directory():
+    """Get the directory used for on-disk caches (next to the logs directory)"""
+    return os.path.join(os.path.dirname(LOG_DIRECTORY), 'cache')
+
+CACHE_DIRECTORY = get_cache_directory()
+
 # GUI Configuration
 class GUISettings:
     """GUI-related settings and constants"""
@@ -35,18 +41,21 @@ class GUISettings:
     MAIN_PADDING = '10'
     
     # Treeview columns
-    ANIME_TREE_COLUMNS = ('Title', 'Last Season', 'Last Episode', 'URL')
+    ANIME_TREE_COLUMNS = ('Title', 'Last Season', 'Last Episode', 'URL', 'Download')
+    ANIME_TREE_DISPLAY_COLUMNS = ('Title', 'Last Season', 'Last Episode', 'Download', 'URL')
     ANIME_TREE_HEADINGS = {
         'Title': 'Title',
         'Last Season': 'S', 
         'Last Episode': 'Last Ep',
-        'URL': 'Nyaa.si URL'
+        'URL': 'Nyaa.si URL',
+        'Download': 'Download'
     }
     ANIME_TREE_WIDTHS = {
         'Title': 150,
         'Last Season': 40,
         'Last Episode': 80, 
-        'URL': 350
+        'URL': 350,
+        'Download': 150
     }
     
     # Episodes treeview
@@ -131,6 +140,40 @@ class NetworkSettings:
     REQUEST_TIMEOUT = 15
     QB_CONNECT_TIMEOUT = 5
     QB_READ_TIMEOUT = 10
+    QB_BATCH_SIZE = 50          # Magnets sent to qBittorrent in one torrents_add call
+    QB_RECONCILE_ATTEMPTS = 4   # torrents_info lookups before an added magnet counts as not added
+    QB_RECONCILE_DELAY = 0.25   # Seconds before the second lookup, doubled for each further one
+    QB_SYNC_INTERVAL = 5        # Seconds the cached qBittorrent torrent list is used before syncing its changes
+    QB_STATUS_INTERVAL = 10     # Seconds between download status polls for the anime list
+    QB_STATUS_RETRY_INTERVAL = 300  # Seconds before polling again when qBittorrent is not reachable
+
+    # Pooled keep-alive session (modules/http_session.py)
+    POOL_CONNECTIONS = 4   # Number of hosts to keep a connection pool for
+    POOL_MAXSIZE = 10      # Maximum open connections kept per host
+    USER_AGENT = 'NyaaAutoDownload/1.0'
+
+    # Concurrent check engine (modules/check_engine.py)
+    # Every tracked series is usually on nyaa.si, so more workers than the per-host
+    # limit would only wait on the host's semaphore
+    CHECK_WORKERS = 4           # Worker threads scraping series in parallel
+    PER_HOST_CONCURRENCY = 4    # Simultaneous requests to the same host
+
+    # Process-wide token bucket every request passes through (modules/http_session.py);
+    # requests from the search, episodes and bulk panels go before scheduled checks
+    REQUEST_RATE_LIMIT = 5.0    # Requests per second across all hosts (0 = unlimited)
+    REQUEST_BURST = 5           # Requests that may be sent at once after an idle period
+
+    # Retries and per-host circuit breaker (modules/http_session.py)
+    MAX_RETRIES = 2             # Retries of a timed out or 429/5xx request
+    RETRY_BACKOFF = 2.0         # Seconds before the first retry, doubled for each next one
+    MAX_RETRY_DELAY = 30        # Longest wait before a retry (a longer Retry-After opens the circuit)
+    FAILURE_THRESHOLD = 3       # Failures in a row that open a host's circuit
+    OPEN_SECONDS = 60           # First open period, doubled for each consecutive opening
+    MAX_OPEN_SECONDS = 30 * 60  # Longest open period
+
+    # Conditional-GET response cache (modules/response_cache.py)
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_MAX_BYTES = 20 * 1024 * 1024  # 20 MB of cached row sets
     
     # Nyaa.si URLs and parameters
     NYAA_BASE_URL = "https://nyaa.si"
@@ -139,6 +182,43 @@ class NetworkSettings:
 # Scraper Configuration  
 class ScraperSettings:
     """Settings for web scraping functionality"""
+
+    # Feed backend used to read listing pages: 'html' scrapes the page,
+    # 'rss' streams the &page=rss feed. Series can override this individually.
+    FEED_BACKEND = 'html'
+    FEED_BACKENDS = ('html', 'rss')
+
+    # Trackers appended to magnet links built from RSS infohashes
+    MAGNET_TRACKERS = [
+        'http://nyaa.tracker.wf:7777/announce',
+        'udp://open.stealth.si:80/announce',
+        'udp://tracker.opentrackr.org:1337/announce',
+        'udp://exodus.desync.com:6969/announce',
+        'udp://tracker.torrent.eu.org:451/announce',
+    ]
+
+    # HTML parser backend for listing pages: 'lxml' (native lxml tree),
+    # 'strainer' (BeautifulSoup building only the <tbody> subtree),
+    # 'html.parser' (full BeautifulSoup tree) or 'auto' (lxml when installed)
+    PARSER_BACKEND = 'auto'
+
+    # Query coalescing (modules/query_planner.py): series whose URLs only differ
+    # by search text are fetched together with one OR search
+    COALESCE_QUERIES = True
+    COALESCE_MAX_SERIES = 5           # Series merged into one combined search
+    COALESCE_MAX_QUERY_LENGTH = 200   # Characters allowed in the combined q= value
+
+    # Paginated listings (NyaaScraper.iter_row_pages)
+    PAGE_SIZE = 75          # Torrents per Nyaa.si listing page; a shorter page is the last one
+    MAX_PAGES = 5           # Default page limit for streamed listings
+    EPISODES_PANEL_PAGES = 5  # Pages streamed into the episodes panel
+    SEARCH_PANEL_PAGES = 3    # Pages streamed into the search panel
+    PREFETCH_PAGES = True   # Download the next page while the current one is processed
+
+    # Memoized extract_episode_info results (modules/episode_cache.py)
+    EPISODE_CACHE_ENABLED = True
+    EPISODE_CACHE_SIZE = 50000      # Titles kept in the LRU cache
+    EPISODE_CACHE_PERSIST = True    # Save the cache to the cache directory between runs
     
     # Episode regex patterns and formats
     EPISODE_FORMATS = [
@@ -158,6 +238,85 @@ class ScraperSettings:
         'KB': 1024,
     }
 
+# Tracker Storage Settings
+class TrackerSettings:
+    """Settings for the tracked series storage (modules/tracker_storage.py)"""
+
+    # 'json' rewrites tracker.json on every change (fine for small lists);
+    # 'sqlite' stores one row per series and migrates tracker.json on first use
+    STORAGE_BACKEND = 'json'
+    SQLITE_FILE = 'tracker.db'
+
+    # JSON backend: coalesce changes in memory and write them FLUSH_DELAY seconds
+    # later (and at the end of every check cycle and on exit)
+    WRITE_BEHIND = True
+    FLUSH_DELAY = 2.0
+    JSON_COMPACT = False   # Write tracker.json without indentation
+
+    # Read only the series titles at startup (from tracker.json.index or the
+    # database) and load each series' record when it is first used. Off by
+    # default: the GUI and the check loop read every record anyway, and that
+    # is slower lazily (see benchmarks/tracker_load.py)
+    LAZY_LOAD = False
+
+    # Several processes (GUI, headless runs) may share the tracker: writes are
+    # serialized with a lock file and merged with changes made by the others
+    LOCK_TIMEOUT = 10.0            # Seconds to wait for another process' lock
+    SINGLE_CHECK_INSTANCE = False  # Skip a check cycle while another process runs one (off: the
+                                   # per-series merge already combines concurrent cycles)
+
+    # Append-only log of every magnet sent to a torrent client (modules/download_ledger.py),
+    # used to skip releases that were already submitted
+    DOWNLOAD_LEDGER_ENABLED = True
+    DOWNLOAD_LEDGER_FILE = 'downloads.jsonl'
+
+# Poll Schedule Settings
+class ScheduleSettings:
+    """Adaptive per-series check schedule (modules/poll_scheduler.py)"""
+
+    # Check each series around its learned release time instead of every check interval
+    ADAPTIVE = True
+
+    # A cadence is learned from the first-upload times of the last HISTORY episodes;
+    # gaps shorter than MIN_RELEASE_GAP (batch uploads) are ignored
+    HISTORY = 8
+    MIN_RELEASE_GAP = 6 * 60 * 60
+    MAX_RELEASE_PERIOD = 35 * 24 * 60 * 60
+
+    # Poll every DENSE_INTERVAL from WINDOW_BEFORE before to WINDOW_AFTER after the
+    # expected release (both widened by twice the spread of the series' release gaps)
+    WINDOW_BEFORE = 15 * 60
+    WINDOW_AFTER = 90 * 60
+    DENSE_INTERVAL = 10 * 60
+
+    # Outside the window the interval doubles after every empty check, up to MAX_INTERVAL
+    MAX_INTERVAL = 48 * 60 * 60
+
+    # Next check times get a random jitter of up to JITTER_FRACTION of the
+    # interval (at most MAX_JITTER seconds), so series do not come due together
+    JITTER_FRACTION = 0.1
+    MAX_JITTER = 5 * 60
+
+    # Series due at startup (or never checked) are spread over this many seconds
+    STARTUP_SPREAD = 5 * 60
+
+    # Series due within this many seconds of each other are checked in one cycle,
+    # so compatible ones can still share a combined search
+    COALESCE_WINDOW = 30
+
+    # Shortest time until a series' next check
+    MIN_WAKE_INTERVAL = 30
+
+    # How often the sleeping check loop looks for a stop or reload asked for by a signal
+    REQUEST_POLL_INTERVAL = 1.0
+
+# Daemon Settings
+class DaemonSettings:
+    """Long-running headless mode (--daemon)"""
+
+    # Holds the daemon's pid; a second daemon refuses to start while it runs
+    PID_FILE = 'nyaa_auto_download.pid'
+
 # Logging Settings
 class LoggingSettings:
     """Logging configuration"""
@@ -221,6 +380,16 @@ class QualitySettings:
         # If we get here, either no filters or passed all checks
         return True
 
+    def filter_signature(self):
+        """Stable description of the active filter, or None when it lets every title through"""
+        if self.quality_filter_mode == 'disabled' or not (self.preferred_qualities or self.blocked_qualities):
+            return None
+        return '|'.join([
+            self.quality_filter_mode,
+            ','.join(sorted(q.lower() for q in self.preferred_qualities)),
+            ','.join(sorted(q.lower() for q in self.blocked_qualities)),
+        ])
+
     def get_quality_score(self, title):
         """Get a quality score for sorting torrents (higher is better)"""
         title_lower = title.lower()
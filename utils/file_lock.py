@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLockTimeout(Exception):
+    pass
+
+
+class FileLock:
+    """Advisory lock on a lock file, shared between processes.
+
+    Uses flock() on POSIX and msvcrt.locking() on Windows. The lock is
+    released by the OS when the holding process dies, so a crashed run
+    never leaves a stale lock behind. Threads of one process also exclude
+    each other; the same thread may re-acquire a lock it holds.
+    """
+
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, path, timeout=None):
+        self.path = path
+        self.timeout = timeout  # used by the with statement
+        self._fd = None
+        self._depth = 0
+        self._owner = None
+        self._thread_lock = threading.Lock()
+
+    def _try_lock(self, fd):
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, blocking=True, timeout=None):
+        """Take the lock; returns False if it is held elsewhere and blocking is False.
+        Raises FileLockTimeout when timeout seconds pass without getting it.
+        """
+        if self._owner == threading.get_ident():
+            self._depth += 1
+            return True
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._thread_lock.acquire(blocking, -1 if timeout is None or not blocking else timeout):
+            if not blocking:
+                return False
+            raise FileLockTimeout(f"Timed out waiting for {self.path}")
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        while not self._try_lock(fd):
+            if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                os.close(fd)
+                self._thread_lock.release()
+                if not blocking:
+                    return False
+                raise FileLockTimeout(f"Timed out waiting for {self.path}")
+            time.sleep(self.POLL_INTERVAL)
+
+        self._fd = fd
+        self._owner = threading.get_ident()
+        self._depth = 1
+        return True
+
+    def release(self):
+        if self._owner != threading.get_ident():
+            raise RuntimeError(f"{self.path} is not locked by this thread")
+        self._depth -= 1
+        if self._depth:
+            return
+        try:
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self._owner = None
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire(timeout=self.timeout)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
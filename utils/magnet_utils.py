@@ -0,0 +1,24 @@
+import base64
+import binascii
+import re
+
+
+BTIH_REGEX = re.compile(r'xt=urn:btih:([0-9a-fA-F]{40}|[A-Za-z2-7]{32})(?![0-9A-Za-z])')
+
+
+def parse_infohash(magnet):
+    """Return the lowercase hex infohash of a magnet link, or None.
+    Handles both the 40-character hex and the 32-character base32 forms.
+    """
+    if not magnet:
+        return None
+    match = BTIH_REGEX.search(magnet)
+    if not match:
+        return None
+    value = match.group(1)
+    if len(value) == 40:
+        return value.lower()
+    try:
+        return binascii.hexlify(base64.b32decode(value.upper())).decode('ascii')
+    except (binascii.Error, ValueError):
+        return None
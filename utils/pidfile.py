@@ -0,0 +1,56 @@
+import os
+
+
+class PidFileError(Exception):
+    pass
+
+
+class PidFile:
+    """Pidfile of a long-running process, used as a context manager.
+
+    Entering writes the current pid; it fails with PidFileError if the file
+    names a process that is still running. A file left behind by a process
+    that died is taken over. Exiting removes the file if it still holds our
+    pid.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def _running(pid):
+        if os.name == 'nt':
+            return True  # no cheap liveness check; a stale file has to be removed by hand
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True  # exists, owned by another user
+        return True
+
+    def read(self):
+        """The pid in the file, or None"""
+        try:
+            with open(self.path, 'r') as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def __enter__(self):
+        pid = self.read()
+        if pid is not None and pid != os.getpid() and self._running(pid):
+            raise PidFileError(f"Already running with pid {pid} ({self.path})")
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'w') as f:
+            f.write(f"{os.getpid()}\n")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.read() == os.getpid():
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass